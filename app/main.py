@@ -1,18 +1,63 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response, status
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.routers import analisis, documentos
+from app.routers import analisis, documentos, convocatorias, pymes
+from app.services import vector_db, ia_evaluator, prescreening, llm_gateway, trabajos, metricas, calentamiento, catalogo, recomendaciones, perfiles
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Recursos compartidos por worker: se crean al arrancar y se liberan al apagar
+    vector_db.iniciar_servicio()
+    trabajos.iniciar_cola()
+    calentamiento.iniciar()
+    yield
+    await calentamiento.detener()
+    await trabajos.detener_cola()
+    recomendaciones.cerrar_indice_resumenes()
+    vector_db.cerrar_servicio()
+    ia_evaluator.cerrar_cache_evaluaciones()
+    prescreening.cerrar_almacen_requisitos()
+    catalogo.cerrar_catalogo()
+    perfiles.cerrar_almacen_perfiles()
 
 app = FastAPI(
     title="FondoIA Backend API",
     description="API de backend para FondoIA: automatiza el matching probabilístico entre contabilidad de Pymes y normativas de fondos públicos.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Estadísticas de cachés y de la pasarela LLM exportadas también en /metrics
+metricas.registrar_fuente("cache", vector_db.estadisticas_cache)
+metricas.registrar_fuente("evaluaciones", ia_evaluator.estadisticas_cache)
+metricas.registrar_fuente("llm", llm_gateway.estadisticas)
+
+@app.middleware("http")
+async def medir_peticion(request: Request, call_next):
+    """Histograma de latencia por ruta y desglose por etapas en la cabecera Server-Timing."""
+    token = metricas.iniciar_peticion()
+    inicio = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        tiempos = metricas.finalizar_peticion(token)
+    total = time.perf_counter() - inicio
+
+    # Plantilla de la ruta ('/trabajos/{id_trabajo}') para no crear una serie por cada ID
+    ruta = getattr(request.scope.get("route"), "path", "sin_ruta")
+    metricas.DURACION_PETICION.labels(request.method, ruta, str(response.status_code)).observe(total)
+    # En las respuestas en streaming solo incluye lo medido antes de empezar a enviar el cuerpo
+    response.headers["Server-Timing"] = metricas.cabecera_server_timing(tiempos, total)
+    return response
+
 app.include_router(analisis.router)
 app.include_router(documentos.router)
+app.include_router(convocatorias.router)
+app.include_router(pymes.router)
 
 @app.get("/", tags=["Health"])
 async def root():
@@ -20,3 +65,29 @@ async def root():
         "status": "online",
         "message": "Bienvenido a la API de FondoIA. Visite /docs para la documentación de Swagger."
     }
+
+@app.get("/ready", tags=["Health"])
+async def ready(response: Response):
+    """
+    Disponibilidad del worker: 503 mientras se calienta (FONDOIA_CALENTAR=1) y 200 cuando
+    Chroma, las cachés y el cliente de Gemini ya están abiertos.
+    """
+    estado = calentamiento.estado()
+    if not estado["listo"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return estado
+
+@app.get("/cache/estadisticas", tags=["Health"])
+async def estadisticas_cache():
+    """Aciertos y fallos de las cachés del worker que atiende la petición."""
+    return {
+        **vector_db.estadisticas_cache(),
+        "evaluaciones": ia_evaluator.estadisticas_cache(),
+        "llm": llm_gateway.estadisticas()
+    }
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def exportar_metricas():
+    """Métricas en formato Prometheus: latencias por etapa y por ruta, tokens y estadísticas de caché."""
+    cuerpo, content_type = metricas.exportar()
+    return Response(content=cuerpo, media_type=content_type)
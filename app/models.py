@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from datetime import date
+from pydantic import BaseModel, Field, model_validator
 
 class PerfilPyme(BaseModel):
     nombre_fiscal: str = Field(..., description="Nombre fiscal de la empresa")
@@ -8,6 +9,26 @@ class PerfilPyme(BaseModel):
     ubicacion_ccaa: str = Field(..., description="Comunidad Autónoma donde está ubicada")
     necesidad_inversion: str = Field(..., description="Descripción de la necesidad de inversión")
 
+class PerfilPymeRegistrado(PerfilPyme):
+    nif: str | None = Field(None, description="NIF de la empresa (clave del perfil; si falta, se usa el nombre fiscal)")
+
+class ErrorImportacion(BaseModel):
+    fila: int = Field(..., description="Número de fila (CSV, contando la cabecera) o de línea (JSONL) en el archivo")
+    error: str = Field(..., description="Motivo por el que la fila no es un perfil válido")
+
+class ResultadoImportacionPymes(BaseModel):
+    filas: int = Field(0, description="Filas leídas del archivo")
+    validas: int = Field(0, description="Filas que han pasado la validación")
+    insertadas: int = Field(0, description="Perfiles nuevos en el registro")
+    actualizadas: int = Field(0, description="Perfiles que ya existían (misma clave) y se han reemplazado")
+    errores: list[ErrorImportacion] = Field(default_factory=list, description="Filas rechazadas (hasta el máximo configurado)")
+    errores_omitidos: int = Field(0, description="Filas rechazadas que no se detallan en 'errores'")
+    segundos: float = Field(0.0, description="Duración de la importación")
+
+class PaginaPymes(BaseModel):
+    perfiles: list[PerfilPymeRegistrado] = Field(default_factory=list, description="Perfiles de la página, ordenados por clave")
+    siguiente_cursor: str | None = Field(None, description="Cursor para pedir la página siguiente (vacío si no hay más)")
+
 class ConvocatoriaSubvencion(BaseModel):
     id_convocatoria: str = Field(..., description="Identificador único de la convocatoria")
     titulo_ayuda: str = Field(..., description="Título de la ayuda o subvención")
@@ -15,12 +36,56 @@ class ConvocatoriaSubvencion(BaseModel):
     presupuesto_total_eur: float = Field(..., description="Presupuesto total en euros de la convocatoria")
     id_documento_boe: str = Field(..., description="ID del documento PDF indexado en ChromaDB (BOE/BOJA)")
 
+class ConvocatoriaCatalogo(ConvocatoriaSubvencion):
+    ccaa_elegibles: list[str] = Field(default_factory=list, description="Comunidades Autónomas del ámbito de la convocatoria (vacío = ámbito nacional)")
+    cnae_prefijos: list[str] = Field(default_factory=list, description="Prefijos CNAE elegibles (vacío = sin restricción)")
+    fecha_limite: date | None = Field(None, description="Último día del plazo de solicitud (vacío = plazo no publicado o abierto)")
+
+class PaginaConvocatorias(BaseModel):
+    convocatorias: list[ConvocatoriaCatalogo] = Field(default_factory=list, description="Convocatorias de la página, ordenadas por fecha límite")
+    siguiente_cursor: str | None = Field(None, description="Cursor para pedir la página siguiente (vacío si no hay más)")
+
 class ResultadoEvaluacion(BaseModel):
     es_elegible: bool = Field(..., description="Indicar si la empresa es elegible para la subvención")
     probabilidad_exito: int = Field(..., ge=0, le=100, description="Probabilidad de éxito del 0 al 100")
     justificacion_economica: str = Field(..., description="Justificación corta explicando por qué cumple o incumple (referente a facturación, CNAE o ubicación)")
     coste_oportunidad: str = Field(..., description="Evaluación corta de si el esfuerzo compensa el importe")
 
+class RequisitosConvocatoria(BaseModel):
+    id_documento_boe: str = Field(..., description="ID del documento PDF indexado al que pertenecen estos requisitos")
+    facturacion_max_eur: float | None = Field(None, description="Facturación anual máxima admitida en euros")
+    facturacion_min_eur: float | None = Field(None, description="Facturación anual mínima exigida en euros")
+    empleados_max: int | None = Field(None, description="Número máximo de empleados en plantilla")
+    empleados_min: int | None = Field(None, description="Número mínimo de empleados en plantilla")
+    cnae_prefijos: list[str] = Field(default_factory=list, description="Prefijos CNAE elegibles (vacío = sin restricción)")
+    ccaa_elegibles: list[str] = Field(default_factory=list, description="Comunidades Autónomas elegibles (vacío = ámbito nacional)")
+
+class CribadoRequest(BaseModel):
+    empresas: list[PerfilPyme] = Field(default_factory=list, description="Empresas a cribar")
+    perfiles: list[str] = Field(default_factory=list, max_length=5000, description="NIF o nombre fiscal de perfiles del registro de Pymes a cribar (detrás de 'empresas', hasta 5000)")
+    convocatorias: list[ConvocatoriaSubvencion] = Field(..., min_length=1, description="Convocatorias contra las que cribar")
+
+    @model_validator(mode="after")
+    def comprobar_empresas(self):
+        if not self.empresas and not self.perfiles:
+            raise ValueError("Hay que indicar al menos una empresa o un perfil registrado")
+        return self
+
+class ResultadoCribadoPar(BaseModel):
+    indice_empresa: int = Field(..., description="Posición de la empresa en la petición (los perfiles registrados van detrás de 'empresas')")
+    indice_convocatoria: int = Field(..., description="Posición de la convocatoria en la petición")
+    descartada: bool = Field(..., description="True si incumple algún requisito objetivo; False si requiere evaluación con IA")
+    motivos: list[str] = Field(default_factory=list, description="Requisitos objetivos incumplidos")
+
+class RecomendacionRequest(BaseModel):
+    empresa: PerfilPyme
+    n: int = Field(10, ge=1, le=100, description="Número de convocatorias a recomendar")
+    solo_abiertas: bool = Field(True, description="Excluir las convocatorias con el plazo ya vencido")
+
+class Recomendacion(BaseModel):
+    convocatoria: ConvocatoriaCatalogo
+    similitud: float = Field(..., description="Similitud (coseno) entre el perfil de la empresa y el resumen de requisitos del documento")
+
 class EvaluacionRequest(BaseModel):
     empresa: PerfilPyme
     convocatoria: ConvocatoriaSubvencion
@@ -31,3 +96,42 @@ class SolicitudMemoria(BaseModel):
 
 class RespuestaMemoria(BaseModel):
     documento_markdown: str = Field(..., description="Memoria técnica generada en formato Markdown")
+
+class EstadoTrabajo(BaseModel):
+    id_trabajo: str = Field(..., description="Identificador del trabajo de generación")
+    estado: str = Field(..., description="Estado del trabajo: 'pendiente', 'en_curso', 'completado', 'error' o 'cancelado'")
+    error: str | None = Field(None, description="Mensaje de error si la generación falló")
+    creado: float = Field(..., description="Instante de creación (epoch en segundos)")
+    actualizado: float = Field(..., description="Instante de la última actualización (epoch en segundos)")
+    duplicado: bool = Field(False, description="True si la solicitud coincidía con un trabajo existente y se ha reutilizado")
+
+class EvaluacionLoteRequest(BaseModel):
+    empresa: PerfilPyme
+    convocatorias: list[ConvocatoriaSubvencion] = Field(default_factory=list, max_length=200, description="Convocatorias contra las que evaluar a la empresa (hasta 200)")
+    ids_convocatoria: list[str] = Field(default_factory=list, max_length=200, description="IDs de convocatorias del catálogo a evaluar (detrás de 'convocatorias', hasta 200)")
+    concurrencia: int | None = Field(None, ge=1, description="Máximo de evaluaciones simultáneas (por defecto, el límite configurado en el servidor)")
+
+    @model_validator(mode="after")
+    def comprobar_convocatorias(self):
+        if not self.convocatorias and not self.ids_convocatoria:
+            raise ValueError("Hay que indicar al menos una convocatoria o un ID del catálogo")
+        return self
+
+class ResultadoLoteItem(BaseModel):
+    indice: int = Field(..., description="Posición de la convocatoria en la petición (las del catálogo van detrás de 'convocatorias')")
+    id_convocatoria: str = Field(..., description="Identificador de la convocatoria evaluada")
+    resultado: ResultadoEvaluacion | None = Field(None, description="Resultado de la evaluación (ausente si hubo error)")
+    desde_cache: bool = Field(False, description="Indica si el resultado procede de la caché de evaluaciones")
+    origen: str | None = Field(None, description="Origen del resultado: 'ia', 'cache' o 'cribado' (descartada por requisitos objetivos)")
+    error: str | None = Field(None, description="Mensaje de error si la evaluación de esta convocatoria falló")
+
+class ResultadoIngesta(BaseModel):
+    id_documento: str = Field(..., description="ID con el que se ha indexado el documento")
+    archivo: str = Field(..., description="Nombre del archivo PDF procesado")
+    fragmentos: int = Field(0, description="Número de fragmentos extraídos del documento")
+    fragmentos_nuevos: int = Field(0, description="Fragmentos que no estaban indexados y se han vectorizado")
+    fragmentos_eliminados: int = Field(0, description="Fragmentos de la versión anterior que ya no existen y se han borrado")
+    segundos_extraccion: float = Field(0.0, description="Tiempo de lectura y división del PDF")
+    segundos_indexacion: float = Field(0.0, description="Tiempo de embeddings y escritura en Chroma")
+    fragmentos_por_segundo: float = Field(0.0, description="Rendimiento total del documento (fragmentos / segundo)")
+    error: str | None = Field(None, description="Mensaje de error si el documento no pudo ingerirse")
@@ -1,7 +1,16 @@
-from fastapi import APIRouter, status, HTTPException
-from app.models import PerfilPyme, ResultadoEvaluacion, EvaluacionRequest
-from app.services.ia_evaluator import evaluar_elegibilidad
-from app.services.vector_db import buscar_requisitos_relevantes
+from typing import Literal
+from fastapi import APIRouter, status, HTTPException, Response, Query
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from app.models import (
+    PerfilPyme, PerfilPymeRegistrado, ConvocatoriaSubvencion, ResultadoEvaluacion, EvaluacionRequest, EvaluacionLoteRequest,
+    RequisitosConvocatoria, CribadoRequest, ResultadoCribadoPar, RecomendacionRequest, Recomendacion
+)
+from app.services.matching import evaluar_empresa_convocatoria, evaluar_lote, cribar_pares
+from app.services.prescreening import obtener_almacen_requisitos
+from app.services.recomendaciones import recomendar
+from app.services.perfiles import obtener_almacen_perfiles, clave_perfil, como_pyme
+from app.services.catalogo import obtener_catalogo
 
 router = APIRouter(
     prefix="/api/v1/analisis",
@@ -9,15 +18,17 @@ router = APIRouter(
 )
 
 @router.post("/ingesta", status_code=status.HTTP_200_OK)
-async def ingesta_pyme(perfil: PerfilPyme):
+async def ingesta_pyme(perfil: PerfilPymeRegistrado):
     """
     Endpoint para la ingesta de datos de una Pyme.
-    Recibe un JSON con los datos de una empresa, los valida y simula su estructuración.
+    Recibe un JSON con los datos de una empresa, los valida y los guarda en el registro de perfiles
+    (por NIF o nombre fiscal). Para carteras completas, /api/v1/pymes/importar.
     """
-    
+    await run_in_threadpool(obtener_almacen_perfiles().guardar_varios, [perfil])
     return {
         "status": "success",
-        "message": f"Los datos de la empresa '{perfil.nombre_fiscal}' han sido validados y estructurados correctamente.",
+        "message": f"Los datos de la empresa '{perfil.nombre_fiscal}' han sido validados y registrados correctamente.",
+        "clave": clave_perfil(perfil),
         "data_procesada": {
             "cnae": perfil.cnae,
             "facturacion_anual_eur": perfil.facturacion_anual_eur,
@@ -28,17 +39,18 @@ async def ingesta_pyme(perfil: PerfilPyme):
     }
 
 @router.post("/evaluar", response_model=ResultadoEvaluacion, status_code=status.HTTP_200_OK)
-async def evaluar_pyme_convocatoria(request: EvaluacionRequest):
+async def evaluar_pyme_convocatoria(request: EvaluacionRequest, response: Response):
     """
     Evalúa la elegibilidad de una Pyme frente a una convocatoria pública usando IA.
     Ahora utiliza la base de datos RAG ChromaDB para enriquecer el contexto.
+    Si la empresa incumple algún requisito objetivo registrado se descarta sin consultar a la IA.
+    La cabecera X-Evaluacion-Origen indica el origen del resultado (ia, cache o cribado) y
+    X-Cache si procede de la caché de evaluaciones (HIT) o no (MISS).
     """
     try:
-        # Búsqueda semántica en base de datos de los requisitos aplicables a la empresa
-        query_pyme = f"CNAE: {request.empresa.cnae}, Facturación: {request.empresa.facturacion_anual_eur}, Empleados: {request.empresa.empleados_plantilla}, Inversión: {request.empresa.necesidad_inversion}"
-        contexto_filtrado = buscar_requisitos_relevantes(query_pyme, request.convocatoria.id_documento_boe)
-        
-        resultado = await evaluar_elegibilidad(request.empresa, request.convocatoria, contexto_filtrado)
+        resultado, origen = await evaluar_empresa_convocatoria(request.empresa, request.convocatoria)
+        response.headers["X-Evaluacion-Origen"] = origen
+        response.headers["X-Cache"] = "HIT" if origen == "cache" else "MISS"
         return resultado
     except HTTPException as ht_e:
         raise ht_e
@@ -47,3 +59,93 @@ async def evaluar_pyme_convocatoria(request: EvaluacionRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error inesperado al evaluar la elegibilidad: {str(e)}"
         )
+
+@router.post("/evaluar-lote", status_code=status.HTTP_200_OK)
+async def evaluar_pyme_lote(
+    request: EvaluacionLoteRequest,
+    formato: Literal["ndjson", "sse"] = Query("ndjson", description="Formato del streaming: NDJSON o Server-Sent Events")
+):
+    """
+    Evalúa una Pyme contra una lista de convocatorias en paralelo (con concurrencia acotada)
+    y devuelve cada ResultadoLoteItem en streaming en cuanto está listo.
+    Los errores de una convocatoria se informan en su elemento sin abortar el lote. Las
+    convocatorias pueden enviarse completas o por su ID en el catálogo (ids_convocatoria).
+    """
+    convocatorias = list(request.convocatorias)
+    if request.ids_convocatoria:
+        catalogo = await run_in_threadpool(obtener_catalogo().obtener_varias, request.ids_convocatoria)
+        ausentes = [i for i in request.ids_convocatoria if i not in catalogo]
+        if ausentes:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No existen en el catálogo las convocatorias: {', '.join(ausentes)}"
+            )
+        # Solo los campos de ConvocatoriaSubvencion: la misma convocatoria enviada completa o por ID
+        # comparte entrada en la caché de evaluaciones
+        convocatorias += [ConvocatoriaSubvencion(**catalogo[i].model_dump()) for i in request.ids_convocatoria]
+    items = evaluar_lote(request.empresa, convocatorias, request.concurrencia)
+
+    if formato == "sse":
+        async def eventos():
+            async for item in items:
+                yield f"event: resultado\ndata: {item.model_dump_json()}\n\n"
+            yield "event: fin\ndata: {}\n\n"
+        return StreamingResponse(eventos(), media_type="text/event-stream")
+
+    async def lineas():
+        async for item in items:
+            yield item.model_dump_json() + "\n"
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
+
+@router.put("/requisitos/{id_documento_boe}", response_model=RequisitosConvocatoria, status_code=status.HTTP_200_OK)
+async def guardar_requisitos(id_documento_boe: str, requisitos: RequisitosConvocatoria):
+    """
+    Registra (o reemplaza) los requisitos objetivos de una convocatoria: umbrales de
+    facturación y plantilla, prefijos CNAE y CCAA elegibles. Se usan en el cribado previo.
+    """
+    if requisitos.id_documento_boe != id_documento_boe:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El id_documento_boe del cuerpo no coincide con el de la ruta."
+        )
+    await run_in_threadpool(obtener_almacen_requisitos().guardar, requisitos)
+    return requisitos
+
+@router.get("/requisitos/{id_documento_boe}", response_model=RequisitosConvocatoria, status_code=status.HTTP_200_OK)
+async def consultar_requisitos(id_documento_boe: str):
+    """Devuelve los requisitos objetivos registrados para una convocatoria."""
+    requisitos = await run_in_threadpool(obtener_almacen_requisitos().obtener, id_documento_boe)
+    if requisitos is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No hay requisitos registrados para el documento '{id_documento_boe}'."
+        )
+    return requisitos
+
+@router.post("/cribado", response_model=list[ResultadoCribadoPar], status_code=status.HTTP_200_OK)
+async def cribar_empresas_convocatorias(request: CribadoRequest):
+    """
+    Criba en una sola pasada vectorizada N empresas contra M convocatorias con los requisitos
+    objetivos registrados. Las empresas pueden enviarse completas o por el NIF o nombre fiscal de
+    su perfil registrado. Los pares no descartados son los que merecen una evaluación con IA.
+    """
+    registrados = await run_in_threadpool(obtener_almacen_perfiles().obtener_varios, request.perfiles)
+    faltan = [p for p in request.perfiles if p not in registrados]
+    if faltan:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No hay perfiles registrados para: {', '.join(faltan)}"
+        )
+    empresas = request.empresas + [como_pyme(registrados[p]) for p in request.perfiles]
+    # Lectura de los requisitos (SQLite) y cribado de la matriz N x M: fuera del event loop
+    return await run_in_threadpool(cribar_pares, empresas, request.convocatorias)
+
+@router.post("/recomendaciones", response_model=list[Recomendacion], status_code=status.HTTP_200_OK)
+async def recomendar_convocatorias(request: RecomendacionRequest):
+    """
+    Recomienda las convocatorias del catálogo más afines a la Pyme comparando su perfil (CNAE,
+    región y necesidad de inversión) con el resumen de requisitos precalculado de cada documento:
+    un embedding y una búsqueda ANN, sin RAG ni IA. Las recomendadas pueden enviarse después
+    a /evaluar-lote para la evaluación completa.
+    """
+    return await run_in_threadpool(recomendar, request.empresa, request.n, request.solo_abiertas)
@@ -0,0 +1,111 @@
+import hashlib
+from datetime import date
+from fastapi import APIRouter, status, HTTPException, Request, Response, Query
+from fastapi.concurrency import run_in_threadpool
+from app.models import ConvocatoriaCatalogo, PaginaConvocatorias
+from app.services.catalogo import obtener_catalogo, CursorInvalido, MAX_POR_PAGINA
+
+router = APIRouter(
+    prefix="/api/v1/convocatorias",
+    tags=["Convocatorias"]
+)
+
+# Los clientes pueden guardar las respuestas pero deben revalidarlas (If-None-Match) antes de usarlas
+CACHE_CONTROL = "no-cache"
+
+def _no_modificado(request: Request, etag: str) -> bool:
+    return etag in [e.strip() for e in request.headers.get("if-none-match", "").split(",")]
+
+def _etag_convocatoria(convocatoria: ConvocatoriaCatalogo) -> str:
+    # Depende solo de los datos de la convocatoria: no cambia al modificarse otras del catálogo
+    return f'W/"{hashlib.sha256(convocatoria.model_dump_json().encode("utf-8")).hexdigest()[:32]}"'
+
+@router.get("", response_model=PaginaConvocatorias)
+async def listar_convocatorias(
+    request: Request,
+    response: Response,
+    ccaa: str | None = Query(None, description="Comunidad Autónoma de la empresa (incluye las de ámbito nacional)"),
+    cnae: str | None = Query(None, description="CNAE de la empresa (incluye las convocatorias sin restricción de CNAE)"),
+    organismo: str | None = Query(None, description="Organismo emisor (sin distinguir mayúsculas)"),
+    presupuesto_min: float | None = Query(None, ge=0, description="Presupuesto total mínimo en euros"),
+    presupuesto_max: float | None = Query(None, ge=0, description="Presupuesto total máximo en euros"),
+    fecha_limite_desde: date | None = Query(None, description="Fecha límite a partir de este día"),
+    fecha_limite_hasta: date | None = Query(None, description="Fecha límite hasta este día"),
+    abiertas: bool = Query(True, description="Solo convocatorias con el plazo abierto"),
+    limite: int = Query(50, ge=1, le=MAX_POR_PAGINA, description="Convocatorias por página"),
+    cursor: str | None = Query(None, description="siguiente_cursor de la página anterior")
+):
+    """
+    Lista el catálogo de convocatorias filtrado por ámbito, CNAE, organismo, presupuesto y plazo,
+    ordenado por fecha límite (las más próximas primero). Paginación por cursor: para la página
+    siguiente se pasa el siguiente_cursor recibido. Las respuestas llevan ETag: con If-None-Match
+    se responde 304 sin cuerpo mientras el catálogo no cambie.
+    """
+    catalogo = obtener_catalogo()
+    filtros = {
+        "ccaa": ccaa, "cnae": cnae, "organismo": organismo,
+        "presupuesto_min": presupuesto_min, "presupuesto_max": presupuesto_max,
+        "fecha_limite_desde": fecha_limite_desde, "fecha_limite_hasta": fecha_limite_hasta,
+        "abiertas": abiertas
+    }
+    if abiertas:
+        # El conjunto de abiertas cambia cada día aunque el catálogo no se modifique
+        filtros["hoy"] = date.today()
+
+    def consultar():
+        # La versión se lee una vez y sirve para el ETag y para la página (ambos SQLite, en un hilo)
+        version = catalogo.version()
+        etag = catalogo.etag(filtros, cursor, limite, version)
+        if _no_modificado(request, etag):
+            return etag, None
+        return etag, catalogo.listar(filtros, cursor, limite, version)
+
+    try:
+        etag, pagina = await run_in_threadpool(consultar)
+    except CursorInvalido as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if pagina is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    convocatorias, siguiente, _ = pagina
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return PaginaConvocatorias(convocatorias=convocatorias, siguiente_cursor=siguiente)
+
+@router.post("", status_code=status.HTTP_200_OK)
+async def guardar_convocatorias(convocatorias: list[ConvocatoriaCatalogo]):
+    """Alta o actualización en bloque de convocatorias del catálogo (por id_convocatoria)."""
+    return {"guardadas": await run_in_threadpool(obtener_catalogo().guardar_varias, convocatorias)}
+
+@router.get("/{id_convocatoria}", response_model=ConvocatoriaCatalogo)
+async def obtener_convocatoria(id_convocatoria: str, request: Request, response: Response):
+    convocatoria = await run_in_threadpool(obtener_catalogo().obtener, id_convocatoria)
+    if convocatoria is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No existe la convocatoria '{id_convocatoria}' en el catálogo"
+        )
+    etag = _etag_convocatoria(convocatoria)
+    if _no_modificado(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return convocatoria
+
+@router.put("/{id_convocatoria}", response_model=ConvocatoriaCatalogo)
+async def guardar_convocatoria(id_convocatoria: str, convocatoria: ConvocatoriaCatalogo):
+    if convocatoria.id_convocatoria != id_convocatoria:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El id_convocatoria del cuerpo no coincide con el de la ruta"
+        )
+    await run_in_threadpool(obtener_catalogo().guardar_varias, [convocatoria])
+    return convocatoria
+
+@router.delete("/{id_convocatoria}", status_code=status.HTTP_204_NO_CONTENT)
+async def eliminar_convocatoria(id_convocatoria: str):
+    if not await run_in_threadpool(obtener_catalogo().eliminar, id_convocatoria):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No existe la convocatoria '{id_convocatoria}' en el catálogo"
+        )
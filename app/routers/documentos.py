@@ -1,6 +1,15 @@
-from fastapi import APIRouter, status, HTTPException
-from app.models import SolicitudMemoria, RespuestaMemoria
-from app.services.document_generator import generar_memoria_tecnica
+import os
+import json
+import shutil
+import tempfile
+from fastapi import APIRouter, status, HTTPException, UploadFile, File, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.models import SolicitudMemoria, RespuestaMemoria, ResultadoIngesta, EstadoTrabajo
+from app.services.document_generator import generar_memoria_tecnica, iniciar_memoria_tecnica_stream
+from app.services.ingesta import ingestar_pdfs, id_documento_desde_archivo
+from app.services.trabajos import obtener_cola, COMPLETADO
 
 router = APIRouter(
     prefix="/api/v1/documentos",
@@ -23,3 +32,128 @@ async def endpoint_generar_memoria(request: SolicitudMemoria):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error inesperado al generar el documento: {str(e)}"
         )
+
+@router.post("/generar-memoria/stream", status_code=status.HTTP_200_OK)
+async def endpoint_generar_memoria_stream(request: SolicitudMemoria):
+    """
+    Variante en streaming de /generar-memoria: envía la Memoria Técnica como Server-Sent Events
+    a medida que el modelo la redacta. Eventos: 'fragmento' ({"texto": ...}) por cada trozo de
+    Markdown, 'fin' al terminar y 'error' ({"detail": ...}) si la generación falla a mitad.
+    """
+    try:
+        fragmentos = await iniciar_memoria_tecnica_stream(request.empresa, request.convocatoria)
+    except HTTPException as ht_e:
+        raise ht_e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error inesperado al generar el documento: {str(e)}"
+        )
+
+    async def eventos():
+        async with fragmentos:
+            try:
+                async for texto in fragmentos:
+                    yield f"event: fragmento\ndata: {json.dumps({'texto': texto}, ensure_ascii=False)}\n\n"
+            except Exception as e:
+                # La respuesta ya empezó (200): el error se comunica como evento
+                detalle = f"Error durante la generación de la memoria con la IA: {str(e)}"
+                yield f"event: error\ndata: {json.dumps({'detail': detalle}, ensure_ascii=False)}\n\n"
+                return
+            yield "event: fin\ndata: {}\n\n"
+
+    return StreamingResponse(
+        eventos(),
+        # Si eventos() no llega a empezar (cliente desconectado) el hueco del modelo se libera igualmente
+        background=BackgroundTask(fragmentos.aclose),
+        media_type="text/event-stream",
+        # Evita que proxies intermedios acumulen la respuesta en buffer
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/trabajos", response_model=EstadoTrabajo, status_code=status.HTTP_202_ACCEPTED)
+async def endpoint_enviar_trabajo(request: SolicitudMemoria, response: Response):
+    """
+    Encola la generación de la Memoria Técnica y responde al instante con el ID del trabajo.
+    El resultado se consulta con GET /trabajos/{id_trabajo} y /trabajos/{id_trabajo}/resultado.
+    Una solicitud idéntica a otra pendiente, en curso o completada reutiliza ese trabajo.
+    """
+    # La cola es SQLite (bloqueante): fuera del event loop
+    estado = await run_in_threadpool(obtener_cola().enviar, request)
+    response.headers["Location"] = f"{router.prefix}/trabajos/{estado.id_trabajo}"
+    return estado
+
+@router.get("/trabajos/{id_trabajo}", response_model=EstadoTrabajo)
+async def endpoint_estado_trabajo(id_trabajo: str):
+    estado = await run_in_threadpool(obtener_cola().obtener, id_trabajo)
+    if estado is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No existe el trabajo '{id_trabajo}'")
+    return estado
+
+@router.get("/trabajos/{id_trabajo}/resultado", response_model=RespuestaMemoria)
+async def endpoint_resultado_trabajo(id_trabajo: str):
+    cola = obtener_cola()
+    estado = await run_in_threadpool(cola.obtener, id_trabajo)
+    if estado is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No existe el trabajo '{id_trabajo}'")
+    if estado.estado != COMPLETADO:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"El trabajo '{id_trabajo}' no ha terminado (estado: {estado.estado})" + (f": {estado.error}" if estado.error else "")
+        )
+    return RespuestaMemoria(documento_markdown=await run_in_threadpool(cola.resultado, id_trabajo))
+
+@router.delete("/trabajos/{id_trabajo}", response_model=EstadoTrabajo)
+async def endpoint_cancelar_trabajo(id_trabajo: str):
+    """Cancela un trabajo pendiente o en curso. Los trabajos ya terminados no se modifican."""
+    estado = await run_in_threadpool(obtener_cola().cancelar, id_trabajo)
+    if estado is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No existe el trabajo '{id_trabajo}'")
+    return estado
+
+def _guardar_subidas(archivos: list[UploadFile], directorio: str) -> list[tuple[str, str]]:
+    """Copia los PDFs subidos al directorio temporal y retorna (ruta, id_documento) de cada uno."""
+    documentos = []
+    for archivo in archivos:
+        # Los nombres repetidos ya se rechazan en la ruta (darían el mismo ID de documento)
+        nombre = os.path.basename(archivo.filename)
+        ruta = os.path.join(directorio, nombre)
+        with open(ruta, "wb") as destino:
+            shutil.copyfileobj(archivo.file, destino)
+        documentos.append((ruta, id_documento_desde_archivo(nombre)))
+    return documentos
+
+@router.post("/ingesta", response_model=list[ResultadoIngesta], status_code=status.HTTP_200_OK)
+async def endpoint_ingesta_pdfs(archivos: list[UploadFile] = File(..., description="Boletines BOE/BOJA en PDF")):
+    """
+    Ingiere un lote de PDFs en la base vectorial. El ID de cada documento se deriva del
+    nombre de archivo ('BOJA_FTE_AND_26.pdf' -> 'BOJA_FTE_AND_26_pdf'). La operación es
+    idempotente: subir de nuevo el mismo PDF no duplica fragmentos.
+    Devuelve el número de fragmentos y el rendimiento de cada documento.
+    """
+    no_pdf = [a.filename for a in archivos if not (a.filename or "").lower().endswith(".pdf")]
+    if no_pdf:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Solo se admiten archivos PDF: {', '.join(str(n) for n in no_pdf)}"
+        )
+    ids = [id_documento_desde_archivo(os.path.basename(a.filename)) for a in archivos]
+    repetidos = sorted({id_ for id_ in ids if ids.count(id_) > 1})
+    if repetidos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Hay varios archivos con el mismo nombre (mismo ID de documento): {', '.join(repetidos)}"
+        )
+
+    directorio = tempfile.mkdtemp(prefix="fondoia_ingesta_")
+    try:
+        # La copia de los archivos subidos y la ingesta (procesos + embeddings) son bloqueantes: fuera del event loop
+        documentos = await run_in_threadpool(_guardar_subidas, archivos, directorio)
+        return await run_in_threadpool(ingestar_pdfs, documentos)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error inesperado durante la ingesta: {str(e)}"
+        )
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
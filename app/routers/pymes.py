@@ -0,0 +1,77 @@
+from typing import Literal
+from fastapi import APIRouter, status, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from app.models import PerfilPymeRegistrado, ResultadoImportacionPymes, PaginaPymes
+from app.services.catalogo import CursorInvalido
+from app.services.perfiles import obtener_almacen_perfiles, importar_perfiles, formato_desde_nombre, MAX_POR_PAGINA
+
+router = APIRouter(
+    prefix="/api/v1/pymes",
+    tags=["Pymes"]
+)
+
+@router.post("/importar", response_model=ResultadoImportacionPymes, status_code=status.HTTP_200_OK)
+async def importar_cartera(
+    archivo: UploadFile = File(..., description="Exportación contable con un perfil por fila (CSV o JSON Lines)"),
+    formato: Literal["csv", "jsonl"] | None = Query(None, description="Formato del archivo (por defecto, según su extensión)")
+):
+    """
+    Importa una cartera de Pymes en el registro de perfiles. El archivo se procesa en streaming
+    por lotes (validación con los modelos y guardado por NIF o nombre fiscal), con memoria
+    constante sea cual sea su tamaño. Las columnas del CSV son los campos de PerfilPyme más el
+    NIF opcional; las filas no válidas se detallan con su número sin detener la importación.
+    """
+    formato = formato or formato_desde_nombre(archivo.filename)
+    if formato is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No se puede deducir el formato del nombre del archivo: indique formato=csv o formato=jsonl"
+        )
+    try:
+        # Lectura, validación y SQLite son bloqueantes: fuera del event loop
+        return await run_in_threadpool(importar_perfiles, archivo.file, formato)
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo debe estar codificado en UTF-8"
+        )
+
+@router.post("", response_model=PerfilPymeRegistrado, status_code=status.HTTP_200_OK)
+async def guardar_perfil(perfil: PerfilPymeRegistrado):
+    """Alta o actualización de un perfil en el registro (por NIF o, si no lo tiene, por nombre fiscal)."""
+    # El registro es SQLite (bloqueante): fuera del event loop, como la importación
+    await run_in_threadpool(obtener_almacen_perfiles().guardar_varios, [perfil])
+    return perfil
+
+@router.get("", response_model=PaginaPymes)
+async def listar_perfiles(
+    ccaa: str | None = Query(None, description="Comunidad Autónoma de las empresas"),
+    cnae: str | None = Query(None, description="Prefijo CNAE de las empresas ('62' incluye 6201, 6202...)"),
+    limite: int = Query(100, ge=1, le=MAX_POR_PAGINA, description="Perfiles por página"),
+    cursor: str | None = Query(None, description="siguiente_cursor de la página anterior")
+):
+    """Lista los perfiles registrados, con filtros por CCAA y CNAE y paginación por cursor."""
+    try:
+        perfiles, siguiente = await run_in_threadpool(obtener_almacen_perfiles().listar, ccaa, cnae, cursor, limite)
+    except CursorInvalido as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return PaginaPymes(perfiles=perfiles, siguiente_cursor=siguiente)
+
+@router.get("/{identificador}", response_model=PerfilPymeRegistrado)
+async def obtener_perfil(identificador: str):
+    """Perfil registrado por su NIF o su nombre fiscal."""
+    perfil = await run_in_threadpool(obtener_almacen_perfiles().obtener, identificador)
+    if perfil is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No hay ningún perfil registrado con NIF o nombre fiscal '{identificador}'"
+        )
+    return perfil
+
+@router.delete("/{identificador}", status_code=status.HTTP_204_NO_CONTENT)
+async def eliminar_perfil(identificador: str):
+    if not await run_in_threadpool(obtener_almacen_perfiles().eliminar, identificador):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No hay ningún perfil registrado con NIF o nombre fiscal '{identificador}'"
+        )
@@ -0,0 +1,84 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Directorio donde se guardan las cachés persistentes (SQLite) del backend
+CACHE_DIR = os.getenv("FONDOIA_CACHE_DIR", "./cache_db")
+
+def abrir_sqlite(nombre_fichero: str) -> sqlite3.Connection:
+    """
+    Abre (o crea) una base SQLite dentro de CACHE_DIR preparada para ser compartida
+    entre hilos del proceso y entre los distintos workers de gunicorn (modo WAL).
+    El acceso concurrente desde varios hilos debe protegerse con un lock externo.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conexion = sqlite3.connect(
+        os.path.join(CACHE_DIR, nombre_fichero),
+        check_same_thread=False,
+        timeout=30
+    )
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    return conexion
+
+class CacheLRU:
+    """
+    Caché en memoria de tamaño acotado con política LRU y caducidad (TTL) opcional.
+    Es thread-safe y lleva contadores de aciertos y fallos.
+    """
+
+    def __init__(self, max_entradas: int = 1024, ttl_segundos: float | None = None):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._datos: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, clave):
+        """Retorna el valor asociado a la clave o None si no existe o ha caducado."""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            valor, expira = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._datos[clave]
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        expira = time.monotonic() + self.ttl_segundos if self.ttl_segundos else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones
+            }
@@ -0,0 +1,72 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+
+from app.services import vector_db, ia_evaluator, prescreening, llm_gateway, catalogo, recomendaciones
+
+logger = logging.getLogger(__name__)
+
+# Calentamiento opcional al arrancar cada worker (abre Chroma, cachés y cliente de Gemini)
+CALENTAR_AL_ARRANCAR = os.getenv("FONDOIA_CALENTAR", "0") == "1"
+
+# Dependencias pesadas que el servicio importa bajo demanda. Importarlas no abre conexiones
+# ni hilos, por lo que pueden cargarse en el proceso maestro de gunicorn (--preload) y los
+# workers las heredan ya cargadas al hacer fork.
+DEPENDENCIAS_PESADAS = (
+    "google.generativeai",
+    "langchain_community.vectorstores",
+    "langchain_community.document_loaders",
+    "langchain_text_splitters",
+    "chromadb",
+)
+
+_estado = {"listo": False, "segundos": None, "error": None}
+_tarea: asyncio.Task | None = None
+
+def importar_dependencias():
+    """Importa las dependencias pesadas (fase de precarga, antes del fork de los workers)."""
+    inicio = time.perf_counter()
+    for modulo in DEPENDENCIAS_PESADAS:
+        importlib.import_module(modulo)
+    logger.info("Dependencias precargadas en %.2fs", time.perf_counter() - inicio)
+
+def calentar():
+    """Abre los recursos del worker que de otro modo se crean en la primera petición (bloqueante)."""
+    inicio = time.perf_counter()
+    try:
+        llm_gateway.cargar_genai()
+        vector_db.calentar()
+        recomendaciones.obtener_indice_resumenes()
+        ia_evaluator.obtener_cache_evaluaciones()
+        prescreening.obtener_almacen_requisitos()
+        catalogo.obtener_catalogo()
+    except Exception as e:
+        # Un fallo al calentar no impide servir: los recursos se volverán a intentar abrir bajo demanda
+        logger.exception("Error durante el calentamiento")
+        _estado["error"] = str(e)
+    _estado["segundos"] = round(time.perf_counter() - inicio, 3)
+    _estado["listo"] = True
+    logger.info("Worker caliente en %.2fs", _estado["segundos"])
+
+def iniciar():
+    """
+    Lanza el calentamiento en segundo plano si está activado: el worker acepta peticiones
+    desde el primer momento y /ready indica cuándo ha terminado.
+    """
+    global _tarea
+    if not CALENTAR_AL_ARRANCAR:
+        _estado["listo"] = True
+        return
+    _tarea = asyncio.create_task(asyncio.to_thread(calentar))
+
+async def detener():
+    # Esperamos a que termine antes de cerrar los recursos que está abriendo
+    global _tarea
+    tarea, _tarea = _tarea, None
+    if tarea is not None:
+        await asyncio.gather(tarea, return_exceptions=True)
+
+def estado() -> dict:
+    return {**_estado, "calentamiento": CALENTAR_AL_ARRANCAR}
@@ -0,0 +1,307 @@
+import json
+import base64
+import hashlib
+import threading
+from datetime import date
+
+from app.models import ConvocatoriaCatalogo
+from app.services.cache import CacheLRU, abrir_sqlite
+from app.services.prescreening import normalizar_ccaa, extraer_codigo_cnae, normalizar_prefijo_cnae
+
+# Marca de "cualquiera" en los índices de CCAA y CNAE (ámbito nacional / sin restricción de CNAE)
+TODAS = "*"
+# Las convocatorias sin fecha límite se ordenan al final
+SIN_FECHA = "9999-12-31"
+MAX_POR_PAGINA = 200
+
+class CursorInvalido(ValueError):
+    pass
+
+def codificar_cursor(orden_fecha: str, id_convocatoria: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([orden_fecha, id_convocatoria]).encode("utf-8")).decode("ascii")
+
+def decodificar_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        orden_fecha, id_convocatoria = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(orden_fecha), str(id_convocatoria)
+    except Exception:
+        raise CursorInvalido(f"Cursor de paginación no válido: {cursor}")
+
+def prefijos_codigo(cnae: str) -> list[str]:
+    """Prefijos del código CNAE de una empresa ("6201" -> ["6", "62", "620", "6201"])."""
+    codigo = extraer_codigo_cnae(cnae)
+    return [codigo[:i] for i in range(1, len(codigo) + 1)] if codigo else []
+
+class CatalogoConvocatorias:
+    """
+    Catálogo persistente de convocatorias (SQLite, compartido por todos los workers).
+    Además de la tabla principal mantiene índices secundarios de CCAA y de prefijos CNAE,
+    de forma que "convocatorias abiertas para un CNAE 6201 en Andalucía" se resuelve con
+    búsquedas en índice y no recorriendo el catálogo.
+    Cada escritura incrementa la versión del catálogo, que forma parte del ETag de los
+    listados y de la clave de la caché de páginas.
+    """
+
+    def __init__(self, fichero_sqlite: str = "catalogo.sqlite3", max_paginas_cache: int = 512):
+        self._lock = threading.Lock()
+        self._paginas = CacheLRU(max_entradas=max_paginas_cache)
+        self._db = abrir_sqlite(fichero_sqlite)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS convocatorias (
+                id_convocatoria TEXT PRIMARY KEY,
+                organismo_emisor TEXT NOT NULL COLLATE NOCASE,
+                presupuesto_total_eur REAL NOT NULL,
+                orden_fecha TEXT NOT NULL,
+                datos TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS convocatorias_fecha ON convocatorias (orden_fecha, id_convocatoria);
+            CREATE INDEX IF NOT EXISTS convocatorias_organismo ON convocatorias (organismo_emisor, orden_fecha, id_convocatoria);
+            CREATE INDEX IF NOT EXISTS convocatorias_presupuesto ON convocatorias (presupuesto_total_eur);
+            CREATE TABLE IF NOT EXISTS convocatorias_ccaa (
+                ccaa TEXT NOT NULL, id_convocatoria TEXT NOT NULL, PRIMARY KEY (ccaa, id_convocatoria)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS convocatorias_cnae (
+                prefijo TEXT NOT NULL, id_convocatoria TEXT NOT NULL, PRIMARY KEY (prefijo, id_convocatoria)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS convocatorias_documento (
+                id_documento_boe TEXT NOT NULL, id_convocatoria TEXT NOT NULL, PRIMARY KEY (id_documento_boe, id_convocatoria)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS version (id INTEGER PRIMARY KEY CHECK (id = 0), valor INTEGER NOT NULL);
+            INSERT OR IGNORE INTO version (id, valor) VALUES (0, 0);
+            """
+        )
+        # Catálogos creados antes de existir el índice por documento
+        if self._db.execute("SELECT 1 FROM convocatorias_documento LIMIT 1").fetchone() is None:
+            self._db.execute(
+                "INSERT OR IGNORE INTO convocatorias_documento (id_documento_boe, id_convocatoria) "
+                "SELECT json_extract(datos, '$.id_documento_boe'), id_convocatoria FROM convocatorias"
+            )
+        self._db.commit()
+
+    def version(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT valor FROM version WHERE id = 0").fetchone()[0]
+
+    # --- Escritura ---
+
+    def _borrar_indices(self, ids: list[str]):
+        for tabla in ("convocatorias_ccaa", "convocatorias_cnae", "convocatorias_documento"):
+            self._db.executemany(f"DELETE FROM {tabla} WHERE id_convocatoria = ?", [(i,) for i in ids])
+
+    def guardar_varias(self, convocatorias: list[ConvocatoriaCatalogo]) -> int:
+        """Inserta o reemplaza las convocatorias (y sus entradas de índice) en una sola transacción."""
+        filas, ccaa, cnae, documentos = [], [], [], []
+        for c in convocatorias:
+            filas.append((
+                c.id_convocatoria, c.organismo_emisor.strip(), c.presupuesto_total_eur,
+                c.fecha_limite.isoformat() if c.fecha_limite else SIN_FECHA, c.model_dump_json()
+            ))
+            ccaa.extend((n, c.id_convocatoria) for n in ({normalizar_ccaa(x) for x in c.ccaa_elegibles} or {TODAS}))
+            prefijos = {normalizar_prefijo_cnae(p) for p in c.cnae_prefijos} - {""}
+            cnae.extend((p, c.id_convocatoria) for p in (prefijos or {TODAS}))
+            documentos.append((c.id_documento_boe, c.id_convocatoria))
+
+        with self._lock:
+            with self._db:
+                self._borrar_indices([f[0] for f in filas])
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO convocatorias "
+                    "(id_convocatoria, organismo_emisor, presupuesto_total_eur, orden_fecha, datos) VALUES (?, ?, ?, ?, ?)",
+                    filas
+                )
+                self._db.executemany("INSERT OR IGNORE INTO convocatorias_ccaa (ccaa, id_convocatoria) VALUES (?, ?)", ccaa)
+                self._db.executemany("INSERT OR IGNORE INTO convocatorias_cnae (prefijo, id_convocatoria) VALUES (?, ?)", cnae)
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO convocatorias_documento (id_documento_boe, id_convocatoria) VALUES (?, ?)", documentos
+                )
+                self._db.execute("UPDATE version SET valor = valor + 1 WHERE id = 0")
+        return len(filas)
+
+    def eliminar(self, id_convocatoria: str) -> bool:
+        with self._lock:
+            with self._db:
+                cursor = self._db.execute("DELETE FROM convocatorias WHERE id_convocatoria = ?", (id_convocatoria,))
+                if cursor.rowcount:
+                    self._borrar_indices([id_convocatoria])
+                    self._db.execute("UPDATE version SET valor = valor + 1 WHERE id = 0")
+        return cursor.rowcount > 0
+
+    # --- Lectura ---
+
+    def obtener(self, id_convocatoria: str) -> ConvocatoriaCatalogo | None:
+        return self.obtener_varias([id_convocatoria]).get(id_convocatoria)
+
+    def obtener_varias(self, ids: list[str]) -> dict[str, ConvocatoriaCatalogo]:
+        encontradas = {}
+        ids = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                bloque = ids[i:i + 500]
+                marcadores = ",".join("?" * len(bloque))
+                filas = self._db.execute(
+                    f"SELECT id_convocatoria, datos FROM convocatorias WHERE id_convocatoria IN ({marcadores})", bloque
+                ).fetchall()
+                for id_convocatoria, datos in filas:
+                    encontradas[id_convocatoria] = ConvocatoriaCatalogo.model_validate_json(datos)
+        return encontradas
+
+    def por_documento(self, ids_documento: list[str]) -> dict[str, list[ConvocatoriaCatalogo]]:
+        """Convocatorias del catálogo que remiten a cada documento indexado (id_documento_boe)."""
+        encontradas: dict[str, list[ConvocatoriaCatalogo]] = {}
+        ids_documento = list(dict.fromkeys(ids_documento))
+        with self._lock:
+            for i in range(0, len(ids_documento), 500):
+                bloque = ids_documento[i:i + 500]
+                marcadores = ",".join("?" * len(bloque))
+                filas = self._db.execute(
+                    "SELECT d.id_documento_boe, c.datos FROM convocatorias_documento d "
+                    "JOIN convocatorias c ON c.id_convocatoria = d.id_convocatoria "
+                    f"WHERE d.id_documento_boe IN ({marcadores}) ORDER BY c.orden_fecha, c.id_convocatoria",
+                    bloque
+                ).fetchall()
+                for id_documento, datos in filas:
+                    encontradas.setdefault(id_documento, []).append(ConvocatoriaCatalogo.model_validate_json(datos))
+        return encontradas
+
+    def _condiciones(self, filtros: dict, por_convocatoria: bool = False) -> tuple[list[str], list]:
+        """
+        Condiciones SQL de los filtros sobre la tabla c. Para recorrer el catálogo (listados), CCAA y
+        CNAE se resuelven como conjuntos de convocatorias; con por_convocatoria, como búsquedas en su
+        índice para cada convocatoria ya elegida (cuando se parte de unas pocas, p. ej. por documento).
+        """
+        condiciones, parametros = [], []
+        if filtros.get("abiertas"):
+            condiciones.append("c.orden_fecha >= ?")
+            parametros.append(date.today().isoformat())
+        if filtros.get("fecha_limite_desde"):
+            condiciones.append("c.orden_fecha >= ?")
+            parametros.append(filtros["fecha_limite_desde"].isoformat())
+        if filtros.get("fecha_limite_hasta"):
+            condiciones.append("c.orden_fecha <= ?")
+            parametros.append(filtros["fecha_limite_hasta"].isoformat())
+        if filtros.get("organismo"):
+            condiciones.append("c.organismo_emisor = ?")
+            parametros.append(filtros["organismo"].strip())
+        if filtros.get("presupuesto_min") is not None:
+            condiciones.append("c.presupuesto_total_eur >= ?")
+            parametros.append(filtros["presupuesto_min"])
+        if filtros.get("presupuesto_max") is not None:
+            condiciones.append("c.presupuesto_total_eur <= ?")
+            parametros.append(filtros["presupuesto_max"])
+        if por_convocatoria:
+            def en_indice(tabla: str, columna: str, n: int) -> str:
+                return (
+                    f"EXISTS (SELECT 1 FROM {tabla} x WHERE x.{columna} IN ({','.join('?' * n)}) "
+                    "AND x.id_convocatoria = c.id_convocatoria)"
+                )
+        else:
+            def en_indice(tabla: str, columna: str, n: int) -> str:
+                return f"c.id_convocatoria IN (SELECT id_convocatoria FROM {tabla} WHERE {columna} IN ({','.join('?' * n)}))"
+        if filtros.get("ccaa"):
+            condiciones.append(en_indice("convocatorias_ccaa", "ccaa", 2))
+            parametros.extend([normalizar_ccaa(filtros["ccaa"]), TODAS])
+        if filtros.get("cnae"):
+            prefijos = prefijos_codigo(filtros["cnae"]) + [TODAS]
+            condiciones.append(en_indice("convocatorias_cnae", "prefijo", len(prefijos)))
+            parametros.extend(prefijos)
+        return condiciones, parametros
+
+    def _consulta(self, filtros: dict, cursor: str | None, limite: int) -> tuple[str, list]:
+        condiciones, parametros = [], []
+        if cursor:
+            condiciones.append("(c.orden_fecha, c.id_convocatoria) > (?, ?)")
+            parametros.extend(decodificar_cursor(cursor))
+        filtro_condiciones, filtro_parametros = self._condiciones(filtros)
+        condiciones += filtro_condiciones
+        parametros += filtro_parametros
+
+        sql = "SELECT c.orden_fecha, c.id_convocatoria, c.datos FROM convocatorias c"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY c.orden_fecha, c.id_convocatoria LIMIT ?"
+        parametros.append(limite + 1)
+        return sql, parametros
+
+    def etag(self, filtros: dict, cursor: str | None, limite: int, version: int | None = None) -> str:
+        version = self.version() if version is None else version
+        huella = hashlib.sha256(
+            json.dumps([version, filtros, cursor, limite], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:32]
+        return f'W/"{huella}"'
+
+    def listar(
+        self, filtros: dict, cursor: str | None = None, limite: int = 50, version: int | None = None
+    ) -> tuple[list[ConvocatoriaCatalogo], str | None, int]:
+        """
+        Página de convocatorias que cumplen los filtros, ordenada por (fecha límite, id).
+        Paginación por clave (keyset): el cursor es la última fila servida, así que pedir la
+        página 100 cuesta lo mismo que la primera. Se puede pasar la versión del catálogo ya
+        leída (p. ej. para el ETag). Retorna (convocatorias, siguiente_cursor, version).
+        """
+        limite = max(1, min(limite, MAX_POR_PAGINA))
+        version = self.version() if version is None else version
+        clave = (version, json.dumps(filtros, sort_keys=True, default=str), cursor, limite)
+        pagina = self._paginas.obtener(clave)
+        if pagina is not None:
+            return (*pagina, version)
+
+        sql, parametros = self._consulta(filtros, cursor, limite)
+        with self._lock:
+            filas = self._db.execute(sql, parametros).fetchall()
+        siguiente = codificar_cursor(filas[limite - 1][0], filas[limite - 1][1]) if len(filas) > limite else None
+        convocatorias = [ConvocatoriaCatalogo.model_validate_json(datos) for _, _, datos in filas[:limite]]
+        self._paginas.guardar(clave, (convocatorias, siguiente))
+        return convocatorias, siguiente, version
+
+    def documentos_elegibles(self, ids_documento: list[str], filtros: dict) -> set[str]:
+        """
+        De los documentos indicados, los que tienen alguna convocatoria que cumple los filtros del
+        listado. Se resuelve por el índice de documentos: el coste depende de cuántos se piden, no
+        del tamaño del catálogo.
+        """
+        condiciones, parametros = self._condiciones(filtros, por_convocatoria=True)
+        elegibles = set()
+        ids_documento = list(dict.fromkeys(ids_documento))
+        with self._lock:
+            for i in range(0, len(ids_documento), 500):
+                bloque = ids_documento[i:i + 500]
+                # CROSS JOIN fija el orden: se parte de los documentos pedidos
+                sql = (
+                    "SELECT DISTINCT d.id_documento_boe FROM convocatorias_documento d "
+                    "CROSS JOIN convocatorias c ON c.id_convocatoria = d.id_convocatoria "
+                    f"WHERE d.id_documento_boe IN ({','.join('?' * len(bloque))})"
+                )
+                if condiciones:
+                    sql += " AND " + " AND ".join(condiciones)
+                elegibles.update(fila[0] for fila in self._db.execute(sql, bloque + parametros).fetchall())
+        return elegibles
+
+    def plan_consulta(self, filtros: dict, cursor: str | None = None, limite: int = 50) -> list[str]:
+        """EXPLAIN QUERY PLAN del listado (para comprobar que usa los índices)."""
+        sql, parametros = self._consulta(filtros, cursor, limite)
+        with self._lock:
+            return [fila[-1] for fila in self._db.execute(f"EXPLAIN QUERY PLAN {sql}", parametros).fetchall()]
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+_lock = threading.Lock()
+_catalogo = None
+
+def obtener_catalogo() -> CatalogoConvocatorias:
+    """Retorna el catálogo (compartido por proceso) de convocatorias"""
+    global _catalogo
+    if _catalogo is None:
+        with _lock:
+            if _catalogo is None:
+                _catalogo = CatalogoConvocatorias()
+    return _catalogo
+
+def cerrar_catalogo():
+    global _catalogo
+    with _lock:
+        catalogo, _catalogo = _catalogo, None
+    if catalogo is not None:
+        catalogo.cerrar()
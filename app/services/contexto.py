@@ -0,0 +1,134 @@
+import os
+import re
+import math
+import logging
+import threading
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Presupuesto de tokens del contexto RAG por modelo (el resto del prompt va aparte)
+PRESUPUESTO_TOKENS = {
+    "gemini-2.5-flash": int(os.getenv("FONDOIA_CONTEXTO_TOKENS_FLASH", "1500")),
+    "gemini-2.5-pro": int(os.getenv("FONDOIA_CONTEXTO_TOKENS_PRO", "4000")),
+}
+# Similitud (Jaccard de 5-gramas de palabras) a partir de la cual dos fragmentos se consideran duplicados
+UMBRAL_DUPLICADO = float(os.getenv("FONDOIA_CONTEXTO_UMBRAL_DUPLICADO", "0.8"))
+# Solapamiento máximo a buscar entre fragmentos consecutivos (el splitter usa chunk_overlap=200), y
+# mínimo para darlo por bueno: coincidencias más cortas (p. ej. tras un salto de página sin solapamiento
+# real) pueden ser casuales y se perdería texto
+MAX_SOLAPAMIENTO = 300
+MIN_SOLAPAMIENTO = 20
+
+SEPARADOR = "\n\n---\n\n"
+
+@dataclass
+class Fragmento:
+    texto: str
+    posicion: int = -1  # Orden del fragmento en el documento (-1 si se desconoce)
+
+@dataclass
+class EstadisticasContexto:
+    fragmentos_antes: int
+    fragmentos_despues: int
+    tokens_antes: int
+    tokens_despues: int
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación rápida (~4 caracteres por token en los modelos Gemini)."""
+    return math.ceil(len(texto) / 4)
+
+def presupuesto_tokens(modelo: str) -> int | None:
+    return PRESUPUESTO_TOKENS.get(modelo)
+
+def _shingles(texto: str, n: int = 5) -> set:
+    palabras = re.findall(r"\w+", texto.lower())
+    return {tuple(palabras[i:i + n]) for i in range(max(1, len(palabras) - n + 1))}
+
+def _eliminar_duplicados(fragmentos: list[Fragmento]) -> list[Fragmento]:
+    """Descarta los fragmentos casi idénticos a otro más relevante (anterior en la lista)."""
+    conservados, firmas = [], []
+    for fragmento in fragmentos:
+        firma = _shingles(fragmento.texto)
+        if any(len(firma & otra) / (len(firma | otra) or 1) >= UMBRAL_DUPLICADO for otra in firmas):
+            continue
+        conservados.append(fragmento)
+        firmas.append(firma)
+    return conservados
+
+def _unir_solapados(anterior: str, siguiente: str) -> str:
+    """Concatena dos fragmentos consecutivos quitando el texto que comparten (final de uno = inicio del otro)."""
+    for longitud in range(min(MAX_SOLAPAMIENTO, len(anterior), len(siguiente)), MIN_SOLAPAMIENTO - 1, -1):
+        if anterior.endswith(siguiente[:longitud]):
+            return anterior + siguiente[longitud:]
+    return anterior + "\n" + siguiente
+
+def _recortar(texto: str, tokens: int) -> str:
+    limite = tokens * 4
+    if len(texto) <= limite:
+        return texto
+    corte = texto.rfind(" ", 0, limite)
+    return texto[:corte if corte > 0 else limite] + " [...]"
+
+def ensamblar_contexto(fragmentos: list[Fragmento], presupuesto: int | None = None) -> tuple[str, EstadisticasContexto]:
+    """
+    Compacta los fragmentos recuperados (ordenados por relevancia) antes de pasarlos al prompt:
+    elimina casi-duplicados, se queda con los más relevantes que caben en el presupuesto de tokens,
+    los reordena según su posición en el documento y fusiona los consecutivos eliminando el
+    solapamiento del splitter. Retorna el texto y las estadísticas de tokens antes/después.
+    """
+    tokens_antes = sum(estimar_tokens(f.texto) for f in fragmentos) + estimar_tokens(SEPARADOR) * max(0, len(fragmentos) - 1)
+
+    seleccionados, usados = [], 0
+    for fragmento in _eliminar_duplicados(fragmentos):
+        tokens = estimar_tokens(fragmento.texto)
+        if presupuesto is not None and usados + tokens > presupuesto:
+            # El fragmento más relevante siempre entra, aunque sea recortado
+            if not seleccionados:
+                seleccionados.append(Fragmento(_recortar(fragmento.texto, presupuesto), fragmento.posicion))
+            break
+        seleccionados.append(fragmento)
+        usados += tokens
+
+    # Orden de lectura del documento; los de posición desconocida, al final por relevancia
+    conocidos = sorted((f for f in seleccionados if f.posicion >= 0), key=lambda f: f.posicion)
+    desconocidos = [f for f in seleccionados if f.posicion < 0]
+
+    bloques: list[Fragmento] = []
+    for fragmento in conocidos:
+        if bloques and fragmento.posicion == bloques[-1].posicion + 1:
+            bloques[-1] = Fragmento(_unir_solapados(bloques[-1].texto, fragmento.texto), fragmento.posicion)
+        else:
+            bloques.append(fragmento)
+    bloques.extend(desconocidos)
+
+    texto = SEPARADOR.join(b.texto for b in bloques)
+    estadisticas = EstadisticasContexto(
+        fragmentos_antes=len(fragmentos),
+        fragmentos_despues=len(bloques),
+        tokens_antes=tokens_antes,
+        tokens_despues=estimar_tokens(texto)
+    )
+    _registrar(estadisticas)
+    return texto, estadisticas
+
+_lock = threading.Lock()
+_totales = {"ensamblados": 0, "tokens_antes": 0, "tokens_despues": 0}
+
+def _registrar(estadisticas: EstadisticasContexto):
+    with _lock:
+        _totales["ensamblados"] += 1
+        _totales["tokens_antes"] += estadisticas.tokens_antes
+        _totales["tokens_despues"] += estadisticas.tokens_despues
+    logger.info(
+        "Contexto compactado: %d -> %d fragmentos, %d -> %d tokens",
+        estadisticas.fragmentos_antes, estadisticas.fragmentos_despues,
+        estadisticas.tokens_antes, estadisticas.tokens_despues
+    )
+
+def estadisticas_compactacion() -> dict:
+    """Tokens acumulados antes y después de compactar en este proceso."""
+    with _lock:
+        totales = dict(_totales)
+    ahorro = 1 - totales["tokens_despues"] / totales["tokens_antes"] if totales["tokens_antes"] else 0.0
+    return {**totales, "ahorro": round(ahorro, 4)}
@@ -1,21 +1,27 @@
 import os
 from fastapi import HTTPException
-import google.generativeai as genai
 
 from app.models import PerfilPyme, ConvocatoriaSubvencion
-from app.services.vector_db import buscar_requisitos_relevantes
+from app.services.contexto import presupuesto_tokens
+from app.services.llm_gateway import generar_texto, abrir_stream, StreamGeneracion
+from app.services.vector_db import buscar_requisitos_relevantes_async
 
-async def generar_memoria_tecnica(empresa: PerfilPyme, convocatoria: ConvocatoriaSubvencion) -> str:
-    """
-    Función asíncrona que genera una memoria técnica en formato Markdown
-    basada en el perfil de la Pyme y la convocatoria pública.
-    """
+MODELO_MEMORIA = "gemini-2.5-pro" # El modelo pro generalmente redacta mejor textos largos
+
+async def _preparar_memoria(empresa: PerfilPyme, convocatoria: ConvocatoriaSubvencion) -> tuple[str, str]:
+    """Recupera la normativa aplicable y construye la instrucción de sistema y el prompt de la memoria."""
     if not os.getenv("GEMINI_API_KEY"):
         raise HTTPException(
             status_code=500,
             detail="La variable de entorno GEMINI_API_KEY no está configurada."
         )
 
+    # Recuperamos la normativa fuera del event loop antes de montar el prompt
+    contexto_normativo = await buscar_requisitos_relevantes_async(
+        "Normativa de la solicitud, inversión y plazos", convocatoria.id_documento_boe, k=10,
+        presupuesto_tokens=presupuesto_tokens(MODELO_MEMORIA)
+    )
+
     system_instruction = (
         "Eres un Consultor Senior de Subvenciones Públicas Especializado en Redacción de Proyectos. "
         "Tu objetivo es redactar un documento formal, persuasivo, técnico y estrictamente en español "
@@ -42,7 +48,7 @@ async def generar_memoria_tecnica(empresa: PerfilPyme, convocatoria: Convocatori
     - ID Documento Oficial: {convocatoria.id_documento_boe}
     
     TEXTO NORMATIVO / REQUISITOS (RECUPERADOS RAG): 
-    {buscar_requisitos_relevantes("Normativa de la solicitud, inversión y plazos", convocatoria.id_documento_boe, k=10)}
+    {contexto_normativo}
     
     INSTRUCCIONES DE FORMATO STRICTAS:
     Debes generar un documento en formato Markdown puro (sin comillas invertidas de bloque de código, devuelve el texto plano de markdown directamente).
@@ -55,25 +61,47 @@ async def generar_memoria_tecnica(empresa: PerfilPyme, convocatoria: Convocatori
     
     El tono debe ser: ADMINISTRATIVO FORMAL, TÉCNICO Y CONVINCENTE.
     """
-    
+    return system_instruction, prompt
+
+# Configuramos baja temperatura (0.3) para reducir alucinaciones
+# y mantener un estilo sobrio y predecible.
+CONFIG_MEMORIA = {"temperature": 0.3}
+
+async def generar_memoria_tecnica(empresa: PerfilPyme, convocatoria: ConvocatoriaSubvencion) -> str:
+    """
+    Función asíncrona que genera una memoria técnica en formato Markdown
+    basada en el perfil de la Pyme y la convocatoria pública.
+    """
+    system_instruction, prompt = await _preparar_memoria(empresa, convocatoria)
+
     try:
-        model = genai.GenerativeModel(
-            model_name="gemini-2.5-pro", # El modelo pro generalmente redacta mejor textos largos
-            system_instruction=system_instruction
+        # Más tiempo porque la generación de texto largo demora más
+        return await generar_texto(
+            MODELO_MEMORIA, system_instruction, prompt, generation_config=CONFIG_MEMORIA, timeout=60
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Error durante la generación de la memoria con la IA: {str(e)}"
         )
-        
-        # Configuramos baja temperatura (0.3) para reducir alucinaciones 
-        # y mantener un estilo sobrio y predecible.
-        response = await model.generate_content_async(
-            prompt,
-            generation_config=genai.GenerationConfig(
-                temperature=0.3
-            ),
-            request_options={"timeout": 60} # Más tiempo porque la generación de texto largo demora más
+
+async def iniciar_memoria_tecnica_stream(empresa: PerfilPyme, convocatoria: ConvocatoriaSubvencion) -> StreamGeneracion:
+    """
+    Variante en streaming de generar_memoria_tecnica. Recupera la normativa y abre la
+    generación en streaming con Gemini; los errores hasta ese punto se lanzan como
+    HTTPException (antes de enviar nada al cliente). Retorna un iterador asíncrono que
+    va entregando los fragmentos de Markdown a medida que el modelo los produce; hay que
+    cerrarlo (aclose) si no se recorre entero.
+    """
+    system_instruction, prompt = await _preparar_memoria(empresa, convocatoria)
+
+    try:
+        # En streaming el timeout cubre la respuesta completa, pero el cliente
+        # ya va recibiendo texto desde el primer segundo
+        return await abrir_stream(
+            MODELO_MEMORIA, system_instruction, prompt, generation_config=CONFIG_MEMORIA, timeout=300
         )
-        
-        return response.text
-        
     except Exception as e:
         raise HTTPException(
             status_code=503,
@@ -0,0 +1,115 @@
+import os
+import hashlib
+import threading
+from array import array
+from langchain_core.embeddings import Embeddings
+
+from app.services.cache import CacheLRU, abrir_sqlite
+
+# Tamaño de la caché en memoria (nº de vectores) por proceso
+EMBEDDINGS_CACHE_MAX = int(os.getenv("FONDOIA_EMBEDDINGS_CACHE_MAX", "4096"))
+
+class EmbeddingsConCache(Embeddings):
+    """
+    Envoltorio de un modelo de embeddings con caché de dos niveles:
+    una LRU en memoria por proceso delante de un almacén SQLite persistente
+    compartido por todos los workers. La clave es el nombre del modelo, el tipo
+    de embedding (query o documento, que el modelo de Google vectoriza distinto)
+    y el hash SHA-256 del texto.
+    """
+
+    def __init__(self, base: Embeddings, nombre_modelo: str, fichero_sqlite: str = "embeddings.sqlite3"):
+        self.base = base
+        self.nombre_modelo = nombre_modelo
+        self._memoria = CacheLRU(max_entradas=EMBEDDINGS_CACHE_MAX)
+        self._lock = threading.Lock()
+        self._db = abrir_sqlite(fichero_sqlite)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (clave TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.commit()
+        self.aciertos_disco = 0
+        self.fallos = 0
+
+    def _clave(self, tipo: str, texto: str) -> str:
+        huella = hashlib.sha256(texto.encode("utf-8")).hexdigest()
+        return f"{self.nombre_modelo}:{tipo}:{huella}"
+
+    def _leer_disco(self, claves: list[str]) -> dict[str, list[float]]:
+        encontrados = {}
+        with self._lock:
+            # SQLite limita el nº de parámetros por sentencia: consultamos por bloques
+            for i in range(0, len(claves), 500):
+                bloque = claves[i:i + 500]
+                marcadores = ",".join("?" * len(bloque))
+                filas = self._db.execute(
+                    f"SELECT clave, vector FROM embeddings WHERE clave IN ({marcadores})", bloque
+                ).fetchall()
+                for clave, blob in filas:
+                    encontrados[clave] = array("f", blob).tolist()
+        return encontrados
+
+    def _escribir_disco(self, pares: list[tuple[str, list[float]]]):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (clave, vector) VALUES (?, ?)",
+                [(clave, array("f", vector).tobytes()) for clave, vector in pares]
+            )
+            self._db.commit()
+
+    def _resolver(self, tipo: str, textos: list[str], calcular) -> list[list[float]]:
+        claves = [self._clave(tipo, t) for t in textos]
+        resultado: dict[str, list[float]] = {}
+
+        # Nivel 1: memoria del proceso
+        pendientes = []
+        for clave in dict.fromkeys(claves):
+            vector = self._memoria.obtener(clave)
+            if vector is None:
+                pendientes.append(clave)
+            else:
+                resultado[clave] = vector
+
+        # Nivel 2: almacén persistente
+        if pendientes:
+            en_disco = self._leer_disco(pendientes)
+            self.aciertos_disco += len(en_disco)
+            for clave, vector in en_disco.items():
+                self._memoria.guardar(clave, vector)
+                resultado[clave] = vector
+
+        # Fallo en ambos niveles: una única llamada al modelo para los textos que faltan
+        faltan = [(clave, texto) for clave, texto in dict(zip(claves, textos)).items() if clave not in resultado]
+        if faltan:
+            self.fallos += len(faltan)
+            vectores = calcular([texto for _, texto in faltan])
+            nuevos = list(zip([clave for clave, _ in faltan], vectores))
+            self._escribir_disco(nuevos)
+            for clave, vector in nuevos:
+                self._memoria.guardar(clave, vector)
+                resultado[clave] = vector
+
+        return [resultado[clave] for clave in claves]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._resolver("documento", texts, self.base.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._resolver("query", [text], lambda textos: [self.base.embed_query(textos[0])])[0]
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+    def estadisticas(self) -> dict:
+        memoria = self._memoria.estadisticas()
+        aciertos_memoria = memoria["aciertos"]
+        total = aciertos_memoria + self.aciertos_disco + self.fallos
+        return {
+            "modelo": self.nombre_modelo,
+            "entradas_memoria": memoria["entradas"],
+            "aciertos_memoria": aciertos_memoria,
+            "aciertos_disco": self.aciertos_disco,
+            "fallos": self.fallos,
+            "tasa_aciertos": round((aciertos_memoria + self.aciertos_disco) / total, 4) if total else 0.0
+        }
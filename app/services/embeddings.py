@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from concurrent.futures import Future
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Backend de embeddings: "google" (remoto), "local" (sentence-transformers en CPU) o "hashing" (sin dependencias)
+EMBEDDINGS_BACKEND = os.getenv("FONDOIA_EMBEDDINGS_BACKEND", "google")
+MODELO_GOOGLE = "models/embedding-001"
+MODELO_LOCAL = os.getenv("FONDOIA_EMBEDDINGS_MODELO_LOCAL", "paraphrase-multilingual-MiniLM-L12-v2")
+DIMENSION_HASHING = int(os.getenv("FONDOIA_EMBEDDINGS_DIMENSION_HASHING", "1024"))
+
+# Agrupación de queries concurrentes para el backend local (espera máxima y tamaño de lote)
+MICROLOTE_ESPERA_MS = float(os.getenv("FONDOIA_EMBEDDINGS_MICROLOTE_MS", "5"))
+MICROLOTE_MAX = int(os.getenv("FONDOIA_EMBEDDINGS_MICROLOTE_MAX", "32"))
+
+def _tokenizar(texto: str) -> list[str]:
+    sin_tildes = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii")
+    return re.findall(r"[a-z0-9]+", sin_tildes)
+
+class EmbeddingsHashing(Embeddings):
+    """
+    Proyección por hashing de unigramas y bigramas (feature hashing con signo y tf sublineal),
+    normalizada L2. Determinista, sin red ni modelos que descargar: es el respaldo de coste cero.
+    Captura coincidencias léxicas (códigos CNAE, importes, artículos) pero no sinónimos.
+    """
+
+    def __init__(self, dimension: int = DIMENSION_HASHING):
+        self.dimension = dimension
+
+    def _vectorizar(self, texto: str) -> list[float]:
+        tokens = _tokenizar(texto)
+        rasgos = tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for rasgo in rasgos:
+            huella = int.from_bytes(hashlib.blake2b(rasgo.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[huella % self.dimension] += 1.0 if (huella >> 63) == 0 else -1.0
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norma = np.linalg.norm(vector)
+        return (vector / norma if norma else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._vectorizar(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._vectorizar(text)
+
+class EmbeddingsLocales(Embeddings):
+    """
+    Modelo de sentence-embeddings ejecutado en CPU (requiere `pip install sentence-transformers`).
+    Las queries que llegan a la vez desde distintos hilos se agrupan en micro-lotes, ya que
+    codificar un lote cuesta casi lo mismo que codificar una sola frase.
+    """
+
+    def __init__(self, nombre_modelo: str = MODELO_LOCAL):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ValueError(
+                "El backend de embeddings 'local' requiere el paquete sentence-transformers "
+                "(pip install sentence-transformers)."
+            ) from e
+        self.modelo = SentenceTransformer(nombre_modelo, device="cpu")
+        self._lock = threading.Lock()
+        self._pendientes: list[tuple[str, Future]] = []
+        self._hay_pendientes = threading.Condition(self._lock)
+        threading.Thread(target=self._procesar_microlotes, name="fondoia-embeddings-local", daemon=True).start()
+
+    def _codificar(self, textos: list[str]) -> list[list[float]]:
+        return self.modelo.encode(textos, batch_size=MICROLOTE_MAX, normalize_embeddings=True).tolist()
+
+    def _procesar_microlotes(self):
+        while True:
+            with self._hay_pendientes:
+                while not self._pendientes:
+                    self._hay_pendientes.wait()
+                # Damos un margen breve para que se sumen otras queries concurrentes al lote
+                limite = time.monotonic() + MICROLOTE_ESPERA_MS / 1000
+                while len(self._pendientes) < MICROLOTE_MAX and time.monotonic() < limite:
+                    self._hay_pendientes.wait(timeout=limite - time.monotonic())
+                lote, self._pendientes = self._pendientes[:MICROLOTE_MAX], self._pendientes[MICROLOTE_MAX:]
+            try:
+                vectores = self._codificar([texto for texto, _ in lote])
+                for (_, futuro), vector in zip(lote, vectores):
+                    futuro.set_result(vector)
+            except Exception as e:
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._codificar(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        futuro: Future = Future()
+        with self._hay_pendientes:
+            self._pendientes.append((text, futuro))
+            self._hay_pendientes.notify()
+        return futuro.result()
+
+def crear_backend(nombre: str = EMBEDDINGS_BACKEND) -> tuple[Embeddings, str]:
+    """Instancia el backend de embeddings indicado. Retorna (embeddings, nombre_del_modelo)."""
+    if nombre == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("No se encontró GEMINI_API_KEY en el entorno para extraer embeddings.")
+        return GoogleGenerativeAIEmbeddings(model=MODELO_GOOGLE, google_api_key=api_key), MODELO_GOOGLE
+    if nombre == "local":
+        return EmbeddingsLocales(MODELO_LOCAL), f"local/{MODELO_LOCAL}"
+    if nombre == "hashing":
+        return EmbeddingsHashing(DIMENSION_HASHING), f"hashing/{DIMENSION_HASHING}"
+    raise ValueError(f"Backend de embeddings desconocido: {nombre}")
+
+def nombre_coleccion(nombre: str = EMBEDDINGS_BACKEND) -> str:
+    """
+    Colección de Chroma de cada backend, para que nunca se mezclen vectores de modelos distintos.
+    Google conserva la colección por defecto de LangChain, donde ya están los documentos indexados.
+    """
+    if nombre == "google":
+        return "langchain"
+    return f"fondoia_{nombre}"
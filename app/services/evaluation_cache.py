@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from app.models import PerfilPyme, ConvocatoriaSubvencion, ResultadoEvaluacion
+from app.services.cache import CacheLRU, abrir_sqlite
+
+# Backend ("sqlite" o "memoria"), caducidad y tamaño de la caché de evaluaciones
+EVAL_CACHE_BACKEND = os.getenv("FONDOIA_EVAL_CACHE_BACKEND", "sqlite")
+EVAL_CACHE_TTL = float(os.getenv("FONDOIA_EVAL_CACHE_TTL", "86400"))
+EVAL_CACHE_MAX = int(os.getenv("FONDOIA_EVAL_CACHE_MAX", "1024"))
+
+def clave_evaluacion(
+    empresa: PerfilPyme,
+    convocatoria: ConvocatoriaSubvencion,
+    contexto_requisitos: str,
+    modelo: str,
+    version_prompt: str
+) -> str:
+    """
+    Hash estable (SHA-256 sobre JSON con claves ordenadas) de todo lo que determina
+    la respuesta del modelo: perfil, convocatoria, contexto RAG, modelo y versión del prompt.
+    """
+    contenido = json.dumps(
+        {
+            "empresa": empresa.model_dump(mode="json"),
+            "convocatoria": convocatoria.model_dump(mode="json"),
+            "contexto": contexto_requisitos,
+            "modelo": modelo,
+            "version_prompt": version_prompt
+        },
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+class CacheEvaluacionMemoria:
+    """Caché de evaluaciones en memoria del proceso (LRU con TTL)."""
+
+    def __init__(self, ttl_segundos: float = EVAL_CACHE_TTL, max_entradas: int = EVAL_CACHE_MAX):
+        self._memoria = CacheLRU(max_entradas=max_entradas, ttl_segundos=ttl_segundos)
+
+    def obtener(self, clave: str) -> ResultadoEvaluacion | None:
+        return self._memoria.obtener(clave)
+
+    def guardar(self, clave: str, resultado: ResultadoEvaluacion):
+        self._memoria.guardar(clave, resultado)
+
+    def cerrar(self):
+        self._memoria.limpiar()
+
+    def estadisticas(self) -> dict:
+        return {"backend": "memoria", **self._memoria.estadisticas()}
+
+class CacheEvaluacionSQLite:
+    """
+    Caché de evaluaciones persistente en SQLite, compartida por todos los workers.
+    Delante tiene una pequeña LRU en memoria para los aciertos más recientes.
+    """
+
+    def __init__(self, ttl_segundos: float = EVAL_CACHE_TTL, fichero_sqlite: str = "evaluaciones.sqlite3"):
+        self.ttl_segundos = ttl_segundos
+        self._memoria = CacheLRU(max_entradas=EVAL_CACHE_MAX, ttl_segundos=ttl_segundos)
+        self._lock = threading.Lock()
+        self._db = abrir_sqlite(fichero_sqlite)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS evaluaciones "
+            "(clave TEXT PRIMARY KEY, resultado TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.aciertos_disco = 0
+        self.fallos = 0
+
+    def obtener(self, clave: str) -> ResultadoEvaluacion | None:
+        resultado = self._memoria.obtener(clave)
+        if resultado is not None:
+            return resultado
+
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT resultado FROM evaluaciones WHERE clave = ? AND expira > ?", (clave, time.time())
+            ).fetchone()
+        if fila is None:
+            self.fallos += 1
+            return None
+
+        self.aciertos_disco += 1
+        resultado = ResultadoEvaluacion.model_validate_json(fila[0])
+        self._memoria.guardar(clave, resultado)
+        return resultado
+
+    def guardar(self, clave: str, resultado: ResultadoEvaluacion):
+        self._memoria.guardar(clave, resultado)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO evaluaciones (clave, resultado, expira) VALUES (?, ?, ?)",
+                (clave, resultado.model_dump_json(), time.time() + self.ttl_segundos)
+            )
+            # Purgamos las entradas caducadas de paso, para que el fichero no crezca sin límite
+            self._db.execute("DELETE FROM evaluaciones WHERE expira <= ?", (time.time(),))
+            self._db.commit()
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+    def estadisticas(self) -> dict:
+        memoria = self._memoria.estadisticas()
+        return {
+            "backend": "sqlite",
+            "entradas_memoria": memoria["entradas"],
+            "aciertos_memoria": memoria["aciertos"],
+            "aciertos_disco": self.aciertos_disco,
+            "fallos": self.fallos
+        }
+
+def crear_cache_evaluaciones():
+    """Instancia el backend de caché configurado en FONDOIA_EVAL_CACHE_BACKEND."""
+    if EVAL_CACHE_BACKEND == "memoria":
+        return CacheEvaluacionMemoria()
+    if EVAL_CACHE_BACKEND == "sqlite":
+        return CacheEvaluacionSQLite()
+    raise ValueError(f"Backend de caché de evaluaciones desconocido: {EVAL_CACHE_BACKEND}")
@@ -1,15 +1,39 @@
 import os
 import json
 import asyncio
+import threading
 from fastapi import HTTPException
-import google.generativeai as genai
 
 from app.models import PerfilPyme, ConvocatoriaSubvencion, ResultadoEvaluacion
+from app.services.evaluation_cache import clave_evaluacion, crear_cache_evaluaciones
+from app.services.llm_gateway import generar_texto
+from app.services.metricas import medir
 
-# Configurar de forma segura la clave del entorno
-api_key = os.getenv("GEMINI_API_KEY")
-if api_key:
-    genai.configure(api_key=api_key)
+MODELO_EVALUACION = "gemini-2.5-flash"
+# Incrementar al cambiar el prompt o la instrucción de sistema: invalida la caché de evaluaciones
+VERSION_PROMPT = "1"
+
+_lock = threading.Lock()
+_cache_evaluaciones = None
+
+def obtener_cache_evaluaciones():
+    """Retorna la caché (compartida por proceso) de resultados de evaluación"""
+    global _cache_evaluaciones
+    if _cache_evaluaciones is None:
+        with _lock:
+            if _cache_evaluaciones is None:
+                _cache_evaluaciones = crear_cache_evaluaciones()
+    return _cache_evaluaciones
+
+def cerrar_cache_evaluaciones():
+    global _cache_evaluaciones
+    with _lock:
+        cache, _cache_evaluaciones = _cache_evaluaciones, None
+    if cache is not None:
+        cache.cerrar()
+
+def estadisticas_cache() -> dict | None:
+    return _cache_evaluaciones.estadisticas() if _cache_evaluaciones is not None else None
 
 async def evaluar_elegibilidad(empresa: PerfilPyme, convocatoria: ConvocatoriaSubvencion, contexto_requisitos: str) -> ResultadoEvaluacion:
     """
@@ -17,6 +41,32 @@ async def evaluar_elegibilidad(empresa: PerfilPyme, convocatoria: ConvocatoriaSu
     Utiliza el contexto RAG de ChromaDB para analizar la normativa.
     Retorna un ResultadoEvaluacion estructurado.
     """
+    resultado, _ = await evaluar_elegibilidad_cacheada(empresa, convocatoria, contexto_requisitos)
+    return resultado
+
+async def evaluar_elegibilidad_cacheada(
+    empresa: PerfilPyme,
+    convocatoria: ConvocatoriaSubvencion,
+    contexto_requisitos: str
+) -> tuple[ResultadoEvaluacion, bool]:
+    """
+    Igual que evaluar_elegibilidad, pero retorna también si el resultado procede de la caché.
+    Una evaluación repetida (mismos datos, contexto, modelo y versión de prompt) no llama a Gemini.
+    """
+    cache = obtener_cache_evaluaciones()
+    clave = clave_evaluacion(empresa, convocatoria, contexto_requisitos, MODELO_EVALUACION, VERSION_PROMPT)
+    # Con el backend SQLite (por defecto) la caché lee y escribe en disco, y puede esperar al bloqueo
+    # de escritura de otro worker: fuera del event loop
+    with medir("cache_evaluacion"):
+        resultado = await asyncio.to_thread(cache.obtener, clave)
+    if resultado is not None:
+        return resultado, True
+
+    resultado = await _evaluar_con_gemini(empresa, convocatoria, contexto_requisitos)
+    await asyncio.to_thread(cache.guardar, clave, resultado)
+    return resultado, False
+
+async def _evaluar_con_gemini(empresa: PerfilPyme, convocatoria: ConvocatoriaSubvencion, contexto_requisitos: str) -> ResultadoEvaluacion:
     if not os.getenv("GEMINI_API_KEY"):
         raise HTTPException(
             status_code=500,
@@ -55,29 +105,26 @@ async def evaluar_elegibilidad(empresa: PerfilPyme, convocatoria: ConvocatoriaSu
     """
     
     try:
-        # Usamos un execution thread no bloqueante ya que el SDK genai de Google hasta la fecha
-        # usa requests bloqueantes o asyncio.to_thread puede ser necesario.
-        # Las ultimas versiones tienen `generate_content_async`
-        model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
-            system_instruction=system_instruction
-        )
-        
         # Le indicamos explícitamente a Gemini que deseamos que el JSON 
         # retornado siga estrictamente la estructura de nuestro esquema de Pydantic ResultadoEvaluacion.
-        response = await model.generate_content_async(
+        # La pasarela común aplica límites de concurrencia, reintentos y coalescencia de peticiones.
+        texto = await generar_texto(
+            MODELO_EVALUACION,
+            system_instruction,
             prompt,
-            generation_config=genai.GenerationConfig(
-                response_mime_type="application/json",
-                response_schema=ResultadoEvaluacion
-            ),
+            # Diccionario equivalente a genai.GenerationConfig (no obliga a importar genai aquí)
+            generation_config={
+                "response_mime_type": "application/json",
+                "response_schema": ResultadoEvaluacion
+            },
             # Un timeout generoso para evitar cuelgues largos
-            request_options={"timeout": 30}
+            timeout=30
         )
         
         # Validar y parsear el JSON de respuesta con el modelo Pydantic
-        respuesta_json = json.loads(response.text)
-        resultado = ResultadoEvaluacion(**respuesta_json)
+        with medir("parseo"):
+            respuesta_json = json.loads(texto)
+            resultado = ResultadoEvaluacion(**respuesta_json)
         return resultado
         
     except Exception as e:
@@ -0,0 +1,108 @@
+import os
+import time
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.models import ResultadoIngesta
+from app.services.vector_db import extraer_fragmentos, indexar_fragmentos
+
+# Procesos para leer y dividir PDFs y tamaño de los lotes de embeddings
+INGESTA_PROCESOS = int(os.getenv("FONDOIA_INGESTA_PROCESOS", str(os.cpu_count() or 2)))
+INGESTA_TAMANO_LOTE = int(os.getenv("FONDOIA_INGESTA_TAMANO_LOTE", "64"))
+
+def id_documento_desde_archivo(ruta: str) -> str:
+    """Deriva el ID de documento del nombre de archivo: 'BOJA_FTE_AND_26.pdf' -> 'BOJA_FTE_AND_26_pdf'."""
+    return Path(ruta).name.replace(".", "_")
+
+def _extraer_con_tiempo(ruta: str, id_documento: str) -> tuple[list[tuple[str, dict]], float]:
+    inicio = time.perf_counter()
+    fragmentos = extraer_fragmentos(ruta, id_documento)
+    return fragmentos, time.perf_counter() - inicio
+
+def ingestar_pdfs(
+    documentos: list[tuple[str, str]],
+    procesos: int = INGESTA_PROCESOS,
+    tamano_lote: int = INGESTA_TAMANO_LOTE
+) -> list[ResultadoIngesta]:
+    """
+    Ingiere una lista de (ruta_pdf, id_documento). La lectura y división de los PDFs se
+    reparte en un pool de procesos; en cuanto un documento está dividido, este proceso lo
+    sincroniza con Chroma (IDs deterministas, solo los fragmentos nuevos o modificados se
+    vectorizan) mientras el pool sigue con los siguientes. Volver a ejecutarlo sobre los
+    mismos PDFs no cambia nada; sobre una versión corregida, solo actualiza lo que cambió.
+    Retorna el resultado (con tiempos y rendimiento) de cada documento.
+    """
+    resultados = []
+    # "spawn" evita heredar hilos y conexiones del proceso padre (p. ej. un worker de la API)
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, procesos), mp_context=contexto) as pool:
+        futuros = {
+            pool.submit(_extraer_con_tiempo, ruta, id_documento): (ruta, id_documento)
+            for ruta, id_documento in documentos
+        }
+        for futuro in as_completed(futuros):
+            ruta, id_documento = futuros[futuro]
+            resultado = ResultadoIngesta(id_documento=id_documento, archivo=Path(ruta).name)
+            try:
+                fragmentos, resultado.segundos_extraccion = futuro.result()
+                resultado.fragmentos = len(fragmentos)
+
+                inicio = time.perf_counter()
+                resultado.fragmentos_nuevos, resultado.fragmentos_eliminados = indexar_fragmentos(
+                    id_documento, fragmentos, tamano_lote
+                )
+                resultado.segundos_indexacion = time.perf_counter() - inicio
+
+                total = resultado.segundos_extraccion + resultado.segundos_indexacion
+                resultado.fragmentos_por_segundo = round(resultado.fragmentos / total, 2) if total else 0.0
+            except Exception as e:
+                resultado.error = str(e)
+            resultados.append(resultado)
+    return resultados
+
+def buscar_pdfs(directorio: str) -> list[tuple[str, str]]:
+    """Lista (ruta, id_documento) de todos los PDFs de un directorio (recursivo)."""
+    rutas = sorted(p for p in Path(directorio).rglob("*") if p.suffix.lower() == ".pdf")
+    return [(str(p), id_documento_desde_archivo(str(p))) for p in rutas]
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Ingesta masiva de boletines (BOE/BOJA) en PDF en la base vectorial.")
+    parser.add_argument("rutas", nargs="+", help="Archivos PDF o directorios que contengan PDFs")
+    parser.add_argument("--procesos", type=int, default=INGESTA_PROCESOS, help="Procesos para leer y dividir PDFs")
+    parser.add_argument("--tamano-lote", type=int, default=INGESTA_TAMANO_LOTE, help="Fragmentos por lote de embeddings")
+    args = parser.parse_args()
+
+    documentos = []
+    for ruta in args.rutas:
+        if os.path.isdir(ruta):
+            documentos.extend(buscar_pdfs(ruta))
+        else:
+            documentos.append((ruta, id_documento_desde_archivo(ruta)))
+
+    inicio = time.perf_counter()
+    resultados = ingestar_pdfs(documentos, procesos=args.procesos, tamano_lote=args.tamano_lote)
+    duracion = time.perf_counter() - inicio
+
+    for r in resultados:
+        if r.error:
+            print(f"[ERROR] {r.archivo}: {r.error}")
+        else:
+            print(
+                f"[OK] {r.id_documento}: {r.fragmentos} fragmentos ({r.fragmentos_nuevos} nuevos, "
+                f"{r.fragmentos_eliminados} eliminados), "
+                f"extracción {r.segundos_extraccion:.2f}s, indexación {r.segundos_indexacion:.2f}s, "
+                f"{r.fragmentos_por_segundo} fragmentos/s"
+            )
+    total_fragmentos = sum(r.fragmentos for r in resultados)
+    print(
+        f"{len(resultados)} documentos, {total_fragmentos} fragmentos en {duracion:.2f}s "
+        f"({total_fragmentos / duracion if duracion else 0:.2f} fragmentos/s)"
+    )
+
+if __name__ == "__main__":
+    main()
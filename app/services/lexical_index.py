@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import math
+import hashlib
+import unicodedata
+from collections import Counter
+
+from app.services.cache import CacheLRU
+
+# Directorio de los índices léxicos (uno por documento), junto a CHROMA_DB_DIR
+BM25_DIR = os.getenv("FONDOIA_BM25_DIR", "./bm25_index")
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Palabras vacías frecuentes en los boletines que no aportan a la búsqueda léxica
+STOPWORDS = frozenset(
+    "a al ante con de del el en entre es la las lo los o para por que se sin su sus un una y".split()
+)
+
+# Números con separadores de miles/decimales ("1.000.000", "62.01") o palabras
+_PATRON_TOKEN = re.compile(r"\d[\d.,]*\d|\d|[a-z]+")
+
+# Importes con punto de miles y coma decimal opcional ("250.000", "1.250.000,50")
+_MILES = re.compile(r"\d{1,3}(\.\d{3})+(,\d+)?")
+
+# Códigos CNAE con punto ("62.01"), que también se indexan sin él ("6201")
+_CNAE = re.compile(r"\d{2}\.\d{1,2}")
+
+# Cambia al modificar tokenizar: los índices guardados con otra versión se reconstruyen al cargarse
+VERSION_TOKENIZADOR = 2
+
+def normalizar_numero(token: str) -> str:
+    """
+    Forma canónica de una cifra: punto de miles y coma decimal a la española, o punto decimal
+    (como en "250000.0" de un float), sin ceros decimales sobrantes: "250.000", "250000,00" y
+    "250000.0" dan "250000"; "1.250.000,50" da "1250000.5"; "3.2" se queda igual.
+    """
+    if _MILES.fullmatch(token):
+        entero, _, decimales = token.partition(",")
+        entero = entero.replace(".", "")
+    elif token.count(",") == 1 and "." not in token:
+        entero, _, decimales = token.partition(",")
+    elif token.count(".") == 1 and "," not in token:
+        entero, _, decimales = token.partition(".")
+    else:
+        # Numeraciones ("1.2.3") u otros formatos: sin cambios
+        return token
+    decimales = decimales.rstrip("0")
+    return f"{entero}.{decimales}" if decimales else entero
+
+def tokenizar(texto: str) -> list[str]:
+    """Minúsculas, sin tildes, cifras normalizadas (normalizar_numero) y sin palabras vacías."""
+    sin_tildes = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii")
+    tokens = []
+    for token in _PATRON_TOKEN.findall(sin_tildes):
+        if token[0].isdigit():
+            tokens.append(normalizar_numero(token))
+            if _CNAE.fullmatch(token):
+                tokens.append(token.replace(".", ""))
+        elif token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+def es_consulta_lexica(query: str, umbral: float = 0.5) -> bool:
+    """True si la consulta es mayoritariamente códigos y cifras (CNAE, importes, artículos)."""
+    tokens = tokenizar(query)
+    if not tokens:
+        return False
+    numericos = sum(1 for t in tokens if t[0].isdigit())
+    return numericos / len(tokens) >= umbral
+
+class IndiceBM25:
+    """Índice invertido BM25 de los fragmentos de un documento (incluye sus textos y posiciones)."""
+
+    def __init__(self, ids: list[str], textos: list[str], posiciones: list[int], postings: dict[str, list[list[int]]], longitudes: list[int]):
+        self.ids = ids
+        self.textos = textos
+        self.posiciones = posiciones
+        self.postings = postings
+        self.longitudes = longitudes
+        self.media_longitud = (sum(longitudes) / len(longitudes)) if longitudes else 0.0
+
+    @classmethod
+    def construir(cls, fragmentos: list[tuple[str, str, int]]) -> "IndiceBM25":
+        """Construye el índice a partir de (id_fragmento, texto, posicion)."""
+        ids, textos, posiciones, longitudes = [], [], [], []
+        postings: dict[str, list[list[int]]] = {}
+        for indice, (id_fragmento, texto, posicion) in enumerate(fragmentos):
+            frecuencias = Counter(tokenizar(texto))
+            ids.append(id_fragmento)
+            textos.append(texto)
+            posiciones.append(posicion)
+            longitudes.append(sum(frecuencias.values()))
+            for termino, tf in frecuencias.items():
+                postings.setdefault(termino, []).append([indice, tf])
+        return cls(ids, textos, posiciones, postings, longitudes)
+
+    def buscar(self, query: str, k: int) -> list[tuple[int, float]]:
+        """Retorna [(indice_fragmento, puntuacion)] de los k mejores fragmentos."""
+        n = len(self.ids)
+        puntuaciones: dict[int, float] = {}
+        for termino in set(tokenizar(query)):
+            lista = self.postings.get(termino)
+            if not lista:
+                continue
+            idf = math.log(1 + (n - len(lista) + 0.5) / (len(lista) + 0.5))
+            for indice, tf in lista:
+                norma = 1 - BM25_B + BM25_B * self.longitudes[indice] / (self.media_longitud or 1)
+                puntuaciones[indice] = puntuaciones.get(indice, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norma)
+        return sorted(puntuaciones.items(), key=lambda par: -par[1])[:k]
+
+    def a_json(self) -> dict:
+        return {
+            "version_tokenizador": VERSION_TOKENIZADOR,
+            "ids": self.ids,
+            "textos": self.textos,
+            "posiciones": self.posiciones,
+            "postings": self.postings,
+            "longitudes": self.longitudes
+        }
+
+def _ruta_indice(id_documento: str) -> str:
+    nombre = hashlib.sha256(id_documento.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(BM25_DIR, f"{nombre}.json")
+
+class AlmacenIndicesLexicos:
+    """
+    Persistencia de los índices BM25 en disco (un JSON por documento) con una caché en memoria
+    que se refresca sola cuando otro proceso reescribe el fichero (comparando su mtime).
+    """
+
+    def __init__(self, max_en_memoria: int = 256):
+        self._memoria = CacheLRU(max_entradas=max_en_memoria)
+
+    def guardar(self, id_documento: str, indice: IndiceBM25):
+        os.makedirs(BM25_DIR, exist_ok=True)
+        ruta = _ruta_indice(id_documento)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"id_documento": id_documento, **indice.a_json()}, f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+        self._memoria.invalidar(id_documento)
+
+    def existe(self, id_documento: str) -> bool:
+        return os.path.exists(_ruta_indice(id_documento))
+
+    def _mtime(self, id_documento: str) -> int | None:
+        try:
+            return os.stat(_ruta_indice(id_documento)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def en_memoria(self, id_documento: str) -> IndiceBM25 | None:
+        """El índice si ya está cargado y al día, o None si no existe o habría que leerlo de disco."""
+        mtime = self._mtime(id_documento)
+        if mtime is None:
+            return None
+        en_memoria = self._memoria.obtener(id_documento)
+        if en_memoria is not None and en_memoria[0] == mtime:
+            return en_memoria[1]
+        return None
+
+    def obtener(self, id_documento: str) -> IndiceBM25 | None:
+        ruta = _ruta_indice(id_documento)
+        mtime = self._mtime(id_documento)
+        if mtime is None:
+            return None
+
+        en_memoria = self._memoria.obtener(id_documento)
+        if en_memoria is not None and en_memoria[0] == mtime:
+            return en_memoria[1]
+
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        if datos.get("version_tokenizador") != VERSION_TOKENIZADOR:
+            # Índice con otra tokenización: se reconstruye desde sus propios textos
+            indice = IndiceBM25.construir(list(zip(datos["ids"], datos["textos"], datos["posiciones"])))
+            self.guardar(id_documento, indice)
+            mtime = self._mtime(id_documento)
+        else:
+            indice = IndiceBM25(datos["ids"], datos["textos"], datos["posiciones"], datos["postings"], datos["longitudes"])
+        self._memoria.guardar(id_documento, (mtime, indice))
+        return indice
+
+    def eliminar(self, id_documento: str):
+        try:
+            os.remove(_ruta_indice(id_documento))
+        except FileNotFoundError:
+            pass
+        self._memoria.invalidar(id_documento)
+
+def fusion_rrf(rankings: list[list[str]], k: int, constante: int = 60) -> list[str]:
+    """Reciprocal Rank Fusion: combina varios rankings de IDs en uno solo."""
+    puntuaciones: dict[str, float] = {}
+    for ranking in rankings:
+        for posicion, id_ in enumerate(ranking):
+            puntuaciones[id_] = puntuaciones.get(id_, 0.0) + 1.0 / (constante + posicion + 1)
+    return sorted(puntuaciones, key=lambda id_: -puntuaciones[id_])[:k]
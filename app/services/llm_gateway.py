@@ -0,0 +1,270 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import TYPE_CHECKING
+from google.api_core import exceptions as google_exceptions
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+from app.services.metricas import medir, registrar_tokens
+
+logger = logging.getLogger(__name__)
+
+# Límites por modelo: llamadas simultáneas por worker y llamadas por minuto (token bucket)
+LIMITES_MODELO = {
+    "gemini-2.5-flash": (
+        int(os.getenv("FONDOIA_LLM_CONCURRENCIA_FLASH", "8")),
+        float(os.getenv("FONDOIA_LLM_RPM_FLASH", "600"))
+    ),
+    "gemini-2.5-pro": (
+        int(os.getenv("FONDOIA_LLM_CONCURRENCIA_PRO", "4")),
+        float(os.getenv("FONDOIA_LLM_RPM_PRO", "120"))
+    ),
+}
+LIMITES_POR_DEFECTO = (4, 60.0)
+
+# Reintentos con backoff exponencial y jitter completo ante errores transitorios
+LLM_MAX_INTENTOS = int(os.getenv("FONDOIA_LLM_MAX_INTENTOS", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("FONDOIA_LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("FONDOIA_LLM_BACKOFF_MAX", "20.0"))
+
+ERRORES_REINTENTABLES = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    asyncio.TimeoutError,
+)
+
+class LimitadorTasa:
+    """Token bucket asíncrono: permite ráfagas de hasta `capacidad` y repone `por_minuto` fichas por minuto."""
+
+    def __init__(self, por_minuto: float, capacidad: float | None = None):
+        self.por_segundo = por_minuto / 60
+        self.capacidad = capacidad or max(1.0, self.por_segundo)
+        self._fichas = self.capacidad
+        self._ultima = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def adquirir(self):
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultima) * self.por_segundo)
+                self._ultima = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.por_segundo)
+
+_lock = threading.Lock()
+_genai = None
+_modelos: dict[tuple[str, str], "genai.GenerativeModel"] = {}
+_semaforos: dict[str, asyncio.Semaphore] = {}
+_limitadores: dict[str, LimitadorTasa] = {}
+# Llamadas en curso compartidas por peticiones idénticas: clave -> [tarea, número de peticiones esperándola]
+_en_vuelo: dict[str, list] = {}
+_contadores = {"llamadas": 0, "reintentos": 0, "coalescidas": 0, "errores": 0}
+
+def cargar_genai():
+    """
+    Importa y configura google.generativeai la primera vez que se necesita: su import
+    cuesta más de un segundo y no hace falta para arrancar ni para las rutas sin IA.
+    """
+    global _genai
+    if _genai is not None:
+        return _genai
+    with _lock:
+        if _genai is None:
+            import google.generativeai as genai
+            # Configurar de forma segura la clave del entorno
+            api_key = os.getenv("GEMINI_API_KEY")
+            if api_key:
+                genai.configure(api_key=api_key)
+            _genai = genai
+    return _genai
+
+def obtener_modelo(modelo: str, system_instruction: str) -> "genai.GenerativeModel":
+    """Instancia de GenerativeModel reutilizada por (modelo, instrucción de sistema)."""
+    clave = (modelo, system_instruction)
+    instancia = _modelos.get(clave)
+    if instancia is None:
+        genai = cargar_genai()
+        with _lock:
+            instancia = _modelos.get(clave)
+            if instancia is None:
+                instancia = genai.GenerativeModel(model_name=modelo, system_instruction=system_instruction)
+                _modelos[clave] = instancia
+    return instancia
+
+def _limites(modelo: str) -> tuple[asyncio.Semaphore, LimitadorTasa]:
+    if modelo not in _semaforos:
+        concurrencia, por_minuto = LIMITES_MODELO.get(modelo, LIMITES_POR_DEFECTO)
+        _semaforos[modelo] = asyncio.Semaphore(concurrencia)
+        _limitadores[modelo] = LimitadorTasa(por_minuto)
+    return _semaforos[modelo], _limitadores[modelo]
+
+def _espera_backoff(intento: int) -> float:
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** intento))
+
+async def _llamar_con_reintentos(modelo: str, system_instruction: str, prompt: str, **kwargs):
+    """Llamada a generate_content_async respetando límites y reintentando errores transitorios."""
+    _, limitador = _limites(modelo)
+    instancia = obtener_modelo(modelo, system_instruction)
+    for intento in range(LLM_MAX_INTENTOS):
+        await limitador.adquirir()
+        try:
+            _contadores["llamadas"] += 1
+            # Etapa por modelo (p. ej. "llm_gemini-2.5-flash"); en streaming mide hasta el primer fragmento
+            with medir(f"llm_{modelo}"):
+                return await instancia.generate_content_async(prompt, **kwargs)
+        except ERRORES_REINTENTABLES as e:
+            if intento == LLM_MAX_INTENTOS - 1:
+                _contadores["errores"] += 1
+                raise
+            _contadores["reintentos"] += 1
+            espera = _espera_backoff(intento)
+            logger.warning("Error transitorio de %s (%s); reintento %d en %.1fs", modelo, type(e).__name__, intento + 1, espera)
+            await asyncio.sleep(espera)
+        except Exception:
+            _contadores["errores"] += 1
+            raise
+
+async def _generar(modelo: str, system_instruction: str, prompt: str, generation_config, timeout: float) -> str:
+    semaforo, _ = _limites(modelo)
+    async with semaforo:
+        response = await _llamar_con_reintentos(
+            modelo, system_instruction, prompt,
+            generation_config=generation_config,
+            request_options={"timeout": timeout}
+        )
+        registrar_tokens(modelo, getattr(response, "usage_metadata", None))
+        return response.text
+
+async def generar_texto(modelo: str, system_instruction: str, prompt: str, generation_config=None, timeout: float = 30) -> str:
+    """
+    Genera una respuesta completa con el modelo indicado y retorna su texto.
+    Las peticiones idénticas (modelo, instrucción, prompt y configuración) que coinciden
+    en el tiempo comparten una única llamada al modelo.
+    """
+    clave = hashlib.sha256(
+        "\x00".join([modelo, system_instruction, prompt, repr(generation_config)]).encode("utf-8")
+    ).hexdigest()
+
+    entrada = _en_vuelo.get(clave)
+    if entrada is None:
+        tarea = asyncio.ensure_future(_generar(modelo, system_instruction, prompt, generation_config, timeout))
+        entrada = [tarea, 0]
+        _en_vuelo[clave] = entrada
+        tarea.add_done_callback(lambda _: _quitar_en_vuelo(clave, entrada))
+    else:
+        _contadores["coalescidas"] += 1
+
+    tarea = entrada[0]
+    entrada[1] += 1
+    try:
+        # shield: si un cliente se desconecta, no cancelamos la llamada que comparten los demás
+        return await asyncio.shield(tarea)
+    finally:
+        entrada[1] -= 1
+        # Si se ha ido el último que la esperaba, nadie va a usar la respuesta: se cancela la llamada
+        if entrada[1] == 0 and not tarea.done():
+            tarea.cancel()
+            _quitar_en_vuelo(clave, entrada)
+
+def _quitar_en_vuelo(clave: str, entrada: list):
+    # Solo si sigue siendo la misma llamada (tras cancelarla puede haber empezado otra con la misma clave)
+    if _en_vuelo.get(clave) is entrada:
+        del _en_vuelo[clave]
+
+class StreamGeneracion:
+    """
+    Iterador asíncrono de los fragmentos de texto de una generación en streaming que ocupa un hueco
+    de concurrencia del modelo. El hueco se libera al agotar el stream o al cerrarlo (aclose o salida
+    del bloque async with); cerrarlo también corta la respuesta del modelo si aún no había terminado.
+    """
+
+    def __init__(self, modelo: str, response, semaforo: asyncio.Semaphore):
+        self._modelo = modelo
+        self._response = response
+        self._iterador = None
+        self._semaforo = semaforo
+        self._uso = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._semaforo is None:
+            raise StopAsyncIteration
+        if self._iterador is None:
+            self._iterador = self._response.__aiter__()
+        try:
+            while True:
+                chunk = await self._iterador.__anext__()
+                # El último fragmento trae el recuento de tokens de toda la respuesta
+                self._uso = getattr(chunk, "usage_metadata", None) or self._uso
+                # Los últimos fragmentos pueden no traer texto (solo metadatos de finalización)
+                if chunk.parts:
+                    return chunk.text
+        except BaseException:
+            self._liberar()
+            raise
+
+    def _liberar(self):
+        if self._semaforo is not None:
+            semaforo, self._semaforo = self._semaforo, None
+            registrar_tokens(self._modelo, self._uso)
+            semaforo.release()
+
+    async def aclose(self):
+        if self._semaforo is None:
+            return
+        try:
+            if self._iterador is not None and hasattr(self._iterador, "aclose"):
+                await self._iterador.aclose()
+            # Llamada gRPC de la que lee la respuesta: se cancela para no seguir recibiendo fragmentos
+            upstream = getattr(self._response, "_iterator", None)
+            if hasattr(upstream, "cancel"):
+                upstream.cancel()
+            elif hasattr(upstream, "aclose"):
+                await upstream.aclose()
+        except Exception as e:
+            logger.warning("No se pudo cerrar el stream de %s: %s", self._modelo, e)
+        finally:
+            self._liberar()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.aclose()
+
+async def abrir_stream(modelo: str, system_instruction: str, prompt: str, generation_config=None, timeout: float = 300) -> StreamGeneracion:
+    """
+    Abre una generación en streaming (con límites y reintentos en la apertura) y retorna un
+    iterador asíncrono de fragmentos de texto (StreamGeneracion). El hueco de concurrencia del
+    modelo se libera al agotar o cerrar el iterador: quien lo abre es responsable de cerrarlo.
+    """
+    semaforo, _ = _limites(modelo)
+    await semaforo.acquire()
+    try:
+        response = await _llamar_con_reintentos(
+            modelo, system_instruction, prompt,
+            generation_config=generation_config,
+            stream=True,
+            request_options={"timeout": timeout}
+        )
+    except BaseException:
+        semaforo.release()
+        raise
+    return StreamGeneracion(modelo, response, semaforo)
+
+def estadisticas() -> dict:
+    return {**_contadores, "en_vuelo": len(_en_vuelo), "modelos_cacheados": len(_modelos)}
@@ -0,0 +1,58 @@
+import threading
+
+from app.services.cache import abrir_sqlite
+
+def comparar_manifiestos(anteriores: dict[str, int], actuales: dict[str, int]) -> tuple[list[str], list[str], list[str]]:
+    """
+    Compara el manifiesto indexado de un documento con sus fragmentos actuales ({id_fragmento: posicion}).
+    Retorna (nuevos, eliminados, movidos): los que hay que vectorizar, los que hay que borrar y los que
+    siguen pero en otra posición (solo cambian sus metadatos).
+    """
+    nuevos = [id_ for id_ in actuales if id_ not in anteriores]
+    eliminados = [id_ for id_ in anteriores if id_ not in actuales]
+    movidos = [id_ for id_, posicion in actuales.items() if id_ in anteriores and anteriores[id_] != posicion]
+    return nuevos, eliminados, movidos
+
+class ManifiestoDocumentos:
+    """
+    Manifiesto por documento de los fragmentos indexados en Chroma: ID del fragmento
+    (hash de contenido) y su posición en el documento. Permite comparar una nueva versión
+    de un documento con la indexada y tocar solo los fragmentos que han cambiado.
+    """
+
+    def __init__(self, fichero_sqlite: str = "manifiesto.sqlite3"):
+        self._lock = threading.Lock()
+        self._db = abrir_sqlite(fichero_sqlite)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fragmentos ("
+            "id_documento TEXT NOT NULL, id_fragmento TEXT NOT NULL, posicion INTEGER NOT NULL, "
+            "PRIMARY KEY (id_documento, id_fragmento))"
+        )
+        self._db.commit()
+
+    def obtener(self, id_documento: str) -> dict[str, int]:
+        """Retorna {id_fragmento: posicion} del documento (vacío si no tiene manifiesto)."""
+        with self._lock:
+            filas = self._db.execute(
+                "SELECT id_fragmento, posicion FROM fragmentos WHERE id_documento = ?", (id_documento,)
+            ).fetchall()
+        return dict(filas)
+
+    def reemplazar(self, id_documento: str, fragmentos: dict[str, int]):
+        """Sustituye atómicamente el manifiesto del documento."""
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM fragmentos WHERE id_documento = ?", (id_documento,))
+                self._db.executemany(
+                    "INSERT INTO fragmentos (id_documento, id_fragmento, posicion) VALUES (?, ?, ?)",
+                    [(id_documento, id_fragmento, posicion) for id_fragmento, posicion in fragmentos.items()]
+                )
+
+    def documentos(self) -> list[str]:
+        with self._lock:
+            filas = self._db.execute("SELECT DISTINCT id_documento FROM fragmentos").fetchall()
+        return [fila[0] for fila in filas]
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
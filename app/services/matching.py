@@ -0,0 +1,116 @@
+import os
+import asyncio
+from typing import AsyncIterator
+from fastapi import HTTPException
+
+from app.models import PerfilPyme, ConvocatoriaSubvencion, ResultadoEvaluacion, ResultadoLoteItem, ResultadoCribadoPar
+from app.services.contexto import presupuesto_tokens
+from app.services.ia_evaluator import MODELO_EVALUACION, evaluar_elegibilidad_cacheada
+from app.services.prescreening import cribar, obtener_almacen_requisitos, resultado_descartado
+from app.services.vector_db import buscar_requisitos_relevantes_async
+
+# Evaluaciones simultáneas por lote (y tope para lo que pida el cliente)
+LOTE_CONCURRENCIA = int(os.getenv("FONDOIA_LOTE_CONCURRENCIA", "8"))
+
+async def evaluar_empresa_convocatoria(
+    empresa: PerfilPyme,
+    convocatoria: ConvocatoriaSubvencion
+) -> tuple[ResultadoEvaluacion, str]:
+    """
+    Evalúa la elegibilidad de la empresa para la convocatoria. Si incumple con certeza
+    algún requisito objetivo registrado se descarta sin RAG ni IA; si no, se recupera
+    la normativa relevante y se evalúa con la IA.
+    Retorna el resultado y su origen: "cribado", "cache" o "ia".
+    """
+    # El almacén de requisitos es SQLite (bloqueante): fuera del event loop
+    requisitos = await asyncio.to_thread(obtener_almacen_requisitos().obtener, convocatoria.id_documento_boe)
+    if requisitos is not None:
+        cribado = cribar([empresa], [requisitos])
+        if cribado.descartados[0, 0]:
+            return resultado_descartado(cribado.motivos(0, 0)), "cribado"
+
+    return await _evaluar_con_ia(empresa, convocatoria)
+
+async def _evaluar_con_ia(empresa: PerfilPyme, convocatoria: ConvocatoriaSubvencion) -> tuple[ResultadoEvaluacion, str]:
+    # Búsqueda semántica en base de datos de los requisitos aplicables a la empresa
+    query_pyme = f"CNAE: {empresa.cnae}, Facturación: {empresa.facturacion_anual_eur}, Empleados: {empresa.empleados_plantilla}, Inversión: {empresa.necesidad_inversion}"
+    contexto_filtrado = await buscar_requisitos_relevantes_async(
+        query_pyme, convocatoria.id_documento_boe, presupuesto_tokens=presupuesto_tokens(MODELO_EVALUACION)
+    )
+
+    resultado, desde_cache = await evaluar_elegibilidad_cacheada(empresa, convocatoria, contexto_filtrado)
+    return resultado, "cache" if desde_cache else "ia"
+
+async def evaluar_lote(
+    empresa: PerfilPyme,
+    convocatorias: list[ConvocatoriaSubvencion],
+    concurrencia: int | None = None
+) -> AsyncIterator[ResultadoLoteItem]:
+    """
+    Evalúa una empresa contra varias convocatorias de forma concurrente (acotada) y va
+    entregando cada resultado en cuanto termina, sin respetar el orden de entrada.
+    Las convocatorias descartadas por el cribado de requisitos objetivos se entregan
+    primero y no consumen llamadas a la IA.
+    Un fallo en una convocatoria se reporta en su elemento y no interrumpe el lote.
+    """
+    almacen = obtener_almacen_requisitos()
+    requisitos = await asyncio.to_thread(almacen.obtener_varios, [c.id_documento_boe for c in convocatorias])
+    cribado = cribar([empresa], [requisitos.get(c.id_documento_boe) for c in convocatorias])
+    descartados = cribado.descartados[0]
+
+    pendientes = []
+    for indice, convocatoria in enumerate(convocatorias):
+        if descartados[indice]:
+            yield ResultadoLoteItem(
+                indice=indice,
+                id_convocatoria=convocatoria.id_convocatoria,
+                resultado=resultado_descartado(cribado.motivos(0, indice)),
+                origen="cribado"
+            )
+        else:
+            pendientes.append((indice, convocatoria))
+
+    limite = min(concurrencia or LOTE_CONCURRENCIA, LOTE_CONCURRENCIA)
+    semaforo = asyncio.Semaphore(limite)
+
+    async def evaluar(indice: int, convocatoria: ConvocatoriaSubvencion) -> ResultadoLoteItem:
+        async with semaforo:
+            try:
+                resultado, origen = await _evaluar_con_ia(empresa, convocatoria)
+                return ResultadoLoteItem(
+                    indice=indice,
+                    id_convocatoria=convocatoria.id_convocatoria,
+                    resultado=resultado,
+                    desde_cache=origen == "cache",
+                    origen=origen
+                )
+            except HTTPException as ht_e:
+                error = str(ht_e.detail)
+            except Exception as e:
+                error = f"Error inesperado al evaluar la elegibilidad: {str(e)}"
+            return ResultadoLoteItem(indice=indice, id_convocatoria=convocatoria.id_convocatoria, error=error)
+
+    tareas = [asyncio.create_task(evaluar(i, c)) for i, c in pendientes]
+    try:
+        for siguiente in asyncio.as_completed(tareas):
+            yield await siguiente
+    finally:
+        # Si el cliente corta la conexión, no seguimos gastando llamadas a la IA
+        for tarea in tareas:
+            tarea.cancel()
+
+def cribar_pares(empresas: list[PerfilPyme], convocatorias: list[ConvocatoriaSubvencion]) -> list[ResultadoCribadoPar]:
+    """Criba N empresas x M convocatorias en una pasada con los requisitos registrados. Es bloqueante (SQLite)."""
+    requisitos = obtener_almacen_requisitos().obtener_varios([c.id_documento_boe for c in convocatorias])
+    cribado = cribar(empresas, [requisitos.get(c.id_documento_boe) for c in convocatorias])
+    descartados = cribado.descartados
+    return [
+        ResultadoCribadoPar(
+            indice_empresa=i,
+            indice_convocatoria=j,
+            descartada=bool(descartados[i, j]),
+            motivos=cribado.motivos(i, j)
+        )
+        for i in range(len(empresas))
+        for j in range(len(convocatorias))
+    ]
@@ -0,0 +1,119 @@
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Callable
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+
+# Con gunicorn (-w 4) cada worker tiene sus propias métricas. Si se define PROMETHEUS_MULTIPROC_DIR,
+# /metrics agrega histogramas y contadores de todos los workers (prometheus_client multiproceso).
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+BUCKETS_ETAPA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DURACION_ETAPA = Histogram(
+    "fondoia_etapa_segundos",
+    "Duración de cada etapa interna (embedding, chroma, bm25, contexto, llm, parseo...)",
+    ["etapa"],
+    buckets=BUCKETS_ETAPA
+)
+DURACION_PETICION = Histogram(
+    "fondoia_peticion_segundos",
+    "Duración de las peticiones HTTP por ruta",
+    ["metodo", "ruta", "codigo"],
+    buckets=BUCKETS_ETAPA
+)
+TOKENS_LLM = Counter(
+    "fondoia_llm_tokens",
+    "Tokens consumidos en las llamadas a Gemini",
+    ["modelo", "tipo"]
+)
+
+# Desglose por etapas de la petición en curso (para la cabecera Server-Timing)
+_tiempos_peticion: contextvars.ContextVar[dict[str, float] | None] = contextvars.ContextVar(
+    "fondoia_tiempos_peticion", default=None
+)
+
+@contextmanager
+def medir(etapa: str):
+    """Mide la duración del bloque: la registra en el histograma y en el desglose de la petición."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        DURACION_ETAPA.labels(etapa).observe(duracion)
+        tiempos = _tiempos_peticion.get()
+        if tiempos is not None:
+            # Las etapas repetidas en una misma petición (p. ej. evaluar-lote) se acumulan
+            tiempos[etapa] = tiempos.get(etapa, 0.0) + duracion
+
+def registrar_tokens(modelo: str, uso) -> None:
+    """Suma los tokens de entrada y salida de una respuesta de Gemini (su usage_metadata)."""
+    if uso is None:
+        return
+    TOKENS_LLM.labels(modelo, "prompt").inc(getattr(uso, "prompt_token_count", 0) or 0)
+    TOKENS_LLM.labels(modelo, "respuesta").inc(getattr(uso, "candidates_token_count", 0) or 0)
+
+def iniciar_peticion() -> contextvars.Token:
+    return _tiempos_peticion.set({})
+
+def finalizar_peticion(token: contextvars.Token) -> dict[str, float]:
+    tiempos = _tiempos_peticion.get() or {}
+    _tiempos_peticion.reset(token)
+    return tiempos
+
+def cabecera_server_timing(tiempos: dict[str, float], total: float) -> str:
+    """Formatea el desglose como cabecera Server-Timing (duraciones en milisegundos)."""
+    metricas = [f"{etapa};dur={segundos * 1000:.1f}" for etapa, segundos in tiempos.items()]
+    metricas.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metricas)
+
+class ColectorEstadisticas:
+    """
+    Expone como gauges las estadísticas que ya llevan las cachés y la pasarela LLM
+    (aciertos, fallos, reintentos...) sin duplicar contadores en cada módulo.
+    Son del worker que atiende el scrape.
+    """
+
+    def __init__(self):
+        self._fuentes: dict[str, Callable[[], dict | None]] = {}
+
+    def registrar(self, nombre: str, funcion: Callable[[], dict | None]):
+        self._fuentes[nombre] = funcion
+
+    def _aplanar(self, prefijo: str, datos: dict, salida: list):
+        for clave, valor in datos.items():
+            if isinstance(valor, dict):
+                self._aplanar(f"{prefijo}.{clave}", valor, salida)
+            elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                salida.append((prefijo, clave, valor))
+
+    def collect(self):
+        familia = GaugeMetricFamily(
+            "fondoia_estadistica", "Estadísticas de cachés y de la pasarela LLM del worker", labels=["fuente", "clave"]
+        )
+        for nombre, funcion in self._fuentes.items():
+            valores = []
+            self._aplanar(nombre, funcion() or {}, valores)
+            for fuente, clave, valor in valores:
+                familia.add_metric([fuente, clave], valor)
+        yield familia
+
+_colector = ColectorEstadisticas()
+REGISTRY.register(_colector)
+
+def registrar_fuente(nombre: str, funcion: Callable[[], dict | None]):
+    """Añade un diccionario de estadísticas (p. ej. estadisticas_cache) a /metrics."""
+    _colector.registrar(nombre, funcion)
+
+def exportar() -> tuple[bytes, str]:
+    """Retorna el cuerpo de /metrics en formato de texto de Prometheus y su content-type."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        registro.register(_colector)
+        return generate_latest(registro), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+# El almacén vectorial se parte en una colección de Chroma por documento (boletín), en lugar de una
+# única colección global filtrada por metadatos: cada búsqueda recorre solo el grafo HNSW de su
+# documento, así que su latencia no crece con el tamaño del corpus.
+
+def nombre_particion(coleccion_base: str, id_documento: str) -> str:
+    """Nombre de la colección de un documento (Chroma solo admite [a-zA-Z0-9._-], de 3 a 512 caracteres)."""
+    huella = hashlib.sha256(id_documento.encode("utf-8")).hexdigest()[:24]
+    return f"{coleccion_base}_doc_{huella}"
+
+def es_particion(coleccion_base: str, nombre: str) -> bool:
+    return nombre.startswith(f"{coleccion_base}_doc_")
+
+def obtener_coleccion(cliente, nombre: str):
+    """Colección de Chroma existente o None (sin crearla)."""
+    try:
+        from chromadb.errors import NotFoundError as ColeccionInexistente
+    except ImportError:
+        # chromadb < 0.6 lanza ValueError si la colección no existe
+        ColeccionInexistente = ValueError
+    try:
+        return cliente.get_collection(nombre)
+    except (ColeccionInexistente, ValueError):
+        return None
+
+def crear_particion(cliente, coleccion_base: str, id_documento: str):
+    # Sin función de embeddings propia, igual que las colecciones creadas por langchain: los vectores los aporta el servicio
+    return cliente.get_or_create_collection(nombre_particion(coleccion_base, id_documento), embedding_function=None)
+
+def mover_documento(coleccion_global, particion, id_documento: str, tamano_lote: int = 500) -> int:
+    """
+    Pasa los fragmentos (con sus embeddings) de un documento de la colección global a su partición.
+    Se borran de la global solo después de copiarlos, así que una migración interrumpida se puede
+    repetir; y un documento ya movido no vuelve a copiarse (con fragmentos que quizá ya se eliminaron).
+    """
+    datos = coleccion_global.get(where={"id_documento": id_documento}, include=["documents", "metadatas", "embeddings"])
+    ids = datos["ids"]
+    for i in range(0, len(ids), tamano_lote):
+        particion.upsert(
+            ids=ids[i:i + tamano_lote],
+            embeddings=datos["embeddings"][i:i + tamano_lote],
+            documents=datos["documents"][i:i + tamano_lote],
+            metadatas=datos["metadatas"][i:i + tamano_lote]
+        )
+    if ids:
+        coleccion_global.delete(where={"id_documento": id_documento})
+    return len(ids)
+
+def documentos_coleccion(coleccion, tamano_lote: int = 1000) -> list[str]:
+    """IDs de documento presentes en una colección (recorriendo sus metadatos por páginas)."""
+    ids_documento, desplazamiento = set(), 0
+    while True:
+        pagina = coleccion.get(include=["metadatas"], limit=tamano_lote, offset=desplazamiento)
+        if not pagina["ids"]:
+            break
+        ids_documento.update(m["id_documento"] for m in pagina["metadatas"] if m and "id_documento" in m)
+        desplazamiento += len(pagina["ids"])
+    return sorted(ids_documento)
+
+def migrar(cliente, coleccion_base: str, eliminar_global: bool = False) -> dict:
+    """
+    Reparte la colección global en una partición por documento. Es reanudable: los fragmentos
+    se copian con upsert y cada documento sale de la global al terminar de copiarse. La colección
+    global solo se borra si se pide y al final; mientras exista, el servicio la sigue usando para
+    los documentos aún no migrados. Cada documento movido invalida sus resultados en la caché de
+    recuperación: los guardados leyendo la global podrían no coincidir con los de su partición.
+    """
+    # Import diferido: vector_db importa este módulo
+    from app.services.vector_db import obtener_cache_recuperacion
+
+    coleccion_global = obtener_coleccion(cliente, coleccion_base)
+    if coleccion_global is None:
+        return {"documentos": 0, "fragmentos": 0, "global_eliminada": False}
+
+    documentos = documentos_coleccion(coleccion_global)
+    fragmentos = 0
+    for n, id_documento in enumerate(documentos, start=1):
+        fragmentos += mover_documento(coleccion_global, crear_particion(cliente, coleccion_base, id_documento), id_documento)
+        obtener_cache_recuperacion().invalidar_documento(id_documento)
+        logger.info("[%d/%d] %s migrado", n, len(documentos), id_documento)
+
+    if eliminar_global:
+        cliente.delete_collection(coleccion_base)
+    return {"documentos": len(documentos), "fragmentos": fragmentos, "global_eliminada": eliminar_global}
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+    # Import diferido: vector_db importa este módulo
+    from app.services import vector_db
+    from app.services.embeddings import nombre_coleccion
+
+    parser = argparse.ArgumentParser(description="Migra la colección global de Chroma a una colección por documento.")
+    parser.add_argument("--eliminar-global", action="store_true", help="Borra la colección global al terminar")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    resultado = migrar(vector_db.obtener_cliente_chroma(), nombre_coleccion(), args.eliminar_global)
+    print(f"{resultado['documentos']} documentos y {resultado['fragmentos']} fragmentos migrados a particiones")
+    if resultado["global_eliminada"]:
+        # Cada worker conserva abierta la colección global hasta reiniciarse
+        print("Colección global eliminada: reinicie el servicio para que deje de consultarla")
+
+if __name__ == "__main__":
+    main()
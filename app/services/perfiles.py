@@ -0,0 +1,337 @@
+import io
+import os
+import re
+import csv
+import json
+import time
+import base64
+import argparse
+import threading
+from typing import IO, Iterator
+from pydantic import TypeAdapter, ValidationError
+
+from app.models import PerfilPyme, PerfilPymeRegistrado, ErrorImportacion, ResultadoImportacionPymes
+from app.services.cache import abrir_sqlite
+from app.services.catalogo import CursorInvalido
+from app.services.prescreening import normalizar_ccaa, extraer_codigo_cnae, normalizar_prefijo_cnae
+
+# Filas que se validan y guardan juntas (una transacción por lote) y errores que se detallan como máximo
+IMPORTACION_TAMANO_LOTE = int(os.getenv("FONDOIA_IMPORTACION_TAMANO_LOTE", "500"))
+IMPORTACION_MAX_ERRORES = int(os.getenv("FONDOIA_IMPORTACION_MAX_ERRORES", "1000"))
+MAX_POR_PAGINA = 500
+
+FORMATOS = ("csv", "jsonl")
+
+_lote_perfiles = TypeAdapter(list[PerfilPymeRegistrado])
+
+def normalizar_nif(nif: str) -> str:
+    """Mayúsculas y sin espacios, guiones ni puntos ("b-12.345.678" -> "B12345678")."""
+    return re.sub(r"[\s.\-]", "", nif).upper()
+
+def normalizar_nombre(nombre: str) -> str:
+    """Nombre fiscal comparable: sin tildes, minúsculas, sin puntuación y con espacios simples ("Acme, S.L." -> "acme sl")."""
+    return re.sub(r"[^\w ]", "", normalizar_ccaa(nombre))
+
+def clave_perfil(perfil: PerfilPymeRegistrado) -> str:
+    """Clave del perfil en el registro: su NIF o, si no lo tiene, su nombre fiscal normalizado."""
+    if perfil.nif and normalizar_nif(perfil.nif):
+        return normalizar_nif(perfil.nif)
+    return f"nombre:{normalizar_nombre(perfil.nombre_fiscal)}"
+
+def como_pyme(perfil: PerfilPymeRegistrado) -> PerfilPyme:
+    """El perfil sin los datos de registro, tal y como lo esperan el cribado y la evaluación (mismas claves de caché)."""
+    return PerfilPyme.model_validate(perfil.model_dump(exclude={"nif"}))
+
+class AlmacenPerfiles:
+    """
+    Registro persistente de perfiles de Pymes (SQLite, compartido por todos los workers),
+    con clave NIF o nombre fiscal. Indexado por nombre, por CCAA y por código CNAE para
+    localizar perfiles y seleccionar carteras sin recorrer el registro.
+    """
+
+    def __init__(self, fichero_sqlite: str = "perfiles.sqlite3"):
+        self._lock = threading.Lock()
+        self._db = abrir_sqlite(fichero_sqlite)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS perfiles (
+                clave TEXT PRIMARY KEY,
+                nombre TEXT NOT NULL,
+                ccaa TEXT NOT NULL,
+                cnae TEXT NOT NULL,
+                datos TEXT NOT NULL,
+                actualizado REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS perfiles_nombre ON perfiles (nombre);
+            CREATE INDEX IF NOT EXISTS perfiles_ccaa_cnae ON perfiles (ccaa, cnae, clave);
+            CREATE INDEX IF NOT EXISTS perfiles_cnae ON perfiles (cnae, clave);
+            """
+        )
+        self._db.commit()
+
+    def guardar_varios(self, perfiles: list[PerfilPymeRegistrado]) -> tuple[int, int]:
+        """Inserta o reemplaza los perfiles en una transacción. Retorna (insertados, actualizados)."""
+        filas = {}
+        ahora = time.time()
+        for p in perfiles:
+            # Si la clave se repite en el lote gana la última aparición, como al importarlas por separado
+            filas[clave_perfil(p)] = (
+                normalizar_nombre(p.nombre_fiscal), normalizar_ccaa(p.ubicacion_ccaa),
+                extraer_codigo_cnae(p.cnae) or "", p.model_dump_json(), ahora
+            )
+        claves = list(filas)
+        with self._lock:
+            with self._db:
+                existentes = 0
+                for i in range(0, len(claves), 500):
+                    bloque = claves[i:i + 500]
+                    existentes += self._db.execute(
+                        f"SELECT COUNT(*) FROM perfiles WHERE clave IN ({','.join('?' * len(bloque))})", bloque
+                    ).fetchone()[0]
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO perfiles (clave, nombre, ccaa, cnae, datos, actualizado) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(clave, *fila) for clave, fila in filas.items()]
+                )
+        return len(claves) - existentes, existentes
+
+    def obtener(self, identificador: str) -> PerfilPymeRegistrado | None:
+        return self.obtener_varios([identificador]).get(identificador)
+
+    def obtener_varios(self, identificadores: list[str]) -> dict[str, PerfilPymeRegistrado]:
+        """
+        Busca cada identificador como NIF y, si no, como nombre fiscal (sin distinguir tildes ni
+        mayúsculas; si varios perfiles comparten nombre, el actualizado más recientemente).
+        Una consulta por bloque de identificadores.
+        """
+        identificadores = list(dict.fromkeys(identificadores))
+        por_clave, por_nombre = {}, {}
+        with self._lock:
+            for i in range(0, len(identificadores), 250):
+                bloque = identificadores[i:i + 250]
+                claves = list({normalizar_nif(x) for x in bloque})
+                nombres = list({normalizar_nombre(x) for x in bloque})
+                filas = self._db.execute(
+                    f"SELECT clave, nombre, datos, actualizado FROM perfiles WHERE clave IN ({','.join('?' * len(claves))}) "
+                    f"OR nombre IN ({','.join('?' * len(nombres))})",
+                    claves + nombres
+                ).fetchall()
+                for clave, nombre, datos, actualizado in filas:
+                    por_clave[clave] = datos
+                    if nombre not in por_nombre or actualizado > por_nombre[nombre][0]:
+                        por_nombre[nombre] = (actualizado, datos)
+
+        encontrados = {}
+        for identificador in identificadores:
+            datos = por_clave.get(normalizar_nif(identificador))
+            if datos is None and normalizar_nombre(identificador) in por_nombre:
+                datos = por_nombre[normalizar_nombre(identificador)][1]
+            if datos is not None:
+                encontrados[identificador] = PerfilPymeRegistrado.model_validate_json(datos)
+        return encontrados
+
+    def eliminar(self, identificador: str) -> bool:
+        perfil = self.obtener(identificador)
+        if perfil is None:
+            return False
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM perfiles WHERE clave = ?", (clave_perfil(perfil),))
+        return True
+
+    def contar(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM perfiles").fetchone()[0]
+
+    def listar(self, ccaa: str | None = None, cnae: str | None = None, cursor: str | None = None, limite: int = 100) -> tuple[list[PerfilPymeRegistrado], str | None]:
+        """
+        Página de perfiles ordenada por clave, filtrada por CCAA y prefijo CNAE (p. ej. "62" incluye
+        las empresas 6201 y 6202). Paginación por clave (keyset). Retorna (perfiles, siguiente_cursor).
+        """
+        limite = max(1, min(limite, MAX_POR_PAGINA))
+        condiciones, parametros = [], []
+        if cursor:
+            condiciones.append("clave > ?")
+            parametros.append(_decodificar_cursor(cursor))
+        if ccaa:
+            condiciones.append("ccaa = ?")
+            parametros.append(normalizar_ccaa(ccaa))
+        if cnae:
+            condiciones.append("cnae GLOB ?")
+            parametros.append(f"{normalizar_prefijo_cnae(cnae)}*")
+        sql = "SELECT clave, datos FROM perfiles"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY clave LIMIT ?"
+        parametros.append(limite + 1)
+
+        with self._lock:
+            filas = self._db.execute(sql, parametros).fetchall()
+        siguiente = _codificar_cursor(filas[limite - 1][0]) if len(filas) > limite else None
+        return [PerfilPymeRegistrado.model_validate_json(datos) for _, datos in filas[:limite]], siguiente
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+def _codificar_cursor(clave: str) -> str:
+    return base64.urlsafe_b64encode(clave.encode("utf-8")).decode("ascii")
+
+def _decodificar_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except Exception:
+        raise CursorInvalido(f"Cursor de paginación no válido: {cursor}")
+
+_lock = threading.Lock()
+_almacen = None
+
+def obtener_almacen_perfiles() -> AlmacenPerfiles:
+    """Retorna el registro (compartido por proceso) de perfiles de Pymes"""
+    global _almacen
+    if _almacen is None:
+        with _lock:
+            if _almacen is None:
+                _almacen = AlmacenPerfiles()
+    return _almacen
+
+def cerrar_almacen_perfiles():
+    global _almacen
+    with _lock:
+        almacen, _almacen = _almacen, None
+    if almacen is not None:
+        almacen.cerrar()
+
+# --- Importación en bloque ---
+
+def formato_desde_nombre(nombre: str | None) -> str | None:
+    extension = os.path.splitext(nombre or "")[1].lower().lstrip(".")
+    return {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(extension)
+
+def _numero_es(valor: str) -> str:
+    """
+    Cifras con formato español de las exportaciones contables: coma decimal y punto de miles
+    ("1.250.000,50" -> "1250000.50", "250.000" -> "250000", "1.200" -> "1200"). Un punto seguido
+    de grupos de exactamente tres cifras es de miles; en otro caso ("1250000.5") es decimal.
+    """
+    valor = valor.strip().replace("€", "").replace(" ", "")
+    if "," in valor:
+        return valor.replace(".", "").replace(",", ".")
+    if re.fullmatch(r"[-+]?\d{1,3}(\.\d{3})+", valor):
+        return valor.replace(".", "")
+    return valor
+
+def leer_csv(fichero: IO[bytes]) -> Iterator[tuple[int, dict | bytes]]:
+    """
+    Recorre un CSV fila a fila (sin cargarlo entero) y retorna (número de fila, campos).
+    Admite separador ',' o ';' (Excel en español), BOM de UTF-8, cabeceras en cualquier
+    orden y mayúsculas, celdas vacías (= dato ausente) e importes con formato español.
+    """
+    texto = io.TextIOWrapper(fichero, encoding="utf-8-sig", newline="")
+    cabecera = texto.readline()
+    separador = ";" if cabecera.count(";") > cabecera.count(",") else ","
+    campos = [c.strip().lower() for c in next(csv.reader([cabecera], delimiter=separador), [])]
+    lector = csv.reader(texto, delimiter=separador)
+    for fila in lector:
+        if not any(c.strip() for c in fila):
+            continue
+        datos = {campo: valor.strip() for campo, valor in zip(campos, fila) if campo and valor.strip()}
+        for campo in ("facturacion_anual_eur", "empleados_plantilla"):
+            if campo in datos:
+                datos[campo] = _numero_es(datos[campo])
+        # La cabecera es la fila 1 y las filas pueden ocupar varias líneas (campos entre comillas)
+        yield lector.line_num + 1, datos
+
+def leer_jsonl(fichero: IO[bytes]) -> Iterator[tuple[int, dict | bytes]]:
+    """Recorre un archivo JSON Lines línea a línea y retorna (número de línea, JSON sin parsear)."""
+    for numero, linea in enumerate(fichero, start=1):
+        if linea.strip():
+            yield numero, linea
+
+def _validar_lote(lote: list[tuple[int, dict | bytes]]) -> tuple[list[PerfilPymeRegistrado], list[ErrorImportacion]]:
+    """
+    Valida las filas del lote. Las del CSV se validan en una sola llamada a Pydantic y, solo si falla
+    alguna, fila a fila para detallar los errores. Las líneas JSONL se validan una a una (el JSON se
+    parsea y valida en Rust sin pasar por dicts de Python) para que cada línea sea exactamente un
+    perfil: unirlas en un array aceptaría una línea con varios objetos.
+    """
+    if not isinstance(lote[0][1], bytes):
+        try:
+            return _lote_perfiles.validate_python([dato for _, dato in lote]), []
+        except ValidationError:
+            pass
+
+    validos, errores = [], []
+    for fila, dato in lote:
+        try:
+            if isinstance(dato, bytes):
+                validos.append(PerfilPymeRegistrado.model_validate_json(dato))
+            else:
+                validos.append(PerfilPymeRegistrado.model_validate(dato))
+        except ValidationError as e:
+            errores.append(ErrorImportacion(fila=fila, error="; ".join(
+                f"{'.'.join(str(x) for x in err['loc']) or 'fila'}: {err['msg']}" for err in e.errors()
+            )))
+    return validos, errores
+
+def importar_perfiles(fichero: IO[bytes], formato: str, tamano_lote: int = IMPORTACION_TAMANO_LOTE) -> ResultadoImportacionPymes:
+    """
+    Importa en el registro los perfiles de un archivo CSV o JSONL en streaming: se lee por lotes
+    de tamano_lote filas, se valida cada lote y los perfiles válidos se guardan (insertando o
+    reemplazando por clave) antes de leer el siguiente, así que la memoria no depende del tamaño
+    del archivo. Las filas no válidas se informan con su número y no detienen la importación.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato} (se admite {', '.join(FORMATOS)})")
+    inicio = time.perf_counter()
+    almacen = obtener_almacen_perfiles()
+    resultado = ResultadoImportacionPymes()
+    filas = leer_csv(fichero) if formato == "csv" else leer_jsonl(fichero)
+
+    def procesar(lote: list[tuple[int, dict | bytes]]):
+        validos, errores = _validar_lote(lote)
+        resultado.filas += len(lote)
+        resultado.validas += len(validos)
+        if validos:
+            insertados, actualizados = almacen.guardar_varios(validos)
+            resultado.insertadas += insertados
+            resultado.actualizadas += actualizados
+        hueco = max(0, IMPORTACION_MAX_ERRORES - len(resultado.errores))
+        resultado.errores.extend(errores[:hueco])
+        resultado.errores_omitidos += len(errores[hueco:])
+
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            procesar(lote)
+            lote = []
+    if lote:
+        procesar(lote)
+
+    resultado.segundos = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Importa perfiles de Pymes (CSV o JSONL) en el registro de perfiles.")
+    parser.add_argument("archivo", help="Exportación contable en CSV o JSON Lines")
+    parser.add_argument("--formato", choices=FORMATOS, help="Por defecto se deduce de la extensión")
+    parser.add_argument("--tamano-lote", type=int, default=IMPORTACION_TAMANO_LOTE, help="Filas por lote de validación")
+    args = parser.parse_args()
+
+    formato = args.formato or formato_desde_nombre(args.archivo)
+    if formato is None:
+        parser.error("No se puede deducir el formato de la extensión: indique --formato")
+
+    with open(args.archivo, "rb") as fichero:
+        resultado = importar_perfiles(fichero, formato, args.tamano_lote)
+    for error in resultado.errores:
+        print(f"[ERROR] fila {error.fila}: {error.error}")
+    if resultado.errores_omitidos:
+        print(f"... y {resultado.errores_omitidos} errores más")
+    print(json.dumps(resultado.model_dump(exclude={"errores"}), ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
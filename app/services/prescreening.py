@@ -0,0 +1,206 @@
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+import numpy as np
+
+from app.models import PerfilPyme, RequisitosConvocatoria, ResultadoEvaluacion
+from app.services.cache import abrir_sqlite
+
+def normalizar_ccaa(nombre: str) -> str:
+    """Minúsculas y sin tildes, para comparar nombres de CCAA escritos de distintas formas."""
+    sin_tildes = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"\s+", " ", sin_tildes).strip().lower()
+
+def extraer_codigo_cnae(cnae: str) -> str | None:
+    """Extrae los dígitos del código CNAE ("6201 - Programación" -> "6201")."""
+    encontrado = re.match(r"\s*(\d[\d.]*)", cnae)
+    if not encontrado:
+        return None
+    return encontrado.group(1).replace(".", "") or None
+
+def normalizar_prefijo_cnae(prefijo: str) -> str:
+    """Prefijo CNAE sin puntos ni espacios ("62.01" -> "6201")."""
+    return prefijo.strip().replace(".", "")
+
+class AlmacenRequisitos:
+    """
+    Registro estructurado de los requisitos objetivos de cada convocatoria, persistido
+    en SQLite junto a su id_documento_boe (compartido por todos los workers).
+    """
+
+    def __init__(self, fichero_sqlite: str = "requisitos.sqlite3"):
+        self._lock = threading.Lock()
+        self._db = abrir_sqlite(fichero_sqlite)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS requisitos (id_documento_boe TEXT PRIMARY KEY, datos TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def guardar(self, requisitos: RequisitosConvocatoria):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO requisitos (id_documento_boe, datos) VALUES (?, ?)",
+                (requisitos.id_documento_boe, requisitos.model_dump_json())
+            )
+            self._db.commit()
+
+    def obtener(self, id_documento_boe: str) -> RequisitosConvocatoria | None:
+        return self.obtener_varios([id_documento_boe]).get(id_documento_boe)
+
+    def obtener_varios(self, ids: list[str]) -> dict[str, RequisitosConvocatoria]:
+        encontrados = {}
+        ids = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                bloque = ids[i:i + 500]
+                marcadores = ",".join("?" * len(bloque))
+                filas = self._db.execute(
+                    f"SELECT id_documento_boe, datos FROM requisitos WHERE id_documento_boe IN ({marcadores})", bloque
+                ).fetchall()
+                for id_documento, datos in filas:
+                    encontrados[id_documento] = RequisitosConvocatoria.model_validate_json(datos)
+        return encontrados
+
+    def eliminar(self, id_documento_boe: str) -> bool:
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM requisitos WHERE id_documento_boe = ?", (id_documento_boe,))
+            self._db.commit()
+        return cursor.rowcount > 0
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+@dataclass
+class ResultadoCribado:
+    """Matrices N (empresas) x M (convocatorias) con el incumplimiento de cada criterio."""
+    facturacion_alta: np.ndarray
+    facturacion_baja: np.ndarray
+    empleados_exceso: np.ndarray
+    empleados_defecto: np.ndarray
+    cnae_no_elegible: np.ndarray
+    ccaa_no_elegible: np.ndarray
+
+    @property
+    def descartados(self) -> np.ndarray:
+        return (
+            self.facturacion_alta | self.facturacion_baja
+            | self.empleados_exceso | self.empleados_defecto
+            | self.cnae_no_elegible | self.ccaa_no_elegible
+        )
+
+    def motivos(self, i: int, j: int) -> list[str]:
+        motivos = []
+        if self.facturacion_alta[i, j]:
+            motivos.append("La facturación anual supera el máximo admitido")
+        if self.facturacion_baja[i, j]:
+            motivos.append("La facturación anual no alcanza el mínimo exigido")
+        if self.empleados_exceso[i, j]:
+            motivos.append("La plantilla supera el número máximo de empleados")
+        if self.empleados_defecto[i, j]:
+            motivos.append("La plantilla no alcanza el número mínimo de empleados")
+        if self.cnae_no_elegible[i, j]:
+            motivos.append("El CNAE de la empresa no está entre los elegibles")
+        if self.ccaa_no_elegible[i, j]:
+            motivos.append("La Comunidad Autónoma de la empresa no está en el ámbito de la convocatoria")
+        return motivos
+
+def _limites(valores: list, por_defecto: float) -> np.ndarray:
+    return np.array([por_defecto if v is None else v for v in valores], dtype=np.float64)
+
+def cribar(empresas: list[PerfilPyme], requisitos: list[RequisitosConvocatoria | None]) -> ResultadoCribado:
+    """
+    Comprueba en una sola pasada vectorizada N empresas contra M convocatorias.
+    Una convocatoria sin requisitos registrados (None) o un dato ausente nunca descarta:
+    solo se descartan los pares que incumplen con certeza algún requisito objetivo.
+    """
+    requisitos = [r or RequisitosConvocatoria(id_documento_boe="") for r in requisitos]
+    n, m = len(empresas), len(requisitos)
+
+    # Umbrales numéricos (broadcast N x 1 contra 1 x M)
+    facturacion = np.array([e.facturacion_anual_eur for e in empresas], dtype=np.float64)[:, None]
+    empleados = np.array([e.empleados_plantilla for e in empresas], dtype=np.float64)[:, None]
+    facturacion_max = _limites([r.facturacion_max_eur for r in requisitos], np.inf)[None, :]
+    facturacion_min = _limites([r.facturacion_min_eur for r in requisitos], -np.inf)[None, :]
+    empleados_max = _limites([r.empleados_max for r in requisitos], np.inf)[None, :]
+    empleados_min = _limites([r.empleados_min for r in requisitos], -np.inf)[None, :]
+
+    # CCAA: codificamos cada región como entero y construimos la matriz M x (C+1) de pertenencia;
+    # la columna extra representa una región que ninguna convocatoria menciona.
+    regiones = sorted({normalizar_ccaa(c) for r in requisitos for c in r.ccaa_elegibles})
+    codigo_region = {region: i for i, region in enumerate(regiones)}
+    ccaa_permitida = np.zeros((m, len(regiones) + 1), dtype=bool)
+    for j, r in enumerate(requisitos):
+        if r.ccaa_elegibles:
+            ccaa_permitida[j, [codigo_region[normalizar_ccaa(c)] for c in r.ccaa_elegibles]] = True
+        else:
+            ccaa_permitida[j, :] = True
+    codigos_empresa = np.array(
+        [codigo_region.get(normalizar_ccaa(e.ubicacion_ccaa), len(regiones)) for e in empresas], dtype=np.intp
+    )
+    ccaa_ok = ccaa_permitida[:, codigos_empresa].T
+
+    # CNAE: matriz empresa x prefijo (prefijos del código de la empresa) por matriz
+    # convocatoria x prefijo (prefijos elegibles); hay coincidencia si el producto es > 0.
+    prefijos = sorted({normalizar_prefijo_cnae(p) for r in requisitos for p in r.cnae_prefijos} - {""})
+    codigo_prefijo = {p: i for i, p in enumerate(prefijos)}
+    prefijos_convocatoria = np.zeros((m, len(prefijos)), dtype=np.int32)
+    for j, r in enumerate(requisitos):
+        for p in r.cnae_prefijos:
+            if normalizar_prefijo_cnae(p):
+                prefijos_convocatoria[j, codigo_prefijo[normalizar_prefijo_cnae(p)]] = 1
+    prefijos_empresa = np.zeros((n, len(prefijos)), dtype=np.int32)
+    cnae_desconocido = np.zeros(n, dtype=bool)
+    for i, e in enumerate(empresas):
+        codigo = extraer_codigo_cnae(e.cnae)
+        if codigo is None:
+            cnae_desconocido[i] = True
+            continue
+        for longitud in range(1, len(codigo) + 1):
+            indice = codigo_prefijo.get(codigo[:longitud])
+            if indice is not None:
+                prefijos_empresa[i, indice] = 1
+    sin_restriccion_cnae = prefijos_convocatoria.sum(axis=1) == 0
+    cnae_ok = (
+        (prefijos_empresa @ prefijos_convocatoria.T > 0)
+        | sin_restriccion_cnae[None, :]
+        | cnae_desconocido[:, None]
+    )
+
+    return ResultadoCribado(
+        facturacion_alta=facturacion > facturacion_max,
+        facturacion_baja=facturacion < facturacion_min,
+        empleados_exceso=empleados > empleados_max,
+        empleados_defecto=empleados < empleados_min,
+        cnae_no_elegible=~cnae_ok,
+        ccaa_no_elegible=~ccaa_ok
+    )
+
+def resultado_descartado(motivos: list[str]) -> ResultadoEvaluacion:
+    """ResultadoEvaluacion para un par descartado por requisitos objetivos (sin pasar por la IA)."""
+    return ResultadoEvaluacion(
+        es_elegible=False,
+        probabilidad_exito=0,
+        justificacion_economica="Descartada por requisitos objetivos de la convocatoria: " + "; ".join(motivos) + ".",
+        coste_oportunidad="No compensa preparar la solicitud: la empresa incumple requisitos excluyentes."
+    )
+
+_lock = threading.Lock()
+_almacen_requisitos = None
+
+def obtener_almacen_requisitos() -> AlmacenRequisitos:
+    """Retorna el almacén (compartido por proceso) de requisitos estructurados"""
+    global _almacen_requisitos
+    if _almacen_requisitos is None:
+        with _lock:
+            if _almacen_requisitos is None:
+                _almacen_requisitos = AlmacenRequisitos()
+    return _almacen_requisitos
+
+def cerrar_almacen_requisitos():
+    global _almacen_requisitos
+    with _lock:
+        almacen, _almacen_requisitos = _almacen_requisitos, None
+    if almacen is not None:
+        almacen.cerrar()
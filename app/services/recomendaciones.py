@@ -0,0 +1,190 @@
+import os
+import logging
+import argparse
+import threading
+from datetime import date
+
+from app.models import PerfilPyme, ConvocatoriaCatalogo, Recomendacion
+from app.services import vector_db
+from app.services.embeddings import EMBEDDINGS_BACKEND, nombre_coleccion
+from app.services.lexical_index import IndiceBM25
+from app.services.contexto import Fragmento, ensamblar_contexto
+from app.services.metricas import medir
+from app.services.catalogo import obtener_catalogo, prefijos_codigo
+from app.services.prescreening import cribar, obtener_almacen_requisitos, normalizar_ccaa, normalizar_prefijo_cnae
+
+logger = logging.getLogger(__name__)
+
+# Índice inverso de recomendación: un vector por documento indexado, calculado sobre un resumen
+# extractivo de sus requisitos. Recomendar convocatorias a una empresa cuesta un embedding de su
+# perfil y una búsqueda ANN, sin RAG ni IA por candidata y sin depender del tamaño del catálogo.
+
+# Fragmentos del documento que forman su resumen de requisitos y tope de tokens del resumen
+FRAGMENTOS_RESUMEN = int(os.getenv("FONDOIA_FRAGMENTOS_RESUMEN", "6"))
+TOKENS_RESUMEN = int(os.getenv("FONDOIA_TOKENS_RESUMEN", "1000"))
+
+# Documentos candidatos que se recuperan por cada recomendación pedida (margen para los que se descartan)
+CANDIDATOS_POR_RECOMENDACION = int(os.getenv("FONDOIA_CANDIDATOS_POR_RECOMENDACION", "4"))
+
+CONSULTA_REQUISITOS = (
+    "requisitos de los beneficiarios, empresas y pymes elegibles, actividad CNAE, sector, ámbito territorial, "
+    "comunidad autónoma, facturación, plantilla, empleados, inversión y gastos subvencionables"
+)
+
+_lock = threading.Lock()
+_indice = None
+
+def obtener_indice_resumenes():
+    """Retorna la colección de Chroma (compartida por proceso) con el resumen de requisitos de cada documento"""
+    global _indice
+    if _indice is None:
+        with _lock:
+            if _indice is None:
+                _indice = vector_db.obtener_cliente_chroma().get_or_create_collection(
+                    f"{nombre_coleccion(EMBEDDINGS_BACKEND)}_resumenes",
+                    embedding_function=None,
+                    # Distancia coseno: la similitud de una recomendación es 1 - distancia
+                    metadata={"hnsw:space": "cosine"}
+                )
+    return _indice
+
+def cerrar_indice_resumenes():
+    global _indice
+    with _lock:
+        _indice = None
+
+def resumen_requisitos(indice: IndiceBM25) -> str:
+    """
+    Resumen extractivo de los requisitos del documento: los fragmentos que mejor responden a una
+    consulta fija de requisitos (BM25, sin llamadas de red), compactados y en orden del documento.
+    """
+    elegidos = [i for i, _ in indice.buscar(CONSULTA_REQUISITOS, FRAGMENTOS_RESUMEN)]
+    if not elegidos:
+        # Documento sin vocabulario de requisitos: su comienzo (objeto y beneficiarios suelen ir al principio)
+        elegidos = sorted(range(len(indice.textos)), key=lambda i: indice.posiciones[i])[:FRAGMENTOS_RESUMEN]
+    if not elegidos:
+        return ""
+    resumen, _ = ensamblar_contexto([Fragmento(indice.textos[i], indice.posiciones[i]) for i in elegidos], TOKENS_RESUMEN)
+    return resumen
+
+def tiene_resumen(id_documento: str) -> bool:
+    return bool(obtener_indice_resumenes().get(ids=[id_documento], include=[])["ids"])
+
+def indexar_resumen(id_documento: str, indice: IndiceBM25 | None):
+    """Calcula (una llamada de embeddings) y guarda el vector del resumen de requisitos del documento."""
+    resumen = resumen_requisitos(indice) if indice is not None else ""
+    if not resumen:
+        obtener_indice_resumenes().delete(ids=[id_documento])
+        return
+    vector = vector_db.obtener_embeddings().embed_documents([resumen])[0]
+    obtener_indice_resumenes().upsert(
+        ids=[id_documento], embeddings=[vector], documents=[resumen], metadatas=[{"id_documento": id_documento}]
+    )
+
+def reconstruir_resumenes(solo_faltantes: bool = True) -> int:
+    """Genera el resumen de los documentos ya indexados (p. ej. los anteriores a este índice)."""
+    indices_lexicos = vector_db.obtener_indices_lexicos()
+    generados = 0
+    for id_documento in vector_db.obtener_manifiesto().documentos():
+        if solo_faltantes and tiene_resumen(id_documento):
+            continue
+        indexar_resumen(id_documento, indices_lexicos.obtener(id_documento))
+        generados += 1
+    return generados
+
+def texto_perfil(empresa: PerfilPyme) -> str:
+    return (
+        f"Empresa con actividad CNAE {empresa.cnae} ubicada en {empresa.ubicacion_ccaa}. "
+        f"Necesidad de inversión: {empresa.necesidad_inversion}"
+    )
+
+def vector_perfil(empresa: PerfilPyme) -> list[float]:
+    with medir("embedding"):
+        return vector_db.obtener_embeddings().embed_query(texto_perfil(empresa))
+
+def buscar_documentos(vector: list[float], n: int) -> list[tuple[str, float]]:
+    """Los n documentos cuyo resumen de requisitos más se parece al vector del perfil, con su similitud."""
+    with medir("recomendacion_ann"):
+        # Sin filtro de metadatos: en Chroma su coste crece con los documentos que lo cumplen
+        resultados = obtener_indice_resumenes().query(
+            query_embeddings=[vector], n_results=n, include=["distances"]
+        )
+    return [(id_, 1.0 - distancia) for id_, distancia in zip(resultados["ids"][0], resultados["distances"][0])]
+
+def _encaja(convocatoria: ConvocatoriaCatalogo, ccaa: str, prefijos: set[str], hoy: date | None) -> bool:
+    """Ámbito, CNAE y plazo declarados en el catálogo (vacío = sin restricción)."""
+    if hoy is not None and convocatoria.fecha_limite is not None and convocatoria.fecha_limite < hoy:
+        return False
+    if convocatoria.ccaa_elegibles and ccaa not in {normalizar_ccaa(c) for c in convocatoria.ccaa_elegibles}:
+        return False
+    if convocatoria.cnae_prefijos and not prefijos & {normalizar_prefijo_cnae(p) for p in convocatoria.cnae_prefijos}:
+        return False
+    return True
+
+def recomendar(empresa: PerfilPyme, n: int = 10, solo_abiertas: bool = True) -> list[Recomendacion]:
+    """
+    Top-n convocatorias del catálogo para la empresa, por similitud entre su perfil y el resumen de
+    requisitos de cada documento. Se descartan las que incumplen con certeza algún requisito objetivo
+    registrado o el ámbito, CNAE o plazo del catálogo; las que quedan son las candidatas a evaluar con IA
+    (p. ej. en /evaluar-lote). Los documentos sin convocatoria en el catálogo no se recomiendan.
+    Es bloqueante (embedding y Chroma).
+    """
+    ccaa, prefijos = normalizar_ccaa(empresa.ubicacion_ccaa), set(prefijos_codigo(empresa.cnae))
+    hoy = date.today() if solo_abiertas else None
+
+    catalogo = obtener_catalogo()
+    filtros = {"ccaa": empresa.ubicacion_ccaa, "cnae": empresa.cnae, "abiertas": solo_abiertas}
+    vector = vector_perfil(empresa)
+
+    # Búsqueda ANN por páginas crecientes: de cada página solo se evalúan los documentos nuevos,
+    # primero contra el ámbito, CNAE y plazo del catálogo (por su índice de documentos) y luego
+    # contra los requisitos objetivos. Si se descartan demasiados se pide una página el doble de
+    # grande hasta completar n o agotar el índice; el coste depende de cuántos candidatos hacen
+    # falta, no del tamaño del catálogo
+    recomendaciones, vistos = [], set()
+    pedidos = n * CANDIDATOS_POR_RECOMENDACION
+    while True:
+        candidatos = buscar_documentos(vector, pedidos)
+        nuevos = [(id_documento, similitud) for id_documento, similitud in candidatos if id_documento not in vistos]
+        vistos.update(id_documento for id_documento, _ in nuevos)
+        elegibles = catalogo.documentos_elegibles([id_documento for id_documento, _ in nuevos], filtros) if nuevos else set()
+        nuevos = [(id_documento, similitud) for id_documento, similitud in nuevos if id_documento in elegibles]
+        recomendaciones += _filtrar(empresa, nuevos, catalogo, ccaa, prefijos, hoy, n - len(recomendaciones))
+        if len(recomendaciones) >= n or len(candidatos) < pedidos:
+            return sorted(recomendaciones, key=lambda r: -r.similitud)[:n]
+        pedidos *= 2
+
+def _filtrar(
+    empresa: PerfilPyme, candidatos: list[tuple[str, float]], catalogo, ccaa: str, prefijos: set[str], hoy: date | None, n: int
+) -> list[Recomendacion]:
+    if not candidatos:
+        return []
+    ids = [id_documento for id_documento, _ in candidatos]
+    requisitos = obtener_almacen_requisitos().obtener_varios(ids)
+    descartados = cribar([empresa], [requisitos.get(i) for i in ids]).descartados[0]
+    convocatorias = catalogo.por_documento(ids)
+
+    recomendaciones = []
+    for j, (id_documento, similitud) in enumerate(candidatos):
+        if descartados[j]:
+            continue
+        for convocatoria in convocatorias.get(id_documento, []):
+            if _encaja(convocatoria, ccaa, prefijos, hoy):
+                recomendaciones.append(Recomendacion(convocatoria=convocatoria, similitud=round(similitud, 4)))
+                if len(recomendaciones) == n:
+                    return recomendaciones
+    return recomendaciones
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Genera el resumen de requisitos de los documentos ya indexados.")
+    parser.add_argument("--todos", action="store_true", help="Regenera también los que ya tienen resumen")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(f"{reconstruir_resumenes(solo_faltantes=not args.todos)} resúmenes generados")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import re
+import threading
+
+from app.services.cache import CacheLRU, abrir_sqlite
+
+# Caducidad y tamaño máximo de la caché de resultados de búsqueda por proceso
+RETRIEVAL_CACHE_TTL = float(os.getenv("FONDOIA_RETRIEVAL_CACHE_TTL", "3600"))
+RETRIEVAL_CACHE_MAX = int(os.getenv("FONDOIA_RETRIEVAL_CACHE_MAX", "2048"))
+
+# Segundos durante los que se reutiliza en memoria la generación leída de SQLite: es lo que puede
+# tardar un worker en ver que otro ha reindexado el documento (las reindexaciones propias, al momento)
+GENERACION_TTL = float(os.getenv("FONDOIA_RETRIEVAL_GENERACION_TTL", "2"))
+
+def normalizar_query(query: str) -> str:
+    """Minúsculas y espacios colapsados, para que variaciones triviales compartan entrada."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+class CacheRecuperacion:
+    """
+    Memoiza los resultados de buscar_requisitos_relevantes por (id_documento, query normalizada, k)
+    y presupuesto de tokens del contexto.
+    Cada documento tiene un contador de generación persistido en SQLite (compartido por los workers)
+    que forma parte de la clave: al reindexar el documento se incrementa y todas sus entradas
+    anteriores dejan de ser alcanzables sin necesidad de recorrer la caché. Las generaciones
+    leídas se guardan en memoria durante GENERACION_TTL segundos.
+    """
+
+    def __init__(self, fichero_sqlite: str = "recuperacion.sqlite3"):
+        self._memoria = CacheLRU(max_entradas=RETRIEVAL_CACHE_MAX, ttl_segundos=RETRIEVAL_CACHE_TTL)
+        self._generaciones = CacheLRU(max_entradas=RETRIEVAL_CACHE_MAX, ttl_segundos=GENERACION_TTL)
+        self._lock = threading.Lock()
+        self._db = abrir_sqlite(fichero_sqlite)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS generaciones (id_documento TEXT PRIMARY KEY, generacion INTEGER NOT NULL)"
+        )
+        self._db.commit()
+
+    def generacion(self, id_documento: str) -> int:
+        """Generación actual del documento, leída de SQLite (bloqueante)."""
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT generacion FROM generaciones WHERE id_documento = ?", (id_documento,)
+            ).fetchone()
+        generacion = fila[0] if fila else 0
+        self._generaciones.guardar(id_documento, generacion)
+        return generacion
+
+    def invalidar_documento(self, id_documento: str) -> int:
+        """Incrementa la generación del documento y retorna la nueva."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO generaciones (id_documento, generacion) VALUES (?, 1) "
+                "ON CONFLICT(id_documento) DO UPDATE SET generacion = generacion + 1",
+                (id_documento,)
+            )
+            self._db.commit()
+        return self.generacion(id_documento)
+
+    def clave(
+        self, id_documento: str, query: str, k: int, presupuesto_tokens: int | None = None, solo_memoria: bool = False
+    ) -> tuple | None:
+        """
+        Clave de la búsqueda. Con solo_memoria no se consulta SQLite: retorna None si la generación
+        del documento no está en memoria (desde el event loop, para leerla entonces en un hilo).
+        """
+        # La generación se lee antes de buscar: si el documento se reindexa a mitad
+        # de la búsqueda, el resultado queda guardado bajo la generación ya obsoleta.
+        generacion = self._generaciones.obtener(id_documento)
+        if generacion is None:
+            if solo_memoria:
+                return None
+            generacion = self.generacion(id_documento)
+        return (id_documento, generacion, normalizar_query(query), k, presupuesto_tokens)
+
+    def obtener(self, clave: tuple) -> str | None:
+        return self._memoria.obtener(clave)
+
+    def guardar(self, clave: tuple, contexto: str):
+        self._memoria.guardar(clave, contexto)
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+    def estadisticas(self) -> dict:
+        return self._memoria.estadisticas()
@@ -0,0 +1,280 @@
+import os
+import time
+import uuid
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+
+from app.models import SolicitudMemoria, EstadoTrabajo
+from app.services.cache import abrir_sqlite
+from app.services.document_generator import generar_memoria_tecnica
+
+logger = logging.getLogger(__name__)
+
+# Trabajos de generación simultáneos por worker y parámetros de supervisión
+TRABAJOS_WORKERS = int(os.getenv("FONDOIA_TRABAJOS_WORKERS", "2"))
+TRABAJOS_SONDEO_SEGUNDOS = float(os.getenv("FONDOIA_TRABAJOS_SONDEO_SEGUNDOS", "1.0"))
+# Un trabajo "en_curso" sin latido durante este tiempo se considera huérfano (worker caído) y se reencola
+TRABAJOS_LATIDO_SEGUNDOS = 15.0
+TRABAJOS_HUERFANO_SEGUNDOS = float(os.getenv("FONDOIA_TRABAJOS_HUERFANO_SEGUNDOS", "120"))
+
+PENDIENTE, EN_CURSO, COMPLETADO, ERROR, CANCELADO = "pendiente", "en_curso", "completado", "error", "cancelado"
+
+def huella_solicitud(solicitud: SolicitudMemoria) -> str:
+    contenido = json.dumps(solicitud.model_dump(mode="json"), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+class ColaTrabajos:
+    """
+    Cola persistente (SQLite) de trabajos de generación de memorias técnicas.
+    Sobrevive a reinicios, la comparten todos los workers de gunicorn (cada trabajo lo reclama
+    uno solo de forma atómica) y deduplica las solicitudes idénticas que siguen vigentes.
+    """
+
+    def __init__(self, fichero_sqlite: str = "trabajos.sqlite3"):
+        self._lock = threading.Lock()
+        self._db = abrir_sqlite(fichero_sqlite)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS trabajos ("
+            "id TEXT PRIMARY KEY, huella TEXT NOT NULL, estado TEXT NOT NULL, solicitud TEXT NOT NULL, "
+            "resultado TEXT, error TEXT, creado REAL NOT NULL, actualizado REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS trabajos_huella ON trabajos (huella, estado)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, creado)")
+        self._db.commit()
+        self._hay_trabajo = asyncio.Event()
+        self._tareas: dict[str, asyncio.Task] = {}
+        self._workers: list[asyncio.Task] = []
+        self._deteniendo = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    # --- Consulta y envío ---
+    # Bloqueantes (SQLite): desde los routers se llaman con run_in_threadpool. Lo que toca objetos
+    # de asyncio (el aviso a los workers, la cancelación de la tarea) se pasa al event loop con _en_loop
+
+    def _en_loop(self, funcion):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(funcion)
+        else:
+            funcion()
+
+    def _fila_a_estado(self, fila, duplicado: bool = False) -> EstadoTrabajo:
+        id_trabajo, estado, error, creado, actualizado = fila
+        return EstadoTrabajo(
+            id_trabajo=id_trabajo, estado=estado, error=error,
+            creado=creado, actualizado=actualizado, duplicado=duplicado
+        )
+
+    def obtener(self, id_trabajo: str) -> EstadoTrabajo | None:
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT id, estado, error, creado, actualizado FROM trabajos WHERE id = ?", (id_trabajo,)
+            ).fetchone()
+        return self._fila_a_estado(fila) if fila else None
+
+    def resultado(self, id_trabajo: str) -> str | None:
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT resultado FROM trabajos WHERE id = ? AND estado = ?", (id_trabajo, COMPLETADO)
+            ).fetchone()
+        return fila[0] if fila else None
+
+    def enviar(self, solicitud: SolicitudMemoria) -> EstadoTrabajo:
+        """
+        Encola una solicitud. Si ya existe un trabajo idéntico pendiente, en curso o completado,
+        retorna ese trabajo (marcado como duplicado) en lugar de crear otro.
+        """
+        huella = huella_solicitud(solicitud)
+        ahora = time.time()
+        with self._lock:
+            with self._db:
+                fila = self._db.execute(
+                    "SELECT id, estado, error, creado, actualizado FROM trabajos "
+                    "WHERE huella = ? AND estado IN (?, ?, ?) ORDER BY creado DESC LIMIT 1",
+                    (huella, PENDIENTE, EN_CURSO, COMPLETADO)
+                ).fetchone()
+                if fila:
+                    return self._fila_a_estado(fila, duplicado=True)
+                id_trabajo = uuid.uuid4().hex
+                self._db.execute(
+                    "INSERT INTO trabajos (id, huella, estado, solicitud, creado, actualizado) VALUES (?, ?, ?, ?, ?, ?)",
+                    (id_trabajo, huella, PENDIENTE, solicitud.model_dump_json(), ahora, ahora)
+                )
+        self._en_loop(self._hay_trabajo.set)
+        return EstadoTrabajo(id_trabajo=id_trabajo, estado=PENDIENTE, creado=ahora, actualizado=ahora)
+
+    def cancelar(self, id_trabajo: str) -> EstadoTrabajo | None:
+        """
+        Cancela un trabajo pendiente o en curso. Si corre en este worker se interrumpe al momento;
+        si corre en otro, su supervisor lo interrumpe al ver el estado en el siguiente sondeo.
+        """
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "UPDATE trabajos SET estado = ?, actualizado = ? WHERE id = ? AND estado IN (?, ?)",
+                    (CANCELADO, time.time(), id_trabajo, PENDIENTE, EN_CURSO)
+                )
+        tarea = self._tareas.get(id_trabajo)
+        if tarea is not None:
+            self._en_loop(tarea.cancel)
+        return self.obtener(id_trabajo)
+
+    # --- Ejecución ---
+
+    # Los accesos de los workers y del supervisor son bloqueantes (SQLite, con espera de hasta 30 s si otro
+    # proceso tiene el bloqueo de escritura): se llaman con asyncio.to_thread, fuera del event loop
+
+    def _reclamar(self) -> tuple[str, SolicitudMemoria] | None:
+        """Marca como en curso el trabajo pendiente más antiguo (atómico entre procesos)."""
+        with self._lock:
+            # Lectura previa (sin bloqueo de escritura en WAL): con la cola vacía no se toma el bloqueo
+            if self._db.execute("SELECT 1 FROM trabajos WHERE estado = ? LIMIT 1", (PENDIENTE,)).fetchone() is None:
+                return None
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._db.execute(
+                    "SELECT id, solicitud FROM trabajos WHERE estado = ? ORDER BY creado LIMIT 1", (PENDIENTE,)
+                ).fetchone()
+                if fila:
+                    self._db.execute(
+                        "UPDATE trabajos SET estado = ?, actualizado = ? WHERE id = ?", (EN_CURSO, time.time(), fila[0])
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if not fila:
+            return None
+        return fila[0], SolicitudMemoria.model_validate_json(fila[1])
+
+    def _finalizar(self, id_trabajo: str, estado: str, resultado: str | None = None, error: str | None = None):
+        # Solo se actualiza si sigue en curso: un trabajo cancelado mientras corría no se sobrescribe
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "UPDATE trabajos SET estado = ?, resultado = ?, error = ?, actualizado = ? WHERE id = ? AND estado = ?",
+                    (estado, resultado, error, time.time(), id_trabajo, EN_CURSO)
+                )
+
+    def _latido(self, ids: list[str]):
+        if not ids:
+            return
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "UPDATE trabajos SET actualizado = ? WHERE id = ? AND estado = ?",
+                    [(time.time(), id_trabajo, EN_CURSO) for id_trabajo in ids]
+                )
+
+    def _cancelados(self, ids: list[str]) -> list[str]:
+        """De los trabajos indicados, los que están marcados como cancelados (p. ej. desde otro worker)."""
+        if not ids:
+            return []
+        with self._lock:
+            filas = self._db.execute(
+                f"SELECT id FROM trabajos WHERE estado = ? AND id IN ({','.join('?' * len(ids))})", (CANCELADO, *ids)
+            ).fetchall()
+        return [fila[0] for fila in filas]
+
+    def reencolar_huerfanos(self) -> int:
+        """Devuelve a pendiente los trabajos en curso cuyo worker dejó de dar señales (p. ej. tras un reinicio)."""
+        with self._lock:
+            with self._db:
+                cursor = self._db.execute(
+                    "UPDATE trabajos SET estado = ? WHERE estado = ? AND actualizado < ?",
+                    (PENDIENTE, EN_CURSO, time.time() - TRABAJOS_HUERFANO_SEGUNDOS)
+                )
+        return cursor.rowcount
+
+    async def _ejecutar(self, id_trabajo: str, solicitud: SolicitudMemoria):
+        tarea = asyncio.ensure_future(generar_memoria_tecnica(solicitud.empresa, solicitud.convocatoria))
+        self._tareas[id_trabajo] = tarea
+        try:
+            documento = await tarea
+            await asyncio.to_thread(self._finalizar, id_trabajo, COMPLETADO, resultado=documento)
+        except asyncio.CancelledError:
+            # Cancelado por el usuario (el estado ya es "cancelado"): el worker sigue con el siguiente.
+            # Si es el apagado del worker, el trabajo sigue "en_curso" y se reencolará como huérfano.
+            if self._deteniendo:
+                raise
+        except Exception as e:
+            detalle = getattr(e, "detail", None) or str(e)
+            await asyncio.to_thread(self._finalizar, id_trabajo, ERROR, error=str(detalle))
+        finally:
+            self._tareas.pop(id_trabajo, None)
+
+    async def _worker(self):
+        while True:
+            try:
+                reclamado = await asyncio.to_thread(self._reclamar)
+            except Exception:
+                logger.exception("Error al reclamar un trabajo de la cola")
+                reclamado = None
+            if reclamado is None:
+                self._hay_trabajo.clear()
+                try:
+                    # Despertamos al encolar en este worker o, como mucho, tras el intervalo de sondeo
+                    # (para recoger trabajos encolados desde otros workers)
+                    await asyncio.wait_for(self._hay_trabajo.wait(), timeout=TRABAJOS_SONDEO_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._ejecutar(*reclamado)
+
+    async def _supervisor(self):
+        ultimo_latido = time.monotonic()
+        while True:
+            await asyncio.sleep(TRABAJOS_SONDEO_SEGUNDOS)
+            try:
+                # Trabajos de este worker cancelados desde otro (el DELETE lo atiende cualquier worker)
+                for id_trabajo in await asyncio.to_thread(self._cancelados, list(self._tareas)):
+                    tarea = self._tareas.get(id_trabajo)
+                    if tarea is not None:
+                        tarea.cancel()
+
+                if time.monotonic() - ultimo_latido >= TRABAJOS_LATIDO_SEGUNDOS:
+                    ultimo_latido = time.monotonic()
+                    await asyncio.to_thread(self._latido, list(self._tareas))
+                    recuperados = await asyncio.to_thread(self.reencolar_huerfanos)
+                    if recuperados:
+                        logger.warning("Reencolados %d trabajos huérfanos", recuperados)
+                        self._hay_trabajo.set()
+            except Exception:
+                logger.exception("Error en la supervisión de la cola de trabajos")
+
+    def iniciar(self, workers: int = TRABAJOS_WORKERS):
+        self._loop = asyncio.get_running_loop()
+        self.reencolar_huerfanos()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        self._workers.append(asyncio.create_task(self._supervisor()))
+
+    async def detener(self):
+        # Los trabajos interrumpidos quedan "en_curso" y se reencolan al dejar de latir
+        self._deteniendo = True
+        for tarea in self._workers + list(self._tareas.values()):
+            tarea.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+        with self._lock:
+            self._db.close()
+
+_cola = None
+
+def obtener_cola() -> ColaTrabajos:
+    """Retorna la cola de trabajos del worker (se crea en el arranque de la aplicación)"""
+    global _cola
+    if _cola is None:
+        _cola = ColaTrabajos()
+    return _cola
+
+def iniciar_cola():
+    obtener_cola().iniciar()
+
+async def detener_cola():
+    global _cola
+    cola, _cola = _cola, None
+    if cola is not None:
+        await cola.detener()
@@ -1,80 +1,519 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
+import asyncio
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.embedding_cache import EmbeddingsConCache
+from app.services.embeddings import EMBEDDINGS_BACKEND, crear_backend, nombre_coleccion
+from app.services.retrieval_cache import CacheRecuperacion
+from app.services.manifiesto import ManifiestoDocumentos, comparar_manifiestos
+from app.services.lexical_index import AlmacenIndicesLexicos, IndiceBM25, es_consulta_lexica, fusion_rrf
+from app.services.contexto import Fragmento, ensamblar_contexto, estadisticas_compactacion
+from app.services.metricas import medir
+from app.services.cache import CacheLRU
+from app.services import particiones
+
+# Respuesta cuando el documento no tiene fragmentos indexados (nunca se cachea)
+SIN_CONTEXTO = "No se encontró contexto en la base de datos para este documento."
 
 # Configuración de base de datos local
 CHROMA_DB_DIR = "./chroma_db"
 
+# Candidatos que aporta cada buscador (vectorial y BM25) antes de la fusión, por cada resultado pedido
+CANDIDATOS_POR_RESULTADO = int(os.getenv("FONDOIA_CANDIDATOS_POR_RESULTADO", "3"))
+
+# Número máximo de búsquedas bloqueantes (disco + red) en paralelo por proceso
+MAX_WORKERS_BUSQUEDA = int(os.getenv("FONDOIA_MAX_WORKERS_BUSQUEDA", "4"))
+
+# Particiones (colecciones por documento) abiertas que se mantienen en memoria por proceso. Solo acota
+# los objetos de Python; los índices HNSW cargados los acota Chroma (ver obtener_cliente_chroma)
+MAX_PARTICIONES_ABIERTAS = int(os.getenv("FONDOIA_MAX_PARTICIONES_ABIERTAS", "256"))
+
+# Segundos durante los que se recuerda que una colección no existe (documentos sin partición o
+# colección global ya eliminada), para no consultarlo a Chroma en cada búsqueda
+COLECCION_AUSENTE_TTL_SEGUNDOS = float(os.getenv("FONDOIA_COLECCION_AUSENTE_TTL_SEGUNDOS", "30"))
+
+# Memoria máxima (MB, por proceso) de los índices de Chroma cargados: al superarla se descargan
+# los menos usados (política LRU de segmentos)
+CHROMA_MEMORIA_MB = int(os.getenv("FONDOIA_CHROMA_MEMORIA_MB", "1024"))
+
+# Recursos compartidos por proceso: se abren una sola vez y se reutilizan entre peticiones
+_lock = threading.Lock()
+_embeddings = None
+_cliente_chroma = None
+_particiones = CacheLRU(max_entradas=MAX_PARTICIONES_ABIERTAS)
+_colecciones_ausentes = CacheLRU(max_entradas=4096, ttl_segundos=COLECCION_AUSENTE_TTL_SEGUNDOS)
+_vectordb_global = None
+_executor = None
+_cache_recuperacion = None
+_manifiesto = None
+_indices_lexicos = None
+
 def obtener_embeddings():
-    """Retorna la instancia del modelo de embeddings geométricos de Google"""
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("No se encontró GEMINI_API_KEY en el entorno para extraer embeddings.")
-    
-    return GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=api_key
-    )
+    """
+    Retorna la instancia (compartida por proceso) del modelo de embeddings del backend configurado
+    en FONDOIA_EMBEDDINGS_BACKEND (Google por defecto), envuelta en una caché de dos niveles
+    (memoria + SQLite) para no repetir cálculos ni llamadas de red.
+    """
+    global _embeddings
+    if _embeddings is not None:
+        return _embeddings
 
-def procesar_pdf_boe(ruta_archivo: str, id_documento: str):
+    with _lock:
+        if _embeddings is None:
+            base, nombre_modelo = crear_backend(EMBEDDINGS_BACKEND)
+            _embeddings = EmbeddingsConCache(base, nombre_modelo=nombre_modelo)
+    return _embeddings
+
+def obtener_cliente_chroma():
     """
-    Lee un PDF jurídico, lo divide en fragmentos (chunks) y lo vectoriza
-    guardándolo en la base de datos Chroma local bajo un identificador.
+    Retorna el cliente (compartido por proceso) de la base de datos Chroma persistente.
+    Con una partición por documento, cada una abierta carga su propio índice HNSW: la caché LRU de
+    segmentos, limitada a FONDOIA_CHROMA_MEMORIA_MB, descarga los menos usados para que la memoria
+    no crezca con el número de documentos consultados. (Desde chromadb 1.0 el núcleo en Rust acota
+    en su lugar el número de índices abiertos, según el límite de ficheros abiertos del proceso.)
+    """
+    global _cliente_chroma
+    if _cliente_chroma is not None:
+        return _cliente_chroma
+
+    # Import diferido: chromadb tarda en cargar y no hace falta para arrancar
+    import chromadb
+    from chromadb.config import Settings
+
+    with _lock:
+        if _cliente_chroma is None:
+            _cliente_chroma = chromadb.PersistentClient(
+                path=CHROMA_DB_DIR,
+                settings=Settings(
+                    chroma_segment_cache_policy="LRU",
+                    chroma_memory_limit_bytes=CHROMA_MEMORIA_MB * 1024 * 1024
+                )
+            )
+    return _cliente_chroma
+
+def _abrir_coleccion(nombre: str):
+    from langchain_community.vectorstores import Chroma
+    return Chroma(client=obtener_cliente_chroma(), collection_name=nombre, embedding_function=obtener_embeddings())
+
+def _nombre_particion(id_documento: str) -> str:
+    return particiones.nombre_particion(nombre_coleccion(EMBEDDINGS_BACKEND), id_documento)
+
+def obtener_particion(id_documento: str, crear: bool = False):
+    """
+    Retorna la colección de Chroma propia del documento (su partición), o None si todavía no
+    existe y no se pide crearla. Las particiones abiertas se reutilizan entre peticiones, y las
+    inexistentes se recuerdan durante FONDOIA_COLECCION_AUSENTE_TTL_SEGUNDOS.
+    """
+    nombre = _nombre_particion(id_documento)
+    vectordb = _particiones.obtener(nombre)
+    if vectordb is not None:
+        return vectordb
+    if crear:
+        _colecciones_ausentes.invalidar(nombre)
+    else:
+        if _colecciones_ausentes.obtener(nombre) is not None:
+            return None
+        if particiones.obtener_coleccion(obtener_cliente_chroma(), nombre) is None:
+            _colecciones_ausentes.guardar(nombre, True)
+            return None
+    vectordb = _abrir_coleccion(nombre)
+    _particiones.guardar(nombre, vectordb)
+    return vectordb
+
+def _obtener_vectordb_global():
+    """
+    Colección global anterior a las particiones (todos los documentos, filtrados por metadatos),
+    o None si no existe o ya se ha migrado y eliminado (python -m app.services.particiones).
+    Se abre una sola vez por proceso; su ausencia se recuerda como la de las particiones.
     """
+    global _vectordb_global
+    if _vectordb_global is not None:
+        return _vectordb_global
+
+    nombre = nombre_coleccion(EMBEDDINGS_BACKEND)
+    if _colecciones_ausentes.obtener(nombre) is not None:
+        return None
+    if particiones.obtener_coleccion(obtener_cliente_chroma(), nombre) is None:
+        _colecciones_ausentes.guardar(nombre, True)
+        return None
+    vectordb = _abrir_coleccion(nombre)
+    with _lock:
+        if _vectordb_global is None:
+            _vectordb_global = vectordb
+    return _vectordb_global
+
+def obtener_cache_recuperacion() -> CacheRecuperacion:
+    """Retorna la caché (compartida por proceso) de resultados de búsqueda"""
+    global _cache_recuperacion
+    if _cache_recuperacion is None:
+        with _lock:
+            if _cache_recuperacion is None:
+                _cache_recuperacion = CacheRecuperacion()
+    return _cache_recuperacion
+
+def obtener_manifiesto() -> ManifiestoDocumentos:
+    """Retorna el manifiesto (compartido por proceso) de fragmentos indexados por documento en la colección activa"""
+    global _manifiesto
+    if _manifiesto is None:
+        with _lock:
+            if _manifiesto is None:
+                _manifiesto = ManifiestoDocumentos(f"manifiesto_{nombre_coleccion(EMBEDDINGS_BACKEND)}.sqlite3")
+    return _manifiesto
+
+def obtener_indices_lexicos() -> AlmacenIndicesLexicos:
+    """Retorna el almacén (compartido por proceso) de índices BM25 por documento"""
+    global _indices_lexicos
+    if _indices_lexicos is None:
+        with _lock:
+            if _indices_lexicos is None:
+                _indices_lexicos = AlmacenIndicesLexicos()
+    return _indices_lexicos
+
+def _obtener_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS_BUSQUEDA,
+                    thread_name_prefix="fondoia-busqueda"
+                )
+    return _executor
+
+def iniciar_servicio():
+    """
+    Prepara el pool de hilos del servicio de recuperación.
+    Se invoca desde el lifespan de FastAPI al arrancar cada worker.
+    """
+    _obtener_executor()
+
+def calentar():
+    """
+    Abre por adelantado Chroma, el cliente de embeddings y los almacenes auxiliares, y lanza una
+    consulta con un vector ya indexado (sin llamada de embeddings) para que Chroma cargue el índice
+    en memoria: así la primera búsqueda real no paga la apertura.
+    """
+    cliente = obtener_cliente_chroma()
+    obtener_embeddings()
+    obtener_cache_recuperacion()
+    obtener_manifiesto()
+    obtener_indices_lexicos()
+    _obtener_executor()
+
+    base = nombre_coleccion(EMBEDDINGS_BACKEND)
+    nombres = [c if isinstance(c, str) else c.name for c in cliente.list_collections()]
+    nombre = next((n for n in nombres if particiones.es_particion(base, n)), base if base in nombres else None)
+    if nombre is None:
+        return
+    coleccion = cliente.get_collection(nombre)
+    muestra = coleccion.peek(limit=1)
+    vectores = muestra.get("embeddings")
+    if vectores is not None and len(vectores) > 0:
+        coleccion.query(query_embeddings=[list(vectores[0])], n_results=1)
+
+def cerrar_servicio():
+    """
+    Libera los recursos compartidos: espera a las búsquedas en curso, descarta
+    las encoladas y suelta las referencias a Chroma y al cliente de embeddings.
+    """
+    global _executor, _cliente_chroma, _vectordb_global, _embeddings, _cache_recuperacion, _manifiesto
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+    with _lock:
+        embeddings, _embeddings = _embeddings, None
+        cache_recuperacion, _cache_recuperacion = _cache_recuperacion, None
+        manifiesto, _manifiesto = _manifiesto, None
+        _cliente_chroma = None
+        _vectordb_global = None
+        _particiones.limpiar()
+        _colecciones_ausentes.limpiar()
+    for recurso in (embeddings, cache_recuperacion, manifiesto):
+        if recurso is not None:
+            recurso.cerrar()
+
+def estadisticas_cache() -> dict:
+    """Contadores de aciertos/fallos de las cachés del servicio de recuperación en este proceso."""
+    return {
+        "embeddings": _embeddings.estadisticas() if _embeddings is not None else None,
+        "recuperacion": _cache_recuperacion.estadisticas() if _cache_recuperacion is not None else None,
+        "particiones": _particiones.estadisticas(),
+        "compactacion_contexto": estadisticas_compactacion()
+    }
+
+def id_fragmento(id_documento: str, texto: str) -> str:
+    """ID determinista de un fragmento: re-ingerir el mismo texto produce el mismo ID (upsert, no duplicado)."""
+    return hashlib.sha256(f"{id_documento}\x00{texto}".encode("utf-8")).hexdigest()[:32]
+
+def extraer_fragmentos(ruta_archivo: str, id_documento: str) -> list[tuple[str, dict]]:
+    """
+    Lee un PDF jurídico y lo divide en fragmentos (chunks) con sus metadatos.
+    No toca la base de datos ni la red, por lo que puede ejecutarse en otro proceso.
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     # 1. Cargar el PDF
     loader = PyPDFLoader(ruta_archivo)
     docs = loader.load()
-    
+
     # 2. Dividir el texto
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200,
-        separators=["\n\n", "\n", ".", " ", ""]
+        separators=["\n\n", "\n", ".", " ", ""],
+        add_start_index=True
     )
     splits = text_splitter.split_documents(docs)
-    
-    # Etiquetar los metadatos para poder filtrar
-    for doc in splits:
+
+    # Etiquetar los metadatos para poder filtrar (y la posición del fragmento en el documento)
+    fragmentos = []
+    for posicion, doc in enumerate(splits):
         doc.metadata["id_documento"] = id_documento
+        doc.metadata["posicion"] = posicion
+        fragmentos.append((doc.page_content, doc.metadata))
+    return fragmentos
 
-    # 3. Generar embeddings y persistir en Chroma
-    embeddings = obtener_embeddings()
-    Chroma.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        persist_directory=CHROMA_DB_DIR
-    )
-    
-    return len(splits)
+def _particion_para_indexar(id_documento: str):
+    """
+    Partición donde indexar el documento. Si aún no existe y el documento estaba en la colección
+    global, antes se mueven a ella sus fragmentos (con sus embeddings): la migración se hace sola,
+    documento a documento, a medida que se reingieren.
+    """
+    vectordb = obtener_particion(id_documento)
+    if vectordb is not None:
+        return vectordb
+    vectordb = obtener_particion(id_documento, crear=True)
+    if _obtener_vectordb_global() is not None:
+        # La copia va por la API de Chroma (con los embeddings ya calculados), no por langchain
+        cliente = obtener_cliente_chroma()
+        particiones.mover_documento(
+            particiones.obtener_coleccion(cliente, nombre_coleccion(EMBEDDINGS_BACKEND)),
+            particiones.obtener_coleccion(cliente, _nombre_particion(id_documento)),
+            id_documento
+        )
+    return vectordb
 
-def buscar_requisitos_relevantes(query: str, id_documento: str, k: int = 4) -> str:
+def indexar_fragmentos(id_documento: str, fragmentos: list[tuple[str, dict]], tamano_lote: int = 64) -> tuple[int, int]:
     """
-    Busca en la base de datos vectorial aquellos fragmentos del texto original
-    que respondan a la query para el documento específico.
+    Sincroniza en la partición de Chroma del documento los fragmentos de un documento comparándolos con su manifiesto:
+    solo se vectorizan (en lotes de tamano_lote) los fragmentos nuevos o modificados, se borran
+    los que ya no existen y a los que solo han cambiado de sitio se les actualiza la posición
+    sin recalcular su embedding. Si hubo cambios se reconstruyen el índice BM25 y el resumen de
+    requisitos del documento y se invalidan sus búsquedas cacheadas.
+    Retorna (fragmentos_nuevos, fragmentos_eliminados).
     """
-    embeddings = obtener_embeddings()
-    
-    # Conectamos a la base de datos existente
-    vectordb = Chroma(
-        persist_directory=CHROMA_DB_DIR, 
-        embedding_function=embeddings
-    )
-    
+    vectordb = _particion_para_indexar(id_documento)
+    manifiesto = obtener_manifiesto()
+
+    # Un mismo texto repetido en el documento (cabeceras, pies) produce el mismo ID: nos quedamos con el primero
+    unicos = {}
+    for texto, metadatos in fragmentos:
+        unicos.setdefault(id_fragmento(id_documento, texto), (texto, metadatos))
+
+    anteriores = manifiesto.obtener(id_documento)
+    if not anteriores:
+        # Documento indexado antes de existir el manifiesto: partimos de lo que haya en Chroma
+        existentes = vectordb.get(include=["metadatas"])
+        anteriores = {
+            id_: (metadatos or {}).get("posicion", -1)
+            for id_, metadatos in zip(existentes["ids"], existentes["metadatas"])
+        }
+
+    actuales = {id_: metadatos["posicion"] for id_, (_, metadatos) in unicos.items()}
+    nuevos, eliminados, movidos = comparar_manifiestos(anteriores, actuales)
+
+    for i in range(0, len(nuevos), tamano_lote):
+        lote = nuevos[i:i + tamano_lote]
+        vectordb.add_texts(
+            texts=[unicos[id_][0] for id_ in lote],
+            metadatas=[unicos[id_][1] for id_ in lote],
+            ids=lote
+        )
+    for i in range(0, len(eliminados), tamano_lote):
+        vectordb.delete(ids=eliminados[i:i + tamano_lote])
+    if movidos:
+        # langchain no permite cambiar solo los metadatos (update_documents vuelve a vectorizar):
+        # se actualizan con la colección de Chroma, que conserva el embedding
+        coleccion = particiones.obtener_coleccion(obtener_cliente_chroma(), _nombre_particion(id_documento))
+        for i in range(0, len(movidos), tamano_lote):
+            lote = movidos[i:i + tamano_lote]
+            coleccion.update(ids=lote, metadatas=[unicos[id_][1] for id_ in lote])
+
+    manifiesto.reemplazar(id_documento, actuales)
+
+    # El índice léxico se reconstruye entero (es barato: no requiere embeddings)
+    indices_lexicos = obtener_indices_lexicos()
+    indice = None
+    if nuevos or eliminados or movidos or not indices_lexicos.existe(id_documento):
+        indice = IndiceBM25.construir(
+            [(id_, texto, metadatos["posicion"]) for id_, (texto, metadatos) in unicos.items()]
+        )
+        indices_lexicos.guardar(id_documento, indice)
+
+    # Resumen de requisitos para las recomendaciones (import diferido: recomendaciones importa este módulo)
+    from app.services import recomendaciones
+    if indice is not None or not recomendaciones.tiene_resumen(id_documento):
+        recomendaciones.indexar_resumen(id_documento, indice or indices_lexicos.obtener(id_documento))
+
+    # Invalidar los resultados de búsqueda cacheados de este documento
+    if nuevos or eliminados or movidos:
+        obtener_cache_recuperacion().invalidar_documento(id_documento)
+    return len(nuevos), len(eliminados)
+
+def procesar_pdf_boe(ruta_archivo: str, id_documento: str):
+    """
+    Lee un PDF jurídico, lo divide en fragmentos (chunks) y lo vectoriza
+    guardándolo en la base de datos Chroma local bajo un identificador.
+    Es idempotente: volver a procesar el mismo PDF no duplica fragmentos, y procesar una
+    nueva versión (p. ej. tras una corrección de errores) solo vectoriza lo que ha cambiado.
+    """
+    fragmentos = extraer_fragmentos(ruta_archivo, id_documento)
+
+    # Generar embeddings y persistir en Chroma (sobre la conexión compartida,
+    # así las búsquedas del mismo proceso ven los nuevos fragmentos al instante)
+    indexar_fragmentos(id_documento, fragmentos)
+
+    return len(fragmentos)
+
+def _ensamblar(fragmentos: list[Fragmento], presupuesto_tokens: int | None) -> str:
+    if not fragmentos:
+        # Fallback por si la DB no está lista o vacía
+        return SIN_CONTEXTO
+    with medir("contexto"):
+        contexto, _ = ensamblar_contexto(fragmentos, presupuesto_tokens)
+    return contexto
+
+def _buscar_lexico(query: str, id_documento: str, k: int, indice: IndiceBM25 | None = None) -> list[Fragmento] | None:
+    """
+    Vía rápida para consultas de códigos y cifras: solo BM25, sin llamada de embeddings.
+    Retorna None si el documento no tiene índice léxico o no hay coincidencias.
+    """
+    if indice is None:
+        indice = obtener_indices_lexicos().obtener(id_documento)
+    if indice is None:
+        return None
+    with medir("bm25"):
+        resultados = indice.buscar(query, k)
+    if not resultados:
+        return None
+    return [Fragmento(indice.textos[i], indice.posiciones[i]) for i, _ in resultados]
+
+def _buscar_hibrido(query: str, id_documento: str, k: int) -> list[Fragmento]:
+    """
+    Búsqueda sin caché (bloqueante): combina con Reciprocal Rank Fusion los candidatos de la
+    búsqueda vectorial en Chroma y los del índice BM25 del documento, que recupera los fragmentos
+    con coincidencias exactas (códigos CNAE, importes, artículos) que los embeddings pasan por alto.
+    Retorna los fragmentos ordenados por relevancia.
+    """
+    # Se busca en la partición del documento; si aún no se ha migrado, en la colección global
+    # filtrando por su ID (mismo resultado, pero sobre el grafo HNSW de todo el corpus)
+    vectordb, filtro = obtener_particion(id_documento), None
+    if vectordb is None:
+        vectordb, filtro = _obtener_vectordb_global(), {"id_documento": id_documento}
+    candidatos = k * CANDIDATOS_POR_RESULTADO
+
     # Forzamos una búsqueda en lenguaje natural y devolvemos los 'k' mejores bloques
     busqueda = f"requisitos de facturación, CNAE elegible, plazos, {query}"
-    
-    # Se filtra para buscar sólo en los fragmentos del propio ID de la convocatoria
-    results = vectordb.similarity_search(
-        busqueda, 
-        k=k,
-        filter={"id_documento": id_documento}
-    )
-    
-    if not results:
-        # Fallback por si la DB no está lista o vacía
-        return "No se encontró contexto en la base de datos para este documento."
-        
-    contextos = [doc.page_content for doc in results]
-    return "\n\n---\n\n".join(contextos)
+
+    vectoriales = []
+    if vectordb is not None:
+        # Vectorizamos la consulta aparte (equivale a similarity_search) para medir cada etapa por separado
+        with medir("embedding"):
+            vector = obtener_embeddings().embed_query(busqueda)
+
+        with medir("chroma"):
+            results = vectordb.similarity_search_by_vector(vector, k=candidatos, filter=filtro)
+        if filtro is not None and not results:
+            # Nada en la global: el documento puede haberse migrado a su partición después de que
+            # esta se recordara como ausente; la próxima búsqueda vuelve a comprobarlo
+            _colecciones_ausentes.invalidar(_nombre_particion(id_documento))
+        vectoriales = [Fragmento(doc.page_content, doc.metadata.get("posicion", -1)) for doc in results]
+
+    indice = obtener_indices_lexicos().obtener(id_documento)
+    if indice is None:
+        return vectoriales[:k]
+
+    fragmentos = {id_fragmento(id_documento, f.texto): f for f in vectoriales}
+    ranking_vectorial = list(fragmentos)
+    ranking_lexico = []
+    with medir("bm25"):
+        lexicos = indice.buscar(busqueda, candidatos)
+    for i, _ in lexicos:
+        ranking_lexico.append(indice.ids[i])
+        fragmentos.setdefault(indice.ids[i], Fragmento(indice.textos[i], indice.posiciones[i]))
+
+    return [fragmentos[id_] for id_ in fusion_rrf([ranking_vectorial, ranking_lexico], k)]
+
+def _buscar_sin_cache(query: str, id_documento: str, k: int) -> list[Fragmento]:
+    if es_consulta_lexica(query):
+        fragmentos = _buscar_lexico(query, id_documento, k)
+        if fragmentos is not None:
+            return fragmentos
+    return _buscar_hibrido(query, id_documento, k)
+
+def buscar_requisitos_relevantes(query: str, id_documento: str, k: int = 4, presupuesto_tokens: int | None = None) -> str:
+    """
+    Busca en la base de datos vectorial aquellos fragmentos del texto original
+    que respondan a la query para el documento específico.
+    Combina búsqueda vectorial y léxica (BM25); las consultas compuestas sobre todo de códigos
+    y cifras se resuelven solo con BM25, sin llamada de embeddings.
+    El contexto se compacta (sin solapamientos ni duplicados, en orden del documento) y se
+    recorta a presupuesto_tokens si se indica.
+    Los resultados se memoizan por (documento, query normalizada, k, presupuesto) hasta que
+    caducan o el documento se reindexa.
+    Es bloqueante: desde código asíncrono usar buscar_requisitos_relevantes_async.
+    """
+    cache = obtener_cache_recuperacion()
+    clave = cache.clave(id_documento, query, k, presupuesto_tokens)
+    contexto = cache.obtener(clave)
+    if contexto is not None:
+        return contexto
+
+    contexto = _ensamblar(_buscar_sin_cache(query, id_documento, k), presupuesto_tokens)
+    if contexto != SIN_CONTEXTO:
+        cache.guardar(clave, contexto)
+    return contexto
+
+async def buscar_requisitos_relevantes_async(query: str, id_documento: str, k: int = 4, presupuesto_tokens: int | None = None) -> str:
+    """
+    Versión asíncrona de buscar_requisitos_relevantes. Los aciertos de caché y la vía léxica con
+    el índice BM25 ya en memoria (microsegundos, sin red) se resuelven directamente; el resto, con
+    la lectura del índice de disco, la llamada de embeddings o la búsqueda en Chroma, se ejecuta en
+    un pool de hilos acotado, fuera del event loop, para que una búsqueda lenta no bloquee al resto
+    de peticiones del worker.
+    """
+    # Etapa total de recuperación (incluye los aciertos de caché); sus subetapas se miden aparte
+    with medir("recuperacion"):
+        cache = obtener_cache_recuperacion()
+        clave = cache.clave(id_documento, query, k, presupuesto_tokens, solo_memoria=True)
+        if clave is None:
+            # Generación del documento caducada en memoria: se lee de SQLite en un hilo
+            clave = await asyncio.to_thread(cache.clave, id_documento, query, k, presupuesto_tokens)
+        contexto = cache.obtener(clave)
+        if contexto is not None:
+            return contexto
+
+        fragmentos, buscar = None, _buscar_hibrido
+        if es_consulta_lexica(query):
+            # Si el índice BM25 no está en memoria habría que leer su JSON del disco: toda la búsqueda va al pool
+            indice = obtener_indices_lexicos().en_memoria(id_documento)
+            if indice is not None:
+                fragmentos = _buscar_lexico(query, id_documento, k, indice)
+            else:
+                buscar = _buscar_sin_cache
+        if fragmentos is None:
+            loop = asyncio.get_running_loop()
+            # run_in_executor no propaga el contexto: lo copiamos para que las etapas cuenten en la petición
+            contexto_peticion = contextvars.copy_context()
+            fragmentos = await loop.run_in_executor(
+                _obtener_executor(), contexto_peticion.run, buscar, query, id_documento, k
+            )
+        contexto = _ensamblar(fragmentos, presupuesto_tokens)
+        if contexto != SIN_CONTEXTO:
+            cache.guardar(clave, contexto)
+        return contexto
@@ -3,6 +3,21 @@ import streamlit as st
 import requests
 import json
 
+def leer_eventos_sse(response):
+    """Recorre una respuesta Server-Sent Events y produce tuplas (evento, datos_json)."""
+    evento, datos = "message", []
+    for linea in response.iter_lines(decode_unicode=True):
+        if linea is None:
+            continue
+        if linea == "":
+            if datos:
+                yield evento, json.loads("\n".join(datos))
+            evento, datos = "message", []
+        elif linea.startswith("event:"):
+            evento = linea[len("event:"):].strip()
+        elif linea.startswith("data:"):
+            datos.append(linea[len("data:"):].strip())
+
 # ==========================================
 # Configuración Inicial de la Página
 # ==========================================
@@ -16,15 +31,25 @@ st.set_page_config(
 API_BASE = os.getenv("API_URL_BASE", "http://localhost:8000")
 API_URL_EVALUAR = f"{API_BASE}/api/v1/analisis/evaluar"
 API_URL_MEMORIA = f"{API_BASE}/api/v1/documentos/generar-memoria"
+API_URL_MEMORIA_STREAM = f"{API_URL_MEMORIA}/stream"
+API_URL_CONVOCATORIAS = f"{API_BASE}/api/v1/convocatorias"
+CONVOCATORIAS_POR_PAGINA = 10
 
-# Datos mockeados de la convocatoria simulada
-convocatoria_mock = {
-    "id_convocatoria": "FTE_AND_26",
-    "titulo_ayuda": "Fondo Tecnológico de Andalucía 2026",
-    "organismo_emisor": "Junta de Andalucía - Consejería de Innovación",
-    "presupuesto_total_eur": 5000000.0,
-    "id_documento_boe": "BOJA_FTE_AND_26_pdf"
-}
+def obtener_pagina_convocatorias(params):
+    """
+    Pide una página del catálogo. Streamlit re-ejecuta el script en cada interacción, así que
+    guardamos cada página con su ETag y la revalidamos (If-None-Match): si el catálogo no ha
+    cambiado el backend responde 304 sin cuerpo y reutilizamos la copia de la sesión.
+    """
+    cache = st.session_state.setdefault('cache_catalogo', {})
+    clave = json.dumps(params, sort_keys=True)
+    cabeceras = {"If-None-Match": cache[clave][0]} if clave in cache else {}
+    response = requests.get(API_URL_CONVOCATORIAS, params=params, headers=cabeceras, timeout=10)
+    if response.status_code == 304:
+        return cache[clave][1]
+    response.raise_for_status()
+    cache[clave] = (response.headers.get("ETag"), response.json())
+    return cache[clave][1]
 
 # ==========================================
 # Barra Lateral (Sidebar) - Formulario Ingesta
@@ -71,51 +96,85 @@ st.markdown("Automatizando el ciclo de vida de las subvenciones públicas para P
 tab1, tab2 = st.tabs(["📊 Dashboard de Ayudas", "📄 Generador de Expedientes"])
 
 # --- TAB 1: Dashboard de Ayudas ---
+def analizar_viabilidad(convocatoria):
+    with st.spinner("Motor IA analizando elegibilidad..."):
+        payload = {
+            "empresa": perfil_pyme,
+            "convocatoria": convocatoria
+        }
+        
+        try:
+            response = requests.post(API_URL_EVALUAR, json=payload, timeout=40)
+            response.raise_for_status()
+            resultado = response.json()
+            
+            st.success("Análisis completado.")
+            if response.headers.get("X-Evaluacion-Origen") == "cribado":
+                st.caption("🧮 Descartada por requisitos objetivos de la convocatoria (sin consultar a la IA).")
+            elif response.headers.get("X-Cache") == "HIT":
+                st.caption("⚡ Resultado recuperado de la caché de evaluaciones (sin coste de IA).")
+            
+            # Mostrar métricas del JSON devuelto
+            col1, col2 = st.columns(2)
+            with col1:
+                # Color verde si es alta, rojo si baja
+                color = "normal" if resultado['probabilidad_exito'] >= 50 else "inverse"
+                st.metric(label="Probabilidad de Éxito", value=f"{resultado['probabilidad_exito']}%", delta=color)
+                st.markdown(f"**Elegible:** {'✅ Sí' if resultado['es_elegible'] else '❌ No'}")
+                
+            with col2:
+                st.info(f"**Justificación Económica:**\n{resultado['justificacion_economica']}")
+                st.warning(f"**Coste de Oportunidad:**\n{resultado['coste_oportunidad']}")
+            
+            # Guardar el estado en sesión para usarlo en la pestaña 2
+            st.session_state['evaluacion_completada'] = True
+            st.session_state['payload_memoria'] = payload
+            st.session_state['probabilidad'] = resultado['probabilidad_exito']
+            
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error de conexión con el backend: {e}. ¿Está el servidor FastAPI encendido?")
+
 with tab1:
     st.subheader("Oportunidades Abiertas")
+    st.caption(f"Convocatorias con plazo abierto para el CNAE {cnae.split(' ')[0]} en {ubicacion}, ordenadas por fecha límite.")
     
-    # Tarjeta de la convocatoria simulada
-    with st.container(border=True):
-        st.markdown(f"### {convocatoria_mock['titulo_ayuda']}")
-        st.markdown(f"**Organismo:** {convocatoria_mock['organismo_emisor']}")
-        st.markdown(f"**Presupuesto Total:** {convocatoria_mock['presupuesto_total_eur']:,.2f} €")
-        
-        with st.expander("Ver Metadatos Legales"):
-            st.info(f"ID Documento BOE Indexado en RAG: {convocatoria_mock['id_documento_boe']}")
+    # Filtros del catálogo a partir del perfil; al cambiarlos se vuelve a la primera página
+    filtros_catalogo = {"ccaa": ubicacion, "cnae": cnae, "abiertas": True, "limite": CONVOCATORIAS_POR_PAGINA}
+    if st.session_state.get('filtros_catalogo') != filtros_catalogo:
+        st.session_state['filtros_catalogo'] = filtros_catalogo
+        st.session_state['cursores_catalogo'] = [None]
+    
+    convocatorias, siguiente_cursor = [], None
+    try:
+        for cursor in st.session_state['cursores_catalogo']:
+            params = {**filtros_catalogo, **({"cursor": cursor} if cursor else {})}
+            pagina = obtener_pagina_convocatorias(params)
+            convocatorias.extend(pagina['convocatorias'])
+            siguiente_cursor = pagina['siguiente_cursor']
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error de conexión con el backend: {e}. ¿Está el servidor FastAPI encendido?")
+    
+    if not convocatorias:
+        st.info("No hay convocatorias abiertas en el catálogo para este perfil.")
+    
+    # Tarjeta de cada convocatoria del catálogo
+    for convocatoria in convocatorias:
+        with st.container(border=True):
+            st.markdown(f"### {convocatoria['titulo_ayuda']}")
+            st.markdown(f"**Organismo:** {convocatoria['organismo_emisor']}")
+            st.markdown(f"**Presupuesto Total:** {convocatoria['presupuesto_total_eur']:,.2f} €")
+            if convocatoria.get('fecha_limite'):
+                st.markdown(f"**Fecha Límite:** {convocatoria['fecha_limite']}")
             
-        if st.button("🔍 Analizar Viabilidad", type="primary", key="btn_evaluar"):
-            with st.spinner("Motor IA analizando elegibilidad..."):
-                payload = {
-                    "empresa": perfil_pyme,
-                    "convocatoria": convocatoria_mock
-                }
+            with st.expander("Ver Metadatos Legales"):
+                st.info(f"ID Documento BOE Indexado en RAG: {convocatoria['id_documento_boe']}")
                 
-                try:
-                    response = requests.post(API_URL_EVALUAR, json=payload, timeout=40)
-                    response.raise_for_status()
-                    resultado = response.json()
-                    
-                    st.success("Análisis completado.")
-                    
-                    # Mostrar métricas del JSON devuelto
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        # Color verde si es alta, rojo si baja
-                        color = "normal" if resultado['probabilidad_exito'] >= 50 else "inverse"
-                        st.metric(label="Probabilidad de Éxito", value=f"{resultado['probabilidad_exito']}%", delta=color)
-                        st.markdown(f"**Elegible:** {'✅ Sí' if resultado['es_elegible'] else '❌ No'}")
-                        
-                    with col2:
-                        st.info(f"**Justificación Económica:**\n{resultado['justificacion_economica']}")
-                        st.warning(f"**Coste de Oportunidad:**\n{resultado['coste_oportunidad']}")
-                    
-                    # Guardar el estado en sesión para usarlo en la pestaña 2
-                    st.session_state['evaluacion_completada'] = True
-                    st.session_state['payload_memoria'] = payload
-                    st.session_state['probabilidad'] = resultado['probabilidad_exito']
-                    
-                except requests.exceptions.RequestException as e:
-                    st.error(f"Error de conexión con el backend: {e}. ¿Está el servidor FastAPI encendido?")
+            if st.button("🔍 Analizar Viabilidad", type="primary", key=f"btn_evaluar_{convocatoria['id_convocatoria']}"):
+                analizar_viabilidad(convocatoria)
+    
+    if siguiente_cursor and st.button("Cargar más convocatorias", key="btn_mas_convocatorias"):
+        st.session_state['cursores_catalogo'].append(siguiente_cursor)
+        st.rerun()
 
 # --- TAB 2: Generador de Expedientes ---
 with tab2:
@@ -126,21 +185,33 @@ with tab2:
             st.success("El proyecto tiene un alto índice de elegibilidad. Listo para generar el documento formal.")
             
             if st.button("✍️ Generar Memoria Técnica Completa", type="primary"):
-                with st.spinner("Agente Experto redactando el expediente. Esto puede tomar unos 30-40 segundos..."):
-                    try:
-                        response_memoria = requests.post(
-                            API_URL_MEMORIA, 
-                            json=st.session_state['payload_memoria'],
-                            timeout=60
-                        )
+                st.session_state['documento_generado'] = None
+                st.caption("Agente Experto redactando el expediente en tiempo real...")
+                vista_progresiva = st.empty()
+                documento_md = ""
+                try:
+                    # El timeout de lectura aplica entre fragmentos, no al documento completo
+                    with requests.post(
+                        API_URL_MEMORIA_STREAM,
+                        json=st.session_state['payload_memoria'],
+                        stream=True,
+                        timeout=(10, 60)
+                    ) as response_memoria:
                         response_memoria.raise_for_status()
-                        documento_md = response_memoria.json()['documento_markdown']
-                        
-                        st.session_state['documento_generado'] = documento_md
-                        st.toast("Memoria generada correctamente!", icon="🎉")
-                        
-                    except requests.exceptions.RequestException as e:
-                        st.error(f"Error al generar la memoria: {e}")
+                        for evento, datos in leer_eventos_sse(response_memoria):
+                            if evento == "fragmento":
+                                documento_md += datos['texto']
+                                vista_progresiva.markdown(documento_md + " ▌")
+                            elif evento == "error":
+                                st.error(f"Error al generar la memoria: {datos['detail']}")
+                                break
+                            elif evento == "fin":
+                                st.session_state['documento_generado'] = documento_md
+                                st.toast("Memoria generada correctamente!", icon="🎉")
+                    vista_progresiva.empty()
+
+                except requests.exceptions.RequestException as e:
+                    st.error(f"Error al generar la memoria: {e}")
             
             # Si el documento ya está generado en la sesión, mostrarlo y dar botón de descarga
             if st.session_state.get('documento_generado'):
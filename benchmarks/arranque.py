@@ -0,0 +1,132 @@
+"""
+Mide el coste del arranque en frío del backend:
+  - tiempo de importar app.main (python -X importtime), con los módulos más pesados;
+  - tiempo desde lanzar uvicorn hasta la primera respuesta de / y hasta que /ready responde 200.
+
+Uso:
+    python -m benchmarks.arranque --repeticiones 5 --salida arranque.json
+    FONDOIA_CALENTAR=1 python -m benchmarks.arranque
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+def medir_import() -> tuple[float, list[tuple[str, float]]]:
+    """
+    Retorna los ms acumulados de importar app.main y el coste por paquete: cada paquete se lleva
+    el tiempo acumulado del punto en que lo importa otro paquete distinto (p. ej. app -> fastapi).
+    """
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True
+    ).stderr
+    # importtime lista cada módulo después de sus hijos, con una sangría de 2 espacios por nivel
+    pendientes: dict[int, list] = {}
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        nivel = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        nodo = (nombre.strip(), int(acumulado) / 1000, pendientes.pop(nivel + 1, []))
+        pendientes.setdefault(nivel, []).append(nodo)
+    raices = pendientes.get(0, [])
+
+    total = next((ms for nombre, ms, _ in raices if nombre == "app.main"), 0.0)
+    paquetes: dict[str, float] = {}
+
+    def recorrer(nodo, paquete_padre):
+        nombre, ms, hijos = nodo
+        paquete = nombre.split(".")[0]
+        if paquete != paquete_padre and paquete_padre is not None:
+            paquetes[paquete] = paquetes.get(paquete, 0.0) + ms
+            return
+        for hijo in hijos:
+            recorrer(hijo, paquete)
+
+    for raiz in raices:
+        if raiz[0] == "app.main":
+            recorrer(raiz, None)
+    return total, sorted(paquetes.items(), key=lambda p: -p[1])
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def esperar(url: str, limite: float, aceptar_503: bool = False) -> float | None:
+    """Sondea url hasta que responde 200; retorna el instante en que lo hizo (o None si vence el límite)."""
+    while time.perf_counter() < limite:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as r:
+                if r.status == 200:
+                    return time.perf_counter()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                # Versión sin esa ruta (p. ej. al medir un commit anterior como referencia)
+                return None
+            if not (aceptar_503 and e.code == 503):
+                raise
+        except OSError:
+            pass
+        time.sleep(0.02)
+    return None
+
+def medir_primera_respuesta(timeout: float) -> dict:
+    puerto = puerto_libre()
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(puerto), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        limite = inicio + timeout
+        primera = esperar(f"http://127.0.0.1:{puerto}/", limite)
+        lista = esperar(f"http://127.0.0.1:{puerto}/ready", limite, aceptar_503=True)
+    finally:
+        proceso.terminate()
+        proceso.wait()
+    return {
+        "primera_respuesta_ms": round((primera - inicio) * 1000, 1) if primera else None,
+        "ready_ms": round((lista - inicio) * 1000, 1) if lista else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de import y de primera respuesta tras un arranque en frío.")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Módulos más pesados a mostrar")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--salida", help="Fichero JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    imports, modulos = [], []
+    arranques = []
+    for _ in range(args.repeticiones):
+        total, modulos = medir_import()
+        imports.append(total)
+        arranques.append(medir_primera_respuesta(args.timeout))
+
+    def mediana(clave: str):
+        valores = [a[clave] for a in arranques if a[clave] is not None]
+        return round(statistics.median(valores), 1) if valores else None
+
+    resultado = {
+        "calentamiento": os.getenv("FONDOIA_CALENTAR", "0") == "1",
+        "import_app_main_ms_mediana": round(statistics.median(imports), 1),
+        "primera_respuesta_ms_mediana": mediana("primera_respuesta_ms"),
+        "ready_ms_mediana": mediana("ready_ms"),
+        "modulos_mas_pesados_ms": {nombre: round(ms, 1) for nombre, ms in modulos[:args.top]},
+    }
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
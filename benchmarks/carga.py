@@ -0,0 +1,312 @@
+"""
+Benchmark de carga sin red: arranca app.main:app en proceso (con su lifespan) contra un modelo
+Gemini simulado (latencia configurable y ResultadoEvaluacion JSON fijo) y el backend de embeddings
+determinista 'hashing', sobre un corpus sintético de boletines PDF ingerido con procesar_pdf_boe.
+
+Mide latencia p50/p95/p99 y peticiones/s de /evaluar, /generar-memoria y de la ingesta a varios
+niveles de concurrencia. Todo se ejecuta en un directorio temporal: no toca chroma_db ni las cachés.
+
+Uso:
+    python -m benchmarks.carga --concurrencias 1 4 16 --peticiones 200 --salida baseline.json
+    python -m benchmarks.carga --comparar baseline.json --tolerancia 0.2
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import asyncio
+import argparse
+import tempfile
+import platform
+import numpy as np
+
+RESULTADO_EVALUACION = {
+    "es_elegible": True,
+    "probabilidad_exito": 72,
+    "justificacion_economica": "Cumple el límite de facturación y el CNAE está entre los elegibles.",
+    "coste_oportunidad": "Compensa: el importe justifica el esfuerzo de tramitación."
+}
+MEMORIA = "# Memoria Técnica del Proyecto\n\n" + "Texto de la memoria generado por el modelo simulado. " * 200
+
+CCAA = ["Andalucía", "Cataluña", "Madrid", "Galicia", "Aragón", "Castilla y León"]
+
+# --- Modelo Gemini simulado ---
+
+class _Uso:
+    def __init__(self, prompt: str, texto: str):
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(texto) // 4
+
+class _Respuesta:
+    def __init__(self, texto: str, prompt: str):
+        self.text = texto
+        self.parts = [texto]
+        self.usage_metadata = _Uso(prompt, texto)
+
+class _RespuestaStream:
+    def __init__(self, texto: str, prompt: str, latencia: float):
+        self._trozos = [texto[i:i + 400] for i in range(0, len(texto), 400)]
+        self._prompt = prompt
+        self._latencia = latencia
+
+    async def __aiter__(self):
+        for trozo in self._trozos:
+            await asyncio.sleep(self._latencia / len(self._trozos))
+            yield _Respuesta(trozo, self._prompt)
+
+class ModeloSimulado:
+    """Sustituto de genai.GenerativeModel: duerme la latencia indicada y devuelve una respuesta fija."""
+
+    def __init__(self, modelo: str, latencias: dict[str, float]):
+        self.modelo = modelo
+        self.latencia = latencias.get(modelo, latencias["defecto"])
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, request_options=None):
+        es_json = (generation_config or {}).get("response_mime_type") == "application/json"
+        texto = json.dumps(RESULTADO_EVALUACION, ensure_ascii=False) if es_json else MEMORIA
+        if stream:
+            return _RespuestaStream(texto, prompt, self.latencia)
+        # Variación de ±20 % para que los percentiles no sean todos iguales
+        await asyncio.sleep(self.latencia * random.uniform(0.8, 1.2))
+        return _Respuesta(texto, prompt)
+
+# --- Corpus sintético ---
+
+def escribir_pdf(ruta: str, paginas: list[str]):
+    """Escribe un PDF mínimo (Helvetica, una página por texto) legible por PyPDFLoader."""
+    objetos = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    paginas_ids = []
+    for texto in paginas:
+        limpio = texto.replace("\\", "").replace("(", "").replace(")", "")
+        lineas = [limpio[i:i + 90] for i in range(0, len(limpio), 90)]
+        contenido = ("BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({l}) '" for l in lineas) + " ET").encode("latin-1", "replace")
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream")
+        objetos.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objetos)
+        )
+        paginas_ids.append(len(objetos))
+    objetos[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % i for i in paginas_ids), len(paginas_ids))
+
+    salida, desplazamientos = b"%PDF-1.4\n", []
+    for i, objeto in enumerate(objetos):
+        desplazamientos.append(len(salida))
+        salida += b"%d 0 obj\n" % (i + 1) + objeto + b"\nendobj\n"
+    inicio_xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    salida += b"".join(b"%010d 00000 n \n" % d for d in desplazamientos)
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, inicio_xref)
+    with open(ruta, "wb") as f:
+        f.write(salida)
+
+def paginas_boletin(semilla: int, n_paginas: int) -> list[str]:
+    """Texto con la estructura típica de una convocatoria del BOE/BOJA (artículos, CNAE, importes, plazos)."""
+    aleatorio = random.Random(semilla)
+    paginas = []
+    for p in range(n_paginas):
+        articulos = []
+        for a in range(4):
+            numero = p * 4 + a + 1
+            articulos.append(
+                f"Articulo {numero}. Beneficiarios y requisitos. Podran ser beneficiarias las pequenas y medianas "
+                f"empresas con domicilio fiscal en {aleatorio.choice(CCAA)} cuya actividad principal se encuadre en el "
+                f"CNAE {aleatorio.randint(10, 96)}.{aleatorio.randint(10, 99)}, con una facturacion anual inferior a "
+                f"{aleatorio.randint(1, 50) * 100000} euros y una plantilla de hasta {aleatorio.randint(10, 250)} "
+                f"personas trabajadoras. La cuantia maxima de la ayuda sera de {aleatorio.randint(5, 500) * 1000} euros "
+                f"y el plazo de presentacion de solicitudes sera de {aleatorio.randint(10, 60)} dias habiles desde la "
+                f"publicacion de este extracto. Seran gastos subvencionables las inversiones en activos materiales e "
+                f"inmateriales vinculadas al proyecto."
+            )
+        paginas.append(" ".join(articulos))
+    return paginas
+
+def generar_corpus(directorio: str, prefijo: str, n_documentos: int, n_paginas: int) -> list[tuple[str, str]]:
+    os.makedirs(directorio, exist_ok=True)
+    documentos = []
+    for d in range(n_documentos):
+        ruta = os.path.join(directorio, f"{prefijo}_{d}.pdf")
+        escribir_pdf(ruta, paginas_boletin(zlib.crc32(f"{prefijo}_{d}".encode()), n_paginas))
+        documentos.append((ruta, f"{prefijo}_{d}_pdf"))
+    return documentos
+
+# --- Carga ---
+
+def percentiles(latencias: list[float]) -> dict:
+    if not latencias:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(latencias) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+
+async def lanzar_carga(peticion, total: int, concurrencia: int) -> dict:
+    """Bucle cerrado: `concurrencia` clientes lanzan peticiones seguidas hasta completar `total`."""
+    latencias, errores, siguiente = [], 0, iter(range(total))
+
+    async def cliente():
+        nonlocal errores
+        for i in siguiente:
+            inicio = time.perf_counter()
+            try:
+                ok = await peticion(i)
+            except Exception:
+                ok = False
+            latencias.append(time.perf_counter() - inicio)
+            errores += not ok
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    return {
+        "concurrencia": concurrencia,
+        "peticiones": total,
+        "errores": errores,
+        "peticiones_por_segundo": round(total / duracion, 2) if duracion else 0.0,
+        **percentiles(latencias)
+    }
+
+def cuerpo_solicitud(i: int, id_documento: str) -> dict:
+    # Cada petición es distinta (facturación y empleados): sin aciertos de caché ni coalescencia
+    return {
+        "empresa": {
+            "nombre_fiscal": f"Empresa Benchmark {i} S.L.",
+            "cnae": "6201",
+            "facturacion_anual_eur": 100000.0 + i * 137,
+            "empleados_plantilla": 5 + i % 200,
+            "ubicacion_ccaa": CCAA[i % len(CCAA)],
+            "necesidad_inversion": "Digitalización de procesos y adquisición de equipamiento."
+        },
+        "convocatoria": {
+            "id_convocatoria": f"CONV-{i}",
+            "titulo_ayuda": "Ayudas a la digitalización de pymes",
+            "organismo_emisor": "Agencia de Innovación",
+            "presupuesto_total_eur": 5000000.0,
+            "id_documento_boe": id_documento
+        }
+    }
+
+async def ejecutar(args) -> dict:
+    # Importamos la aplicación después de fijar el entorno (la configuración se lee al importar)
+    import httpx
+    from app.main import app, lifespan
+    from app.services import llm_gateway, vector_db
+
+    latencias = {
+        "gemini-2.5-flash": args.latencia_flash / 1000,
+        "gemini-2.5-pro": args.latencia_pro / 1000,
+        "defecto": args.latencia_flash / 1000
+    }
+    llm_gateway.obtener_modelo = lambda modelo, system_instruction: ModeloSimulado(modelo, latencias)
+
+    resultados = {"evaluar": [], "generar_memoria": [], "ingesta": []}
+    async with lifespan(app):
+        corpus = generar_corpus("pdfs", "BOE_BENCH", args.documentos, args.paginas)
+        for ruta, id_documento in corpus:
+            vector_db.procesar_pdf_boe(ruta, id_documento)
+        ids = [id_documento for _, id_documento in corpus]
+
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark", timeout=None) as cliente:
+            desplazamiento = 0
+            for concurrencia in args.concurrencias:
+                async def evaluar(i, base=desplazamiento):
+                    r = await cliente.post("/api/v1/analisis/evaluar", json=cuerpo_solicitud(base + i, ids[i % len(ids)]))
+                    return r.status_code == 200
+
+                async def generar_memoria(i, base=desplazamiento):
+                    r = await cliente.post("/api/v1/documentos/generar-memoria", json=cuerpo_solicitud(base + i, ids[i % len(ids)]))
+                    return r.status_code == 200
+
+                for nombre, peticion in (("evaluar", evaluar), ("generar_memoria", generar_memoria)):
+                    resultado = await lanzar_carga(peticion, args.peticiones, concurrencia)
+                    resultados[nombre].append(resultado)
+                    print(f"[{nombre}] {json.dumps(resultado, ensure_ascii=False)}")
+                desplazamiento += args.peticiones
+
+                # Ingesta: documentos nuevos en cada nivel (reingerir uno existente no hace nada)
+                nuevos = generar_corpus("pdfs", f"BOE_INGESTA_C{concurrencia}", args.documentos_ingesta, args.paginas)
+
+                async def ingerir(i, documentos=nuevos):
+                    ruta, id_documento = documentos[i]
+                    return await asyncio.to_thread(vector_db.procesar_pdf_boe, ruta, id_documento) > 0
+
+                resultado = await lanzar_carga(ingerir, len(nuevos), concurrencia)
+                resultados["ingesta"].append(resultado)
+                print(f"[ingesta] {json.dumps(resultado, ensure_ascii=False)}")
+
+    return resultados
+
+def comparar(actual: dict, referencia: dict, tolerancia: float) -> list[str]:
+    """Regresiones de p95 o de peticiones/s respecto a la línea base por encima de la tolerancia."""
+    regresiones = []
+    for escenario, niveles in actual["resultados"].items():
+        previos = {n["concurrencia"]: n for n in referencia.get("resultados", {}).get(escenario, [])}
+        for nivel in niveles:
+            previo = previos.get(nivel["concurrencia"])
+            if previo is None:
+                continue
+            if previo["p95_ms"] and nivel["p95_ms"] > previo["p95_ms"] * (1 + tolerancia):
+                regresiones.append(f"{escenario} c={nivel['concurrencia']}: p95 {previo['p95_ms']} -> {nivel['p95_ms']} ms")
+            if nivel["peticiones_por_segundo"] < previo["peticiones_por_segundo"] * (1 - tolerancia):
+                regresiones.append(
+                    f"{escenario} c={nivel['concurrencia']}: {previo['peticiones_por_segundo']} -> {nivel['peticiones_por_segundo']} peticiones/s"
+                )
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga sin red (Gemini y embeddings simulados).")
+    parser.add_argument("--concurrencias", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--peticiones", type=int, default=100, help="Peticiones por escenario y nivel de concurrencia")
+    parser.add_argument("--documentos", type=int, default=10, help="Boletines sintéticos del corpus de búsqueda")
+    parser.add_argument("--documentos-ingesta", type=int, default=8, help="Boletines a ingerir por nivel de concurrencia")
+    parser.add_argument("--paginas", type=int, default=6, help="Páginas por boletín sintético")
+    parser.add_argument("--latencia-flash", type=float, default=400, help="Latencia simulada de gemini-2.5-flash (ms)")
+    parser.add_argument("--latencia-pro", type=float, default=2000, help="Latencia simulada de gemini-2.5-pro (ms)")
+    parser.add_argument("--limites-reales", action="store_true", help="Respetar los límites de llamadas por minuto de producción")
+    parser.add_argument("--salida", help="Fichero JSON donde guardar los resultados (línea base)")
+    parser.add_argument("--comparar", help="Línea base JSON con la que comparar los resultados")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento relativo admitido antes de marcar regresión")
+    args = parser.parse_args()
+
+    salida = os.path.abspath(args.salida) if args.salida else None
+    referencia = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            referencia = json.load(f)
+
+    directorio = tempfile.mkdtemp(prefix="fondoia_benchmark_")
+    os.chdir(directorio)  # chroma_db y bm25_index son rutas relativas al directorio de trabajo
+    os.environ.update({
+        "GEMINI_API_KEY": "benchmark",
+        "FONDOIA_EMBEDDINGS_BACKEND": "hashing",
+        "FONDOIA_CACHE_DIR": os.path.join(directorio, "cache_db"),
+        "FONDOIA_BM25_DIR": os.path.join(directorio, "bm25_index"),
+    })
+    if not args.limites_reales:
+        # Sin límite de tasa: se mide el servicio, no el token bucket
+        os.environ.update({"FONDOIA_LLM_RPM_FLASH": "1000000", "FONDOIA_LLM_RPM_PRO": "1000000"})
+
+    print(f"Directorio de trabajo: {directorio}")
+    resultados = asyncio.run(ejecutar(args))
+    informe = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("salida", "comparar")},
+        "resultados": resultados
+    }
+
+    if salida:
+        with open(salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+
+    if referencia is not None:
+        regresiones = comparar(informe, referencia, args.tolerancia)
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto a la línea base.")
+
+if __name__ == "__main__":
+    main()
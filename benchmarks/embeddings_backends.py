@@ -0,0 +1,138 @@
+"""
+Compara los backends de embeddings (latencia y recall@k) sobre los boletines ya indexados
+con el backend de Google.
+
+Para cada fragmento muestreado se usa su primera frase como query; un acierto es que el
+fragmento de origen aparezca entre los k primeros del mismo documento (recall@k). Además se
+mide el solapamiento del top-k de cada backend con el de Google para las queries del servicio.
+
+Uso:
+    python -m benchmarks.embeddings_backends --backends google hashing local --k 4
+"""
+import re
+import json
+import time
+import random
+import argparse
+import statistics
+import numpy as np
+import chromadb
+from dotenv import load_dotenv
+
+from app.services.embeddings import crear_backend, nombre_coleccion
+from app.services.vector_db import CHROMA_DB_DIR
+from app.services.particiones import es_particion
+
+QUERIES_SERVICIO = [
+    "requisitos de facturación, CNAE elegible, plazos, CNAE: 6201, Facturación: 250000.0, Empleados: 15",
+    "requisitos de facturación, CNAE elegible, plazos, Normativa de la solicitud, inversión y plazos",
+]
+
+def cargar_corpus(max_documentos: int) -> dict[str, dict]:
+    """Fragmentos y embeddings de Google agrupados por documento."""
+    cliente = chromadb.PersistentClient(path=CHROMA_DB_DIR)
+    base = nombre_coleccion("google")
+    # Particiones por documento y, si aún existe, la colección global sin migrar
+    nombres = [c if isinstance(c, str) else c.name for c in cliente.list_collections()]
+    corpus: dict[str, dict] = {}
+    for nombre in sorted(n for n in nombres if n == base or es_particion(base, n)):
+        datos = cliente.get_collection(nombre).get(include=["documents", "metadatas", "embeddings"])
+        for id_, texto, metadatos, vector in zip(datos["ids"], datos["documents"], datos["metadatas"], datos["embeddings"]):
+            id_documento = (metadatos or {}).get("id_documento", "desconocido")
+            doc = corpus.setdefault(id_documento, {"ids": [], "textos": [], "google": []})
+            if id_ in doc["ids"]:
+                continue
+            doc["ids"].append(id_)
+            doc["textos"].append(texto)
+            doc["google"].append(vector)
+    return dict(list(corpus.items())[:max_documentos])
+
+def primera_frase(texto: str) -> str:
+    frases = [f.strip() for f in re.split(r"(?<=[.;:])\s+", texto) if len(f.strip()) > 30]
+    return (frases[0] if frases else texto)[:200]
+
+def normalizar(matriz) -> np.ndarray:
+    matriz = np.asarray(matriz, dtype=np.float32)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas == 0, 1, normas)
+
+def top_k(query: np.ndarray, fragmentos: np.ndarray, k: int) -> list[int]:
+    return list(np.argsort(-(fragmentos @ query))[:k])
+
+def percentil(valores: list[float], p: float) -> float:
+    return float(np.percentile(valores, p)) if valores else 0.0
+
+def evaluar_backend(nombre: str, corpus: dict, queries_por_documento: int, k: int, referencia: dict | None) -> dict:
+    embeddings, modelo = crear_backend(nombre)
+    latencias, aciertos, total, solapes = [], 0, 0, []
+    tops_servicio = {}
+    segundos_documentos, n_fragmentos = 0.0, 0
+
+    for id_documento, doc in corpus.items():
+        if nombre == "google":
+            fragmentos = normalizar(doc["google"])
+        else:
+            inicio = time.perf_counter()
+            fragmentos = normalizar(embeddings.embed_documents(doc["textos"]))
+            segundos_documentos += time.perf_counter() - inicio
+            n_fragmentos += len(doc["textos"])
+
+        muestra = random.Random(id_documento).sample(range(len(doc["textos"])), min(queries_por_documento, len(doc["textos"])))
+        for indice in muestra:
+            inicio = time.perf_counter()
+            query = normalizar([embeddings.embed_query(primera_frase(doc["textos"][indice]))])[0]
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            aciertos += indice in top_k(query, fragmentos, k)
+            total += 1
+
+        for q in QUERIES_SERVICIO:
+            query = normalizar([embeddings.embed_query(q)])[0]
+            tops_servicio[(id_documento, q)] = top_k(query, fragmentos, k)
+            if referencia is not None:
+                solapes.append(len(set(tops_servicio[(id_documento, q)]) & set(referencia[(id_documento, q)])) / k)
+
+    return {
+        "backend": nombre,
+        "modelo": modelo,
+        "queries": total,
+        f"recall@{k}": round(aciertos / total, 4) if total else 0.0,
+        f"solape_top{k}_con_google": round(statistics.mean(solapes), 4) if solapes else None,
+        "latencia_query_ms_p50": round(percentil(latencias, 50), 3),
+        "latencia_query_ms_p95": round(percentil(latencias, 95), 3),
+        "fragmentos_por_segundo_indexacion": round(n_fragmentos / segundos_documentos, 1) if segundos_documentos else None,
+        "_tops": tops_servicio,
+    }
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark de backends de embeddings (latencia y recall@k).")
+    parser.add_argument("--backends", nargs="+", default=["google", "hashing", "local"])
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--max-documentos", type=int, default=50)
+    parser.add_argument("--queries-por-documento", type=int, default=10)
+    parser.add_argument("--salida", help="Fichero JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    corpus = cargar_corpus(args.max_documentos)
+    print(f"{len(corpus)} documentos, {sum(len(d['textos']) for d in corpus.values())} fragmentos")
+
+    resultados, referencia = [], None
+    # Google primero: su top-k es la referencia del solapamiento
+    for nombre in sorted(args.backends, key=lambda b: b != "google"):
+        try:
+            resultado = evaluar_backend(nombre, corpus, args.queries_por_documento, args.k, referencia)
+        except ValueError as e:
+            print(f"[{nombre}] omitido: {e}")
+            continue
+        tops = resultado.pop("_tops")
+        if nombre == "google":
+            referencia = tops
+        resultados.append(resultado)
+        print(json.dumps(resultado, ensure_ascii=False))
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Compara la búsqueda de fragmentos de un documento en las dos disposiciones del almacén vectorial:
+una colección global filtrada por id_documento (la anterior) y una colección por documento
+(particiones, la actual), a medida que crece el número de documentos indexados.
+
+Usa vectores sintéticos (cada documento es un grupo de vectores alrededor de su propio centro,
+como los fragmentos de un mismo boletín) en un Chroma temporal: no toca chroma_db ni hace
+llamadas de embeddings. Mide latencia p50/p95 de la consulta y recall@k frente a la búsqueda
+exacta dentro del documento, y aparte el coste de abrir una partición por primera vez.
+
+Uso:
+    python -m benchmarks.particiones --documentos 10 100 1000 --fragmentos 40 --salida particiones.json
+"""
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import numpy as np
+import chromadb
+
+from app.services.particiones import nombre_particion
+
+BASE = "benchmark"
+
+def normalizar(matriz: np.ndarray) -> np.ndarray:
+    return matriz / np.linalg.norm(matriz, axis=-1, keepdims=True)
+
+def vectores_documento(id_documento: int, fragmentos: int, dimension: int) -> np.ndarray:
+    generador = np.random.default_rng(id_documento)
+    centro = generador.normal(size=dimension)
+    return normalizar(centro + generador.normal(scale=1.5, size=(fragmentos, dimension))).astype(np.float32)
+
+def indexar(cliente, coleccion_global, desde: int, hasta: int, fragmentos: int, dimension: int, corpus: dict):
+    for n in range(desde, hasta):
+        id_documento = f"BOE-SINT-{n:06d}"
+        vectores = vectores_documento(n, fragmentos, dimension)
+        ids = [f"{id_documento}-{i}" for i in range(fragmentos)]
+        metadatos = [{"id_documento": id_documento, "posicion": i} for i in range(fragmentos)]
+        coleccion_global.add(ids=ids, embeddings=vectores.tolist(), metadatas=metadatos)
+        particion = cliente.get_or_create_collection(nombre_particion(BASE, id_documento), embedding_function=None)
+        particion.add(ids=ids, embeddings=vectores.tolist(), metadatas=metadatos)
+        corpus[id_documento] = vectores
+
+def percentil(valores: list[float], p: float) -> float:
+    return float(np.percentile(valores, p)) if valores else 0.0
+
+def medir(cliente, coleccion_global, corpus: dict, consultas: int, k: int, dimension: int, semilla: int) -> dict:
+    aleatorio = random.Random(semilla)
+    ids_documento = list(corpus)
+    resultados = {"global_filtrada": {"latencias": [], "aciertos": 0}, "particiones": {"latencias": [], "aciertos": 0}}
+    total = 0
+
+    # La primera consulta a una colección carga su índice HNSW desde disco: se hace antes (sin contar en
+    # las latencias) y se informa aparte, porque en el servicio las particiones abiertas se reutilizan
+    consultados = [aleatorio.choice(ids_documento) for _ in range(consultas)]
+    aperturas = []
+    coleccion_global.query(query_embeddings=[corpus[consultados[0]][0].tolist()], n_results=1, include=[])
+    for id_documento in dict.fromkeys(consultados):
+        inicio = time.perf_counter()
+        particion = cliente.get_collection(nombre_particion(BASE, id_documento))
+        particion.query(query_embeddings=[corpus[id_documento][0].tolist()], n_results=1, include=[])
+        aperturas.append((time.perf_counter() - inicio) * 1000)
+
+    for id_documento in consultados:
+        vectores = corpus[id_documento]
+        ruido = np.random.default_rng(aleatorio.randrange(2 ** 32)).normal(scale=0.3, size=dimension)
+        query = normalizar(vectores[aleatorio.randrange(len(vectores))] + ruido).astype(np.float32)
+        exactos = {f"{id_documento}-{i}" for i in np.argsort(-(vectores @ query))[:k]}
+        total += k
+
+        inicio = time.perf_counter()
+        obtenidos = coleccion_global.query(query_embeddings=[query.tolist()], n_results=k, where={"id_documento": id_documento}, include=[])
+        resultados["global_filtrada"]["latencias"].append((time.perf_counter() - inicio) * 1000)
+        resultados["global_filtrada"]["aciertos"] += len(exactos & set(obtenidos["ids"][0]))
+
+        # Incluye resolver la colección por nombre, como hace el enrutado del servicio
+        inicio = time.perf_counter()
+        particion = cliente.get_collection(nombre_particion(BASE, id_documento))
+        obtenidos = particion.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        resultados["particiones"]["latencias"].append((time.perf_counter() - inicio) * 1000)
+        resultados["particiones"]["aciertos"] += len(exactos & set(obtenidos["ids"][0]))
+
+    informe = {
+        disposicion: {
+            "p50_ms": round(percentil(datos["latencias"], 50), 2),
+            "p95_ms": round(percentil(datos["latencias"], 95), 2),
+            "recall": round(datos["aciertos"] / total, 4)
+        }
+        for disposicion, datos in resultados.items()
+    }
+    informe["particiones"]["apertura_p50_ms"] = round(percentil(aperturas, 50), 2)
+    return informe
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia y recall: colección global filtrada frente a particiones por documento.")
+    parser.add_argument("--documentos", nargs="+", type=int, default=[10, 100, 1000], help="Niveles de documentos indexados")
+    parser.add_argument("--fragmentos", type=int, default=40, help="Fragmentos por documento")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--consultas", type=int, default=200, help="Consultas por nivel")
+    parser.add_argument("--k", type=int, default=12, help="Resultados por consulta (k * candidatos del servicio)")
+    parser.add_argument("--salida", help="Fichero JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="fondoia_particiones_")
+    cliente = chromadb.PersistentClient(path=directorio)
+    coleccion_global = cliente.get_or_create_collection(BASE, embedding_function=None)
+    print(f"Directorio de trabajo: {directorio}")
+
+    corpus, indexados, niveles = {}, 0, []
+    for nivel in sorted(args.documentos):
+        inicio = time.perf_counter()
+        indexar(cliente, coleccion_global, indexados, nivel, args.fragmentos, args.dimension, corpus)
+        indexados = nivel
+        print(f"\n{nivel} documentos ({nivel * args.fragmentos} fragmentos) indexados en {time.perf_counter() - inicio:.1f} s")
+        resultado = medir(cliente, coleccion_global, corpus, args.consultas, args.k, args.dimension, semilla=nivel)
+        for disposicion, datos in resultado.items():
+            print(f"  {disposicion:<16} p50 {datos['p50_ms']:>7.2f} ms  p95 {datos['p95_ms']:>7.2f} ms  recall@{args.k} {datos['recall']:.3f}")
+        print(f"  apertura de una partición (primera consulta) p50 {resultado['particiones']['apertura_p50_ms']:.2f} ms")
+        niveles.append({"documentos": nivel, "fragmentos": nivel * args.fragmentos, **resultado})
+
+    if args.salida:
+        informe = {
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "chromadb": chromadb.__version__,
+            "parametros": {k: v for k, v in vars(args).items() if k != "salida"},
+            "niveles": niveles
+        }
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados guardados en {args.salida}")
+
+if __name__ == "__main__":
+    main()
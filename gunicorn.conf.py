@@ -0,0 +1,29 @@
+# ==================================
+# Configuración de Gunicorn para el Backend (FastAPI)
+# ==================================
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# Procesos paralelos. Uno por defecto: cada worker abre su propio cliente de Chroma sobre ./chroma_db,
+# y el cliente persistente no admite varios procesos escribiendo (la ingesta puede caer en cualquier
+# worker); además cada uno carga en memoria Chroma, embeddings y numpy. Subir WEB_CONCURRENCY solo
+# con memoria de sobra y sin ingestas por la API mientras el servicio atiende peticiones
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Importamos la aplicación una sola vez en el proceso maestro y los workers la heredan al hacer
+# fork: el arranque no se repite por worker y las páginas de los módulos se comparten en memoria.
+# Es seguro porque al importar no se abren conexiones, ficheros SQLite ni hilos: todo eso se crea
+# en el lifespan de cada worker.
+preload_app = True
+
+def on_starting(server):
+    # Con preload también cargamos las dependencias que la aplicación importa bajo demanda
+    from app.services.calentamiento import importar_dependencias
+    importar_dependencias()
+
+def child_exit(server, worker):
+    # Con métricas multiproceso, los gauges del worker que termina (o se recicla) dejan de sumarse
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+import pytest
+
+from app.models import ConvocatoriaCatalogo
+from app.services import cache, catalogo as modulo_catalogo
+from app.services.catalogo import CursorInvalido
+
+@pytest.fixture
+def catalogo(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    modulo_catalogo.cerrar_catalogo()
+    yield modulo_catalogo.obtener_catalogo()
+    modulo_catalogo.cerrar_catalogo()
+
+def convocatoria(id_convocatoria: str, dias: int | None = 30, ccaa=(), cnae=(), documento="BOE-TEST") -> ConvocatoriaCatalogo:
+    return ConvocatoriaCatalogo(
+        id_convocatoria=id_convocatoria, titulo_ayuda=f"Ayuda {id_convocatoria}", organismo_emisor="Ministerio",
+        presupuesto_total_eur=1_000_000, id_documento_boe=documento,
+        ccaa_elegibles=list(ccaa), cnae_prefijos=list(cnae),
+        fecha_limite=date.today() + timedelta(days=dias) if dias is not None else None
+    )
+
+def ids(convocatorias) -> list[str]:
+    return [c.id_convocatoria for c in convocatorias]
+
+def test_paginacion_por_cursor(catalogo):
+    # Varias con la misma fecha: el id desempata; las que no tienen fecha van al final
+    catalogo.guardar_varias([
+        convocatoria("e", dias=None), convocatoria("c", dias=10), convocatoria("a", dias=10),
+        convocatoria("d", dias=5), convocatoria("b", dias=10),
+    ])
+    vistas, cursor, paginas = [], None, 0
+    while True:
+        pagina, cursor, _ = catalogo.listar({}, cursor, limite=2)
+        vistas += ids(pagina)
+        paginas += 1
+        if cursor is None:
+            break
+    assert vistas == ["d", "a", "b", "c", "e"]
+    assert paginas == 3
+
+def test_pagina_exacta_sin_siguiente_cursor(catalogo):
+    catalogo.guardar_varias([convocatoria("a"), convocatoria("b")])
+    pagina, cursor, _ = catalogo.listar({}, None, limite=2)
+    assert ids(pagina) == ["a", "b"] and cursor is None
+
+def test_cursor_sigue_valido_tras_insertar(catalogo):
+    catalogo.guardar_varias([convocatoria("a", dias=1), convocatoria("b", dias=2), convocatoria("c", dias=3)])
+    _, cursor, _ = catalogo.listar({}, None, limite=1)
+    # Una alta anterior al cursor no desplaza la página siguiente (a diferencia de OFFSET)
+    catalogo.guardar_varias([convocatoria("0", dias=0)])
+    pagina, _, _ = catalogo.listar({}, cursor, limite=1)
+    assert ids(pagina) == ["b"]
+
+def test_cursor_invalido(catalogo):
+    with pytest.raises(CursorInvalido):
+        catalogo.listar({}, "no-es-un-cursor")
+
+def test_filtro_ccaa_incluye_ambito_nacional(catalogo):
+    catalogo.guardar_varias([
+        convocatoria("andalucia", ccaa=["Andalucía"]), convocatoria("madrid", ccaa=["Comunidad de Madrid"]),
+        convocatoria("nacional"),
+    ])
+    pagina, _, _ = catalogo.listar({"ccaa": "ANDALUCIA"})
+    assert ids(pagina) == ["andalucia", "nacional"]
+
+def test_filtro_cnae_por_prefijo(catalogo):
+    catalogo.guardar_varias([
+        convocatoria("tic", cnae=["62"]), convocatoria("programacion", cnae=["62.01"]),
+        convocatoria("comercio", cnae=["47"]), convocatoria("cualquiera"),
+    ])
+    pagina, _, _ = catalogo.listar({"cnae": "6201 - Programación"})
+    assert ids(pagina) == ["cualquiera", "programacion", "tic"]
+    pagina, _, _ = catalogo.listar({"cnae": "6202"})
+    assert ids(pagina) == ["cualquiera", "tic"]
+
+def test_filtros_combinados_y_reindexado(catalogo):
+    catalogo.guardar_varias([
+        convocatoria("a", ccaa=["Andalucía"], cnae=["62"]), convocatoria("b", ccaa=["Andalucía"], cnae=["47"]),
+        convocatoria("cerrada", dias=-1, ccaa=["Andalucía"], cnae=["62"]),
+    ])
+    filtros = {"ccaa": "Andalucía", "cnae": "6201", "abiertas": True}
+    assert ids(catalogo.listar(filtros)[0]) == ["a"]
+    # Al actualizar una convocatoria se reemplazan sus entradas de índice
+    catalogo.guardar_varias([convocatoria("a", ccaa=["Galicia"], cnae=["62"])])
+    assert ids(catalogo.listar(filtros)[0]) == []
+
+def test_documentos_elegibles(catalogo):
+    catalogo.guardar_varias([
+        convocatoria("a", ccaa=["Andalucía"], documento="D1"), convocatoria("b", ccaa=["Galicia"], documento="D2"),
+        convocatoria("c", documento="D3"),
+    ])
+    assert catalogo.documentos_elegibles(["D1", "D2", "D3", "D4"], {"ccaa": "Andalucía"}) == {"D1", "D3"}
@@ -0,0 +1,45 @@
+from app.services.contexto import Fragmento, ensamblar_contexto, estimar_tokens, _unir_solapados, SEPARADOR
+
+def test_unir_solapados_quita_el_solapamiento_del_splitter():
+    comun = "los requisitos de facturación se acreditarán con las cuentas anuales"
+    assert _unir_solapados("Artículo 5. " + comun, comun + " del último ejercicio.") == (
+        "Artículo 5. " + comun + " del último ejercicio."
+    )
+
+def test_unir_solapados_sin_solapamiento_real():
+    # Una coincidencia casual de un carácter no es solapamiento: no se pierde texto
+    assert _unir_solapados("el plazo para solicitarla", "a partir del 1 de enero") == (
+        "el plazo para solicitarla\na partir del 1 de enero"
+    )
+
+def test_elimina_casi_duplicados_y_conserva_el_mas_relevante():
+    texto = "Podrán ser beneficiarias las pequeñas y medianas empresas con domicilio fiscal en Andalucía " * 3
+    fragmentos = [Fragmento(texto, 4), Fragmento(texto + " Fin.", 9), Fragmento("Plazo de solicitud de dos meses.", 1)]
+    contexto, estadisticas = ensamblar_contexto(fragmentos)
+    assert (estadisticas.fragmentos_antes, estadisticas.fragmentos_despues) == (3, 2)
+    assert "Fin." not in contexto
+
+def test_orden_del_documento_y_desconocidos_al_final():
+    fragmentos = [Fragmento("tercero", 7), Fragmento("sin posición"), Fragmento("primero", 2)]
+    contexto, _ = ensamblar_contexto(fragmentos)
+    assert contexto.split(SEPARADOR) == ["primero", "tercero", "sin posición"]
+
+def test_fusiona_consecutivos():
+    comun = " el solapamiento del splitter entre fragmentos"
+    fragmentos = [Fragmento(comun + " y sigue", 4), Fragmento("primero" + comun, 3)]
+    contexto, estadisticas = ensamblar_contexto(fragmentos)
+    assert contexto == "primero" + comun + " y sigue"
+    assert estadisticas.fragmentos_despues == 1
+
+def test_presupuesto_prioriza_relevancia():
+    fragmentos = [Fragmento("a" * 400, 5), Fragmento("b" * 400, 1), Fragmento("c" * 400, 3)]
+    contexto, estadisticas = ensamblar_contexto(fragmentos, presupuesto=250)
+    # Caben los dos más relevantes (100 tokens cada uno), en orden del documento
+    assert contexto.split(SEPARADOR) == ["b" * 400, "a" * 400]
+    assert estadisticas.tokens_despues <= 250
+
+def test_el_mas_relevante_entra_recortado():
+    texto = " ".join(["palabra"] * 200)
+    contexto, _ = ensamblar_contexto([Fragmento(texto, 0), Fragmento("otro", 1)], presupuesto=50)
+    assert contexto.endswith(" [...]") and "otro" not in contexto
+    assert estimar_tokens(contexto) <= 52
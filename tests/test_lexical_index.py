@@ -0,0 +1,58 @@
+import json
+import pytest
+
+from app.services import lexical_index
+from app.services.lexical_index import IndiceBM25, AlmacenIndicesLexicos, tokenizar, es_consulta_lexica
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("facturación 250000.0 euros", ["facturacion", "250000", "euros"]),
+    ("250.000", ["250000"]),
+    ("1.250.000,50 €", ["1250000.5"]),
+    ("250000,00", ["250000"]),
+    ("0,5 %", ["0.5"]),
+    ("artículo 3.2", ["articulo", "3.2"]),
+    ("apartado 1.2.3", ["apartado", "1.2.3"]),
+    ("CNAE 62.01", ["cnae", "62.01", "6201"]),
+    ("CNAE 0111", ["cnae", "0111"]),
+    ("Las empresas de la Comunidad", ["empresas", "comunidad"]),
+])
+def test_tokenizar(texto, esperado):
+    assert tokenizar(texto) == esperado
+
+def test_importe_de_la_consulta_coincide_con_el_del_boletin():
+    # La consulta de matching formatea la facturación desde un float ("250000.0")
+    indice = IndiceBM25.construir([
+        ("a", "Facturación anual inferior a 250.000 euros", 0),
+        ("b", "Plazo de presentación de solicitudes", 1),
+    ])
+    assert indice.buscar("Facturación: 250000.0", 1)[0][0] == 0
+
+@pytest.mark.parametrize("query, esperado", [
+    ("6201 250.000", True),
+    ("CNAE 6201", True),
+    ("artículo 3.2 apartado 4", True),
+    ("requisitos de los beneficiarios", False),
+    ("plazo de solicitud 2024", False),
+    ("de la", False),
+])
+def test_es_consulta_lexica(query, esperado):
+    assert es_consulta_lexica(query) is esperado
+
+def test_indice_con_otra_tokenizacion_se_reconstruye(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical_index, "BM25_DIR", str(tmp_path))
+    almacen = AlmacenIndicesLexicos()
+    almacen.guardar("D", IndiceBM25.construir([("a", "Importe máximo 250.000 euros", 0)]))
+
+    # Índice guardado por una versión anterior (sin versión y con los separadores quitados)
+    ruta = lexical_index._ruta_indice("D")
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    del datos["version_tokenizador"]
+    datos["postings"] = {"importe": [[0, 1]], "maximo": [[0, 1]], "2500000": [[0, 1]], "euros": [[0, 1]]}
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f)
+
+    indice = AlmacenIndicesLexicos().obtener("D")
+    assert "250000" in indice.postings and "2500000" not in indice.postings
+    with open(ruta, encoding="utf-8") as f:
+        assert json.load(f)["version_tokenizador"] == lexical_index.VERSION_TOKENIZADOR
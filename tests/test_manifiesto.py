@@ -0,0 +1,60 @@
+import pytest
+
+from app.services import cache, lexical_index, recomendaciones, vector_db
+from app.services.manifiesto import comparar_manifiestos
+
+def test_comparar_manifiestos():
+    anteriores = {"a": 0, "b": 1, "c": 2}
+    actuales = {"a": 0, "c": 1, "d": 2}
+    assert comparar_manifiestos(anteriores, actuales) == (["d"], ["b"], ["c"])
+
+def test_comparar_manifiestos_sin_cambios_y_vacios():
+    assert comparar_manifiestos({"a": 0}, {"a": 0}) == ([], [], [])
+    assert comparar_manifiestos({}, {"a": 0, "b": 1}) == (["a", "b"], [], [])
+    assert comparar_manifiestos({"a": 0}, {}) == ([], ["a"], [])
+
+@pytest.fixture
+def servicio(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(lexical_index, "BM25_DIR", str(tmp_path / "bm25"))
+    monkeypatch.setattr(vector_db, "CHROMA_DB_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setattr(vector_db, "EMBEDDINGS_BACKEND", "hashing")
+    monkeypatch.setattr(recomendaciones, "EMBEDDINGS_BACKEND", "hashing")
+    monkeypatch.setattr(vector_db, "_indices_lexicos", None)
+    vector_db.cerrar_servicio()
+    recomendaciones.cerrar_indice_resumenes()
+    yield
+    vector_db.cerrar_servicio()
+    recomendaciones.cerrar_indice_resumenes()
+
+def fragmentos(textos: list[str]) -> list[tuple[str, dict]]:
+    return [(texto, {"id_documento": "D", "posicion": i}) for i, texto in enumerate(textos)]
+
+def test_reindexar_solo_vectoriza_los_nuevos(servicio, monkeypatch):
+    from langchain_community.vectorstores import Chroma
+
+    vectorizados = []
+    add_texts = Chroma.add_texts
+    def contar(self, texts, *args, **kwargs):
+        vectorizados.extend(texts)
+        return add_texts(self, texts, *args, **kwargs)
+    monkeypatch.setattr(Chroma, "add_texts", contar)
+
+    textos = ["Objeto de la convocatoria", "Beneficiarios: pymes", "Plazo de solicitud", "Cuantía de la ayuda"]
+    assert vector_db.indexar_fragmentos("D", fragmentos(textos)) == (4, 0)
+    assert vectorizados == textos
+
+    # Se modifica un fragmento, se elimina otro y los demás cambian de posición
+    vectorizados.clear()
+    nuevos = ["Beneficiarios: pymes y autónomos", "Objeto de la convocatoria", "Cuantía de la ayuda"]
+    assert vector_db.indexar_fragmentos("D", fragmentos(nuevos)) == (1, 2)
+    assert vectorizados == ["Beneficiarios: pymes y autónomos"]
+
+    indexados = vector_db.obtener_particion("D").get(include=["documents", "metadatas"])
+    posiciones = {texto: m["posicion"] for texto, m in zip(indexados["documents"], indexados["metadatas"])}
+    assert posiciones == {texto: i for i, texto in enumerate(nuevos)}
+
+    # Volver a indexar lo mismo no vectoriza nada
+    vectorizados.clear()
+    assert vector_db.indexar_fragmentos("D", fragmentos(nuevos)) == (0, 0)
+    assert vectorizados == []
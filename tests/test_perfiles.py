@@ -0,0 +1,74 @@
+import io
+import pytest
+
+from app.models import PerfilPymeRegistrado
+from app.services import cache, perfiles
+
+@pytest.fixture
+def registro(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    perfiles.cerrar_almacen_perfiles()
+    yield perfiles.obtener_almacen_perfiles()
+    perfiles.cerrar_almacen_perfiles()
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("250.000", "250000"),
+    ("1.250.000", "1250000"),
+    ("1.200", "1200"),
+    ("1.250.000,50", "1250000.50"),
+    ("250000,5", "250000.5"),
+    ("1 250 000 €", "1250000"),
+    ("250000", "250000"),
+    ("250000.5", "250000.5"),
+    ("1.5", "1.5"),
+])
+def test_numero_es(valor, esperado):
+    assert perfiles._numero_es(valor) == esperado
+
+CABECERA = "nif;nombre_fiscal;cnae;facturacion_anual_eur;empleados_plantilla;ubicacion_ccaa;necesidad_inversion\n"
+
+def test_csv_con_miles_y_decimales(registro):
+    contenido = (
+        CABECERA
+        + 'B1;"Acme, S.L.";6201;250.000;1.200;Madrid;Software\n'
+        + "B2;Beta SL;6201;1.250.000,50;12;Madrid;Software\n"
+    )
+    resultado = perfiles.importar_perfiles(io.BytesIO(contenido.encode("utf-8")), "csv")
+    assert (resultado.filas, resultado.validas, resultado.errores) == (2, 2, [])
+    assert registro.obtener("B1").facturacion_anual_eur == 250000
+    assert registro.obtener("B1").empleados_plantilla == 1200
+    assert registro.obtener("B2").facturacion_anual_eur == 1250000.5
+
+def test_jsonl_una_linea_un_perfil(registro):
+    perfil = (
+        '{"nif": "B%d", "nombre_fiscal": "E%d", "cnae": "6201", "facturacion_anual_eur": 1, '
+        '"empleados_plantilla": 1, "ubicacion_ccaa": "Madrid", "necesidad_inversion": "x"}'
+    )
+    contenido = f"{perfil % (1, 1)}\n{perfil % (2, 2)}, {perfil % (3, 3)}\n{{roto\n"
+    resultado = perfiles.importar_perfiles(io.BytesIO(contenido.encode("utf-8")), "jsonl")
+    assert (resultado.filas, resultado.validas, resultado.insertadas) == (3, 1, 1)
+    assert [e.fila for e in resultado.errores] == [2, 3]
+    assert registro.obtener("B2") is None
+
+def perfil(nif: str | None, nombre: str) -> PerfilPymeRegistrado:
+    return PerfilPymeRegistrado(
+        nif=nif, nombre_fiscal=nombre, cnae="6201", facturacion_anual_eur=1,
+        empleados_plantilla=1, ubicacion_ccaa="Madrid", necesidad_inversion="x"
+    )
+
+def test_obtener_varios_por_nif_y_por_nombre(registro):
+    registro.guardar_varios([perfil(f"B{i:04d}", f"Empresa {i}, S.L.") for i in range(600)])
+    registro.guardar_varios([perfil(None, "Sin Nif, S.A.")])
+    identificadores = [f"b-{i:04d}" for i in range(0, 600, 2)] + ["EMPRESA 7 SL", "sin nif sa", "B9999"]
+    encontrados = registro.obtener_varios(identificadores)
+    assert len(encontrados) == 302
+    assert encontrados["b-0004"].nif == "B0004"
+    assert encontrados["EMPRESA 7 SL"].nif == "B0007"
+    assert encontrados["sin nif sa"].nombre_fiscal == "Sin Nif, S.A."
+    assert "B9999" not in encontrados
+
+def test_obtener_varios_prefiere_el_nif_al_nombre(registro):
+    # Una empresa cuyo nombre fiscal coincide con el NIF de otra
+    registro.guardar_varios([perfil("B1", "Acme")])
+    registro.guardar_varios([perfil("B2", "B1")])
+    assert registro.obtener("B1").nombre_fiscal == "Acme"
@@ -0,0 +1,75 @@
+import numpy as np
+
+from app.models import PerfilPyme, RequisitosConvocatoria
+from app.services.prescreening import cribar
+
+def empresa(cnae="6201", ccaa="Andalucía", facturacion=500_000.0, empleados=10) -> PerfilPyme:
+    return PerfilPyme(
+        nombre_fiscal="Empresa", cnae=cnae, facturacion_anual_eur=facturacion,
+        empleados_plantilla=empleados, ubicacion_ccaa=ccaa, necesidad_inversion="Software"
+    )
+
+def requisitos(**campos) -> RequisitosConvocatoria:
+    return RequisitosConvocatoria(id_documento_boe="BOE-TEST", **campos)
+
+def test_matriz_n_por_m():
+    empresas = [
+        empresa(cnae="6201", ccaa="Andalucía"),
+        empresa(cnae="4711 - Comercio al por menor", ccaa="Madrid"),
+        empresa(cnae="62.02", ccaa="andalucia"),
+    ]
+    convocatorias = [
+        requisitos(cnae_prefijos=["62"]),
+        requisitos(ccaa_elegibles=["ANDALUCÍA"]),
+        requisitos(cnae_prefijos=["47.1"], ccaa_elegibles=["Comunidad de Madrid", "Madrid"]),
+        None,
+    ]
+    resultado = cribar(empresas, convocatorias)
+    assert resultado.descartados.shape == (3, 4)
+    assert resultado.descartados.tolist() == [
+        [False, False, True, False],
+        [True, True, False, False],
+        [False, False, True, False],
+    ]
+    assert resultado.cnae_no_elegible[1, 0] and not resultado.ccaa_no_elegible[1, 0]
+    assert resultado.ccaa_no_elegible[1, 1] and not resultado.cnae_no_elegible[1, 1]
+    assert resultado.cnae_no_elegible[0, 2] and resultado.ccaa_no_elegible[0, 2]
+
+def test_prefijo_cnae_no_coincide_por_subcadena():
+    # "620" es prefijo de 6201, pero "201" no lo es aunque aparezca dentro del código
+    resultado = cribar([empresa(cnae="6201")], [requisitos(cnae_prefijos=["620"]), requisitos(cnae_prefijos=["201"])])
+    assert resultado.cnae_no_elegible.tolist() == [[False, True]]
+
+def test_cnae_desconocido_no_descarta():
+    resultado = cribar([empresa(cnae="Sin clasificar")], [requisitos(cnae_prefijos=["62"])])
+    assert not resultado.descartados[0, 0]
+
+def test_umbrales():
+    empresas = [empresa(facturacion=100_000, empleados=5), empresa(facturacion=2_000_000, empleados=60)]
+    convocatorias = [
+        requisitos(facturacion_max_eur=1_000_000),
+        requisitos(facturacion_min_eur=200_000),
+        requisitos(empleados_max=50, empleados_min=5),
+        requisitos(facturacion_max_eur=2_000_000, empleados_max=60),
+    ]
+    resultado = cribar(empresas, convocatorias)
+    assert resultado.facturacion_alta.tolist() == [[False, False, False, False], [True, False, False, False]]
+    assert resultado.facturacion_baja.tolist() == [[False, True, False, False], [False, False, False, False]]
+    assert resultado.empleados_exceso.tolist() == [[False, False, False, False], [False, False, True, False]]
+    # Los límites son inclusivos
+    assert not resultado.empleados_defecto.any()
+    assert resultado.descartados.tolist() == [[False, True, False, False], [True, False, True, False]]
+
+def test_motivos():
+    resultado = cribar([empresa(facturacion=2_000_000, ccaa="Galicia")], [
+        requisitos(facturacion_max_eur=1_000_000, ccaa_elegibles=["Andalucía"])
+    ])
+    assert resultado.motivos(0, 0) == [
+        "La facturación anual supera el máximo admitido",
+        "La Comunidad Autónoma de la empresa no está en el ámbito de la convocatoria",
+    ]
+
+def test_sin_convocatorias():
+    resultado = cribar([empresa()], [])
+    assert resultado.descartados.shape == (1, 0)
+    assert np.array_equal(resultado.descartados, np.zeros((1, 0), dtype=bool))